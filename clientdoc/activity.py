@@ -0,0 +1,77 @@
+"""Buffered activity log writer.
+
+Entries are collected per request (ActivityLogMiddleware) or per job
+(``buffered_activity_log()``) and written with one ``bulk_create`` once the
+surrounding transaction commits. Each entry only joins the buffer when the
+transaction it was logged in commits (``transaction.on_commit``), so entries
+logged inside a transaction that is rolled back are dropped together with the
+work they describe.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+
+_local = threading.local()
+
+
+def _buffer():
+    return getattr(_local, 'buffer', None)
+
+
+def log_activity(action, details=""):
+    """Records an activity entry; buffered if a request/job buffer is active."""
+    entry = ActivityLog(action=action, details=details, timestamp=timezone.now())
+    buffer = _buffer()
+    if buffer is not None:
+        # Buffered only once the surrounding transaction (if any) commits, so a rollback drops the entry
+        transaction.on_commit(lambda: buffer.append(entry))
+    else:
+        # No buffer (e.g. shell or management command): write once the transaction commits
+        transaction.on_commit(lambda: _write([entry]))
+
+
+def _write(entries):
+    if not entries:
+        return
+    try:
+        ActivityLog.objects.bulk_create(entries, batch_size=FLUSH_BATCH_SIZE)
+    except Exception:
+        # Audit logging must never break the action that was already committed
+        logger.exception("Could not write %d activity log entries", len(entries))
+
+
+@contextmanager
+def buffered_activity_log():
+    """Buffers log_activity calls in this thread and flushes them on commit. Nesting is allowed."""
+    if _buffer() is not None:
+        yield
+        return
+
+    _local.buffer = []
+    try:
+        yield
+    finally:
+        entries, _local.buffer = _local.buffer, None
+        # Registered even if still empty: entries logged in a transaction join the list when it commits,
+        # and commit callbacks run in order, so they are in it before this one writes it
+        transaction.on_commit(lambda: _write(entries))
+
+
+class ActivityLogMiddleware:
+    """Collects the activity entries of a request and writes them in one batch."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered_activity_log():
+            return self.get_response(request)
@@ -1,6 +1,7 @@
 # clientdoc/admin.py
 
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 from .models import (
     Item, StoreLocation, SalesInvoice, InvoiceItem,
     DeliveryChallan, TransportCharges, ConfirmationDocument, PackedImage,
@@ -56,8 +57,46 @@ class TransportChargesAdmin(admin.ModelAdmin):
 
 @admin.register(ConfirmationDocument)
 class ConfirmationDocumentAdmin(admin.ModelAdmin):
-    list_display = ['invoice', 'combined_pdf']
+    list_display = ['invoice', 'combined_pdf', 'bundle_total_ms', 'bundle_pages', 'bundle_size_kb', 'bundle_slowest_stage']
+    readonly_fields = ['bundle_breakdown']
     inlines = [PackedImageInline]
+
+    def _metrics(self, obj):
+        return obj.bundle_metrics or {}
+
+    @admin.display(description='Build (ms)')
+    def bundle_total_ms(self, obj):
+        return self._metrics(obj).get('total_ms')
+
+    @admin.display(description='Pages')
+    def bundle_pages(self, obj):
+        return self._metrics(obj).get('pages')
+
+    @admin.display(description='Size (KB)')
+    def bundle_size_kb(self, obj):
+        size = self._metrics(obj).get('bytes')
+        return round(size / 1024, 1) if size else None
+
+    @admin.display(description='Slowest Stage')
+    def bundle_slowest_stage(self, obj):
+        by_stage = self._metrics(obj).get('by_stage') or {}
+        if not by_stage:
+            return '-'
+        name = max(by_stage, key=by_stage.get)
+        return f"{name} ({by_stage[name]:.0f} ms)"
+
+    @admin.display(description='Bundle Build Stages')
+    def bundle_breakdown(self, obj):
+        stages = self._metrics(obj).get('stages') or []
+        if not stages:
+            return '-'
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((s['stage'], s.get('source', ''), s['ms'], s.get('bytes') or '', s.get('pages') or '') for s in stages)
+        )
+        return format_html(
+            '<table><tr><th>Stage</th><th>Source</th><th>ms</th><th>Bytes</th><th>Pages</th></tr>{}</table>', rows
+        )
     
 @admin.register(OurCompanyProfile) 
 class OurCompanyProfileAdmin(admin.ModelAdmin):
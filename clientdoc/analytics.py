@@ -0,0 +1,218 @@
+"""Monthly sales rollups and the pivots of the analytics page.
+
+SalesRollup holds one row per month, location, buyer and item. Saving or deleting
+an invoice (or its line items or transport charges) only marks its month in RollupDirtyMonth and,
+once the change commits, schedules ``refresh_rollups`` in a background thread,
+which rebuilds the marked months from the invoice lines (the refresh_rollups
+command does the same). The analytics page only reads: it loads the rollups of
+the selected months into a DataFrame and pivots them with pandas, so slicing by
+location, buyer, item, category or month never touches the invoice tables.
+"""
+import datetime
+import logging
+import threading
+from decimal import Decimal
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import InvoiceItem, RollupDirtyMonth, SalesInvoice, SalesRollup, TRANSPORT_GST_RATE, split_gst
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = {
+    'location': 'Location',
+    'buyer': 'Buyer',
+    'item': 'Item',
+    'category': 'Category',
+    'month': 'Month',
+}
+MEASURES = {
+    'taxable_value': 'Taxable Value',
+    'total_value': 'Value incl. Tax',
+    'quantity': 'Quantity',
+}
+
+
+def month_start(value):
+    """First day of the (local) month of a date or datetime."""
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def month_range(first, last):
+    """Parses 'YYYY-MM' bounds; missing or invalid ones give the twelve months up to the current one."""
+    def parse(value):
+        try:
+            return datetime.datetime.strptime(str(value).strip(), '%Y-%m').date()
+        except (TypeError, ValueError):
+            return None
+
+    last_month = parse(last) or month_start(timezone.now())
+    first_month = parse(first) or next_month(last_month.replace(year=last_month.year - 1))
+    return min(first_month, last_month), max(first_month, last_month)
+
+
+def month_bounds(month):
+    """Aware [start, end) datetimes of a month in the current time zone."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(month, datetime.time.min), tz)
+    end = timezone.make_aware(datetime.datetime.combine(next_month(month), datetime.time.min), tz)
+    return start, end
+
+
+def mark_dirty(*dates):
+    """Queues the months of the given dates and schedules a refresh for when the change commits."""
+    months = {month_start(d) for d in dates if d}
+    if not months:
+        return
+    # Usually the month is already queued by an earlier save of the burst: a read, no write
+    months -= set(RollupDirtyMonth.objects.filter(month__in=months).values_list('month', flat=True))
+    if months:
+        RollupDirtyMonth.objects.bulk_create([RollupDirtyMonth(month=m) for m in months], ignore_conflicts=True)
+    # Scheduled either way (it only restarts a timer): queued months may predate this process
+    transaction.on_commit(schedule_refresh)
+
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refresh_timer = None
+
+
+def schedule_refresh():
+    """Starts one background refresh for a burst of changes, after ROLLUP_REFRESH_DELAY seconds (None disables)."""
+    global _refresh_timer
+    delay = getattr(settings, 'ROLLUP_REFRESH_DELAY', 2.0)
+    if delay is None:
+        return
+    with _lock:
+        if _refresh_timer is not None:
+            _refresh_timer.cancel()
+        _refresh_timer = threading.Timer(delay, _run_refresh)
+        _refresh_timer.daemon = True
+        _refresh_timer.start()
+
+
+def _run_refresh():
+    global _refresh_timer
+    with _lock:
+        _refresh_timer = None
+    try:
+        # One refresh at a time; months marked meanwhile are picked up by the timer they scheduled
+        with _refresh_lock:
+            refresh_rollups()
+    except Exception:
+        logger.exception("Refreshing the sales rollups failed")
+    finally:
+        # Threads get their own DB connection; close it so SQLite isn't left locked
+        from django.db import connection
+        connection.close()
+
+
+def rebuild_month(month):
+    """Replaces the rollups of one month with totals recomputed from its invoices."""
+    start, end = month_bounds(month)
+    invoices = SalesInvoice.objects.filter(date__gte=start, date__lt=end)
+    totals = {}
+
+    def add(key, quantity, taxable, tax):
+        entry = totals.setdefault(key, [0, Decimal('0.00'), Decimal('0.00')])
+        entry[0] += quantity
+        entry[1] += taxable
+        entry[2] += tax
+
+    lines = InvoiceItem.objects.filter(invoice__in=invoices).values_list(
+        'invoice__location_id', 'invoice__buyer_id', 'item_id', 'quantity',
+        'quantity_billed', 'price', 'discount_type', 'discount_value', 'gst_rate',
+    )
+    for (location_id, buyer_id, item_id, quantity,
+         quantity_billed, price, discount_type, discount_value, gst_rate) in lines.iterator(chunk_size=5000):
+        _, _, taxable = InvoiceItem.compute_taxable(quantity_billed, price, discount_type, discount_value)
+        # The tax amount is the same whether it is later split as CGST/SGST or IGST
+        tax = split_gst(taxable, gst_rate, True)[0]
+        add((location_id, buyer_id, item_id), quantity, taxable, tax)
+
+    transport = invoices.filter(transportcharges__charges__gt=0, transportcharges__is_deleted=False).values_list(
+        'location_id', 'buyer_id', 'transportcharges__charges',
+    )
+    for location_id, buyer_id, charges in transport:
+        add((location_id, buyer_id, None), 1, charges, split_gst(charges, TRANSPORT_GST_RATE, True)[0])
+
+    rows = [
+        SalesRollup(month=month, location_id=location_id, buyer_id=buyer_id, item_id=item_id, quantity=quantity,
+                    taxable_value=taxable, tax_amount=tax)
+        for (location_id, buyer_id, item_id), (quantity, taxable, tax) in totals.items()
+    ]
+    with transaction.atomic():
+        SalesRollup.objects.filter(month=month).delete()
+        SalesRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh_rollups(months=None):
+    """Rebuilds the given months, or the ones marked dirty; returns the months rebuilt."""
+    if months is None:
+        months = sorted(RollupDirtyMonth.objects.values_list('month', flat=True))
+    for month in months:
+        with transaction.atomic():
+            # Unmarked first: a change committed while this month rebuilds marks it again
+            RollupDirtyMonth.objects.filter(month=month).delete()
+            rebuild_month(month)
+    return months
+
+
+def all_months():
+    """Every month that has invoices or rollups (trashed invoices included, their months may need clearing)."""
+    invoice_months = SalesInvoice.all_objects.annotate(month=TruncMonth('date')).values_list('month', flat=True).distinct()
+    months = {month_start(m) for m in invoice_months if m}
+    months.update(SalesRollup.objects.values_list('month', flat=True).distinct())
+    return sorted(months)
+
+
+def sales_frame(first_month, last_month):
+    """Rollups of the months in [first_month, last_month] as a DataFrame with display names."""
+    qs = SalesRollup.objects.filter(month__gte=first_month, month__lte=last_month).values_list(
+        'month', 'location__name', 'buyer__name', 'item__name', 'item__category__name',
+        'quantity', 'taxable_value', 'tax_amount',
+    )
+    df = pd.DataFrame.from_records(
+        list(qs), columns=['month', 'location', 'buyer', 'item', 'category', 'quantity', 'taxable_value', 'tax_amount'],
+    )
+    is_transport = df['item'].isna()
+    df['item'] = df['item'].fillna('Transport Charges')
+    df['category'] = df['category'].where(df['category'].notna(), is_transport.map({True: 'Transport', False: 'Uncategorised'}))
+    df['buyer'] = df['buyer'].fillna('(No buyer)')
+    df['taxable_value'] = df['taxable_value'].astype(float)
+    df['total_value'] = df['taxable_value'] + df['tax_amount'].astype(float)
+    return df
+
+
+def pivot(df, dimension, measure, by_month=False, top=None):
+    """Sums ``measure`` per ``dimension`` (optionally one column per month), largest totals first.
+
+    Returns (month columns, [(label, [values per month], total)], grand total).
+    """
+    if df.empty:
+        return [], [], 0
+    if by_month and dimension != 'month':
+        table = df.pivot_table(index=dimension, columns='month', values=measure, aggfunc='sum', fill_value=0)
+        months = list(table.columns)
+        totals = table.sum(axis=1)
+    else:
+        totals = df.groupby(dimension)[measure].sum()
+        table, months = None, []
+    order = totals.index if dimension == 'month' else totals.sort_values(ascending=False).index
+    if top and dimension != 'month':
+        order = order[:top]
+    # tolist() turns the NumPy scalars into plain Python numbers for the template
+    values = table.loc[order].values.tolist() if table is not None else [[] for _ in order]
+    rows = list(zip(order, values, totals[order].tolist()))
+    return months, rows, totals.sum().item()
@@ -0,0 +1,163 @@
+"""Content-addressed storage for attachments imported from local paths.
+
+Files are hashed while they are copied, stored once under
+MEDIA_ROOT/blobs/<aa>/<bb>/<sha256><ext> and referenced by name from any
+number of file fields. A source path whose size and modification time have
+not changed since the last import is not read again at all.
+
+``import_attachments`` does the slow part (stat, read, hash, copy) for many
+paths on a bounded thread pool without touching the database, then records
+the blobs in one short transaction.
+"""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import AttachmentBlob, AttachmentSource
+
+BLOB_DIR = 'blobs'
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_name(digest, original_name):
+    ext = os.path.splitext(original_name)[1].lower()[:10]
+    return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_blob(name):
+    return bool(name) and str(name).replace('\\', '/').startswith(f"{BLOB_DIR}/")
+
+
+def _blob_exists(blob):
+    return os.path.exists(os.path.join(settings.MEDIA_ROOT, blob.name))
+
+
+def _copy_and_hash(source_path):
+    """Copies the file into a temp file under the blob folder, hashing it in the same pass."""
+    tmp_dir = os.path.join(settings.MEDIA_ROOT, BLOB_DIR, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    handle, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with open(source_path, 'rb') as src, os.fdopen(handle, 'wb') as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                dst.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return sha.hexdigest(), size, tmp_path
+
+
+class StagedFile:
+    """Result of the I/O step for one source path (no database access happens here)."""
+
+    def __init__(self, path, stat=None, blob=None, digest=None, size=None, tmp_path=None, error=None):
+        self.path = path
+        self.stat = stat
+        self.blob = blob  # set when the source cache matched
+        self.digest = digest
+        self.size = size
+        self.tmp_path = tmp_path
+        self.error = error
+
+
+def _stage(path, cached):
+    try:
+        stat = os.stat(path)
+        if cached and cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns and _blob_exists(cached.blob):
+            return StagedFile(path, stat, blob=cached.blob)
+        digest, size, tmp_path = _copy_and_hash(path)
+        return StagedFile(path, stat, digest=digest, size=size, tmp_path=tmp_path)
+    except Exception as e:
+        return StagedFile(path, error=e)
+
+
+def _record(staged_files):
+    """Turns staged copies into blobs and updates the source cache, in one transaction."""
+    to_store = [s for s in staged_files if s.digest]
+    with transaction.atomic():
+        existing = {b.digest: b for b in AttachmentBlob.objects.filter(digest__in={s.digest for s in to_store})}
+        for staged in to_store:
+            blob = existing.get(staged.digest)
+            if blob is None:
+                original_name = os.path.basename(staged.path)
+                blob, _ = AttachmentBlob.objects.get_or_create(
+                    digest=staged.digest,
+                    defaults={'name': blob_name(staged.digest, original_name),
+                              'original_name': original_name[:255], 'size': staged.size},
+                )
+                existing[staged.digest] = blob
+            final_path = os.path.join(settings.MEDIA_ROOT, blob.name)
+            if not os.path.exists(final_path):
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(staged.tmp_path, final_path)
+            staged.blob = blob
+            AttachmentSource.objects.update_or_create(
+                path=staged.path,
+                defaults={'size': staged.stat.st_size, 'mtime_ns': staged.stat.st_mtime_ns, 'blob': blob},
+            )
+
+
+def import_attachments(paths, max_workers=None):
+    """Stores the files at ``paths`` as blobs.
+
+    Returns ``{path: AttachmentBlob or Exception}`` keyed by the path as given. Missing
+    files map to FileNotFoundError. Reading and copying run on a thread pool of
+    ATTACHMENT_COPY_WORKERS threads; only the final bookkeeping touches the database.
+    """
+    by_abs = {}
+    for path in paths:
+        if path:
+            by_abs.setdefault(os.path.abspath(str(path)), []).append(path)
+    if not by_abs:
+        return {}
+
+    cache = {}
+    abs_paths = list(by_abs)
+    for i in range(0, len(abs_paths), 500):
+        for source in AttachmentSource.objects.select_related('blob').filter(path__in=abs_paths[i:i + 500]):
+            cache[source.path] = source
+
+    workers = max_workers or getattr(settings, 'ATTACHMENT_COPY_WORKERS', 8)
+    with ThreadPoolExecutor(max_workers=min(workers, len(abs_paths))) as pool:
+        staged_files = list(pool.map(lambda p: _stage(p, cache.get(p)), abs_paths))
+
+    try:
+        _record(staged_files)
+    finally:
+        for staged in staged_files:
+            if staged.tmp_path and os.path.exists(staged.tmp_path):
+                os.remove(staged.tmp_path)
+
+    results = {}
+    for staged in staged_files:
+        for original in by_abs[staged.path]:
+            results[original] = staged.error or staged.blob
+    return results
+
+
+def ingest_path(source_path):
+    """Returns the AttachmentBlob for a single local file, copying it only if it is new."""
+    result = import_attachments([source_path], max_workers=1)[source_path]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def delete_field_file(field_file):
+    """Deletes the file behind a field unless it is a shared blob (gc_attachment_blobs handles those)."""
+    if field_file and not is_blob(field_file.name):
+        field_file.delete(save=False)
+
+
+def delete_stored_file(storage, name):
+    """Like delete_field_file, for a name the field no longer holds (the instance is left alone)."""
+    if name and not is_blob(name):
+        storage.delete(name)
@@ -0,0 +1,128 @@
+"""Background finalization of many invoices (see BatchFinalizeJob).
+
+A job runs in a daemon thread of the web process. Bundles are built on a pool
+of BATCH_FINALIZE_WORKERS threads with the default file order; the job thread
+collects the results, keeps the progress counters up to date and finally packs
+the combined PDFs into a ZIP under MEDIA_ROOT/batch_finalize.
+
+If the process stops while a job runs (server restart, autoreload) the job is
+left 'Running' without a thread and its ``updated_at`` heartbeat stops moving;
+once it is stale the status page offers a restart, which skips the invoices
+already finalized.
+"""
+import logging
+import os
+import threading
+import traceback
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import BatchFinalizeJob, ConfirmationDocument, OurCompanyProfile, SalesInvoice
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_running = set()
+
+
+def is_running(job_id):
+    with _lock:
+        return job_id in _running
+
+
+def start_job(job_id):
+    """Runs the job in a background thread unless it is already running in this process."""
+    with _lock:
+        if job_id in _running:
+            return False
+        _running.add(job_id)
+    threading.Thread(target=_run_and_release, args=(job_id,), daemon=True, name=f"batch-finalize-{job_id}").start()
+    return True
+
+
+def _run_and_release(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        with _lock:
+            _running.discard(job_id)
+        connection.close()
+
+
+def _finalize_one(invoice_id, company_profile):
+    # Imported here: views imports this module
+    from .views import finalize_confirmation
+    try:
+        invoice = SalesInvoice.objects.select_related('buyer', 'location').get(pk=invoice_id)
+        confirmation, _ = ConfirmationDocument.objects.get_or_create(invoice=invoice)
+        return finalize_confirmation(invoice, confirmation, company_profile)
+    finally:
+        # Pool threads are not request threads, nothing else closes their connections
+        connection.close()
+
+
+def run_job(job_id, max_workers=None):
+    job = BatchFinalizeJob.objects.get(pk=job_id)
+    finished = set(job.finished_ids)
+    pending = [i for i in job.invoice_ids if i not in finished]
+    job.status = 'Running'
+    job.processed = len(finished)
+    job.failed = 0
+    job.finished_at = None
+    if finished:
+        job.log += f"Restarted, {len(pending)} invoices left\n"
+    job.save()
+
+    try:
+        company_profile = OurCompanyProfile.objects.first()
+        workers = max_workers or getattr(settings, 'BATCH_FINALIZE_WORKERS', 4)
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                futures = {pool.submit(_finalize_one, invoice_id, company_profile): invoice_id for invoice_id in pending}
+                for future in as_completed(futures):
+                    invoice_id = futures[future]
+                    try:
+                        future.result()
+                        finished.add(invoice_id)
+                    except Exception as e:
+                        logger.error("Batch finalize %s: invoice %s failed: %s", job.id, invoice_id, e)
+                        job.failed += 1
+                        job.log += f"Invoice #{invoice_id}: {e}\n"
+                    job.processed += 1
+                    job.finished_ids = sorted(finished)
+                    job.save(update_fields=['processed', 'failed', 'finished_ids', 'log', 'updated_at'])
+
+        job.zip_file.name = write_zip(job, finished)
+        job.status = 'Completed'
+        job.log += f"Finalized {len(finished)} of {job.total} invoices, {job.failed} failed\n"
+    except Exception as e:
+        job.status = 'Failed'
+        job.log += f"Error: {e}\n{traceback.format_exc()}"
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def write_zip(job, invoice_ids):
+    """Packs the combined PDFs of ``invoice_ids`` and returns the ZIP's storage name."""
+    name = BatchFinalizeJob._meta.get_field('zip_file').upload_to(job, f"batch_finalize_{job.id}.zip")
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    used = set()
+    confirmations = ConfirmationDocument.objects.filter(invoice_id__in=invoice_ids).order_by('invoice_id')
+    # PDFs are already compressed, storing them is as small and much faster
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for confirmation in confirmations.iterator():
+            if not confirmation.combined_pdf or not os.path.exists(confirmation.combined_pdf.path):
+                continue
+            arcname = os.path.basename(confirmation.combined_pdf.name)
+            if arcname in used:
+                arcname = f"{confirmation.invoice_id}_{arcname}"
+            used.add(arcname)
+            zf.write(confirmation.combined_pdf.path, arcname)
+    os.replace(tmp_path, path)
+    return name
@@ -0,0 +1,242 @@
+"""Bulk upload templates, cached on disk per type.
+
+The invoice template carries a hidden "Reference Data" sheet with every buyer,
+location and item, which is slow to build once the catalogue grows. Generated
+files are kept under MEDIA_ROOT/cache/excel_templates and keyed by a version
+stamp that is bumped whenever master data changes (see signals.py); a rebuild
+then runs in a background thread so the next download is a plain file serve.
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.worksheet.datavalidation import DataValidation
+from django.conf import settings
+
+from .models import Buyer, Item, StoreLocation
+from .exports import MASTER_HEADERS
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_TYPES = ['invoice'] + list(MASTER_HEADERS)
+# Only the invoice template embeds master data, the others are static
+DATA_DEPENDENT_TYPES = {'invoice'}
+# Bulk uploads save hundreds of rows in a burst; wait for it to settle before rebuilding
+REBUILD_DELAY = 2.0
+# Part of every cache file name; bump when the template layout changes so old files are ignored
+TEMPLATE_FORMAT = 1
+
+INVOICE_TEMPLATE_HEADERS = [
+    'Buyer Name', 'Location Name', 'Item Name', 'Item Description', 'Quantity', 'Unit Rate',
+    'SGST', 'CGST', 'IGST', 'Transport Charges', 'Total Amount',
+    'Generate Invoice (Yes/No)', 'Generate PDF (Yes/No)',
+    'Tally Invoice No. (Identifier)', 'Invoce Date',
+    "Buyer's Order No.", "Buyer's Order Date (YYYY-MM-DD)",
+    'Dispatch Doc No.', 'Dispatched Through', 'Destination',
+    'Delivery Note', 'Delivery Note Date (YYYY-MM-DD)',
+    'Mode/Terms of Payment', 'Reference No. & Date', 'Other References',
+    'Terms of Delivery', 'Remarks', 'DC Notes', 'Transport Description',
+    'Doc-1 Invoice (Path)', 'Doc-2 DC (Path)', 'Doc-3 Buyer Po (Path)', 'Doc 4 Email approal (Path)',
+    'Doc-images-1', 'Doc-images-2', 'Doc-images-3', 'Doc-images-4', 'Doc-images-5'
+]
+TEMPLATE_ROWS = 500
+
+_lock = threading.Lock()
+_rebuild_timer = None
+
+
+def cache_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'cache', 'excel_templates')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _version_file():
+    return os.path.join(cache_dir(), 'VERSION')
+
+
+def current_version():
+    try:
+        with open(_version_file()) as f:
+            return f.read().strip() or '0'
+    except OSError:
+        return '0'
+
+
+def bump_version():
+    """Marks cached data-dependent templates as stale and returns the new stamp."""
+    version = str(time.time_ns())
+    _atomic_write(_version_file(), version.encode())
+    return version
+
+
+def _atomic_write(path, data):
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(handle, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _cache_path(upload_type, version):
+    if upload_type in DATA_DEPENDENT_TYPES:
+        return os.path.join(cache_dir(), f"{upload_type}_f{TEMPLATE_FORMAT}_{version}.xlsx")
+    return os.path.join(cache_dir(), f"{upload_type}_f{TEMPLATE_FORMAT}.xlsx")
+
+
+def get_template_path(upload_type):
+    """Returns the path of an up to date template file, building it if needed."""
+    path = _cache_path(upload_type, current_version())
+    if not os.path.exists(path):
+        _build_to(upload_type, path)
+    return path
+
+
+def _build_to(upload_type, path):
+    start = time.perf_counter()
+    wb = build_template(upload_type)
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(handle)
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info("Built %s template in %.0f ms", upload_type, (time.perf_counter() - start) * 1000)
+
+
+def _remove_stale(upload_type, keep):
+    prefix = f"{upload_type}_"
+    for name in os.listdir(cache_dir()):
+        path = os.path.join(cache_dir(), name)
+        if name.startswith(prefix) and name.endswith('.xlsx') and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                # Still being served (Windows keeps open files locked); next cleanup gets it
+                pass
+
+
+def rebuild_templates():
+    """Builds the data-dependent templates for the current version and drops older ones."""
+    for upload_type in DATA_DEPENDENT_TYPES:
+        try:
+            path = get_template_path(upload_type)
+            _remove_stale(upload_type, keep=path)
+        except Exception:
+            logger.exception("Rebuilding the %s template failed", upload_type)
+
+
+def invalidate_templates():
+    """Bumps the version and schedules one background rebuild for a burst of changes."""
+    global _rebuild_timer
+    bump_version()
+    with _lock:
+        if _rebuild_timer is not None:
+            _rebuild_timer.cancel()
+        _rebuild_timer = threading.Timer(REBUILD_DELAY, _run_rebuild)
+        _rebuild_timer.daemon = True
+        _rebuild_timer.start()
+
+
+def _run_rebuild():
+    global _rebuild_timer
+    with _lock:
+        _rebuild_timer = None
+    try:
+        rebuild_templates()
+    finally:
+        # Threads get their own DB connection; close it so SQLite isn't left locked
+        from django.db import connection
+        connection.close()
+
+
+# --- BUILDERS ---
+
+def build_template(upload_type):
+    """Builds the formatted template workbook for an upload type."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = f"{upload_type.title()} Template"
+
+    if upload_type in MASTER_HEADERS:
+        headers, widths = MASTER_HEADERS[upload_type]
+    else:  # Invoice
+        headers = INVOICE_TEMPLATE_HEADERS
+        # Widths mostly uniform
+        widths = [25] * len(headers)
+        widths[0] = 30  # Buyer
+        widths[1] = 30  # Location
+        widths[2] = 30  # Item
+        widths[3] = 40  # Description
+
+    ws.append(headers)
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="808080", end_color="808080", fill_type="solid")  # Grey
+    blue_fill = PatternFill(start_color="0070C0", end_color="0070C0", fill_type="solid")  # Blue
+
+    for cell in ws[1]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal='center')
+
+    # Blue First Column Header
+    ws['A1'].fill = blue_fill
+
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
+
+    if upload_type == 'invoice':
+        _add_invoice_reference_data(wb, ws)
+    return wb
+
+
+def _add_invoice_reference_data(wb, ws):
+    """Hidden reference sheet with dropdown sources, plus validations and price lookups."""
+    data_ws = wb.create_sheet("Reference Data")
+    data_ws.sheet_state = 'hidden'
+
+    buyers = list(Buyer.objects.values_list('name', flat=True))
+    locations = list(StoreLocation.objects.values_list('name', flat=True))
+    # Item Data for Auto-Fill (Name, Price, GST)
+    items = list(Item.objects.values_list('name', 'price', 'gst_rate'))
+
+    for i, b in enumerate(buyers, 1):
+        data_ws.cell(row=i, column=1, value=b)
+    for i, l in enumerate(locations, 1):
+        data_ws.cell(row=i, column=2, value=l)
+    # Items in Cols 3, 4, 5 (C, D, E) (Reference Sheet)
+    for i, (name, price, gst) in enumerate(items, 1):
+        data_ws.cell(row=i, column=3, value=name)
+        data_ws.cell(row=i, column=4, value=price)
+        data_ws.cell(row=i, column=5, value=gst)
+
+    def add_val(col, valid_range):
+        dv = DataValidation(type="list", formula1=valid_range, allow_blank=True)
+        ws.add_data_validation(dv)
+        dv.add(f"{col}2:{col}{TEMPLATE_ROWS}")
+
+    if buyers: add_val('A', f"'Reference Data'!$A$1:$A${len(buyers)}")
+    if locations: add_val('B', f"'Reference Data'!$B$1:$B${len(locations)}")
+    if items: add_val('C', f"'Reference Data'!$C$1:$C${len(items)}")
+
+    # Unit Rate (F) auto-fills from Reference Data D (Price) based on C (Item Name)
+    for r in range(2, TEMPLATE_ROWS + 1):
+        ws[f'F{r}'] = f"=IFERROR(VLOOKUP(C{r}, 'Reference Data'!$C$1:$E${len(items)+1}, 2, FALSE), \"\")"
+
+    # Yes/No Dropdowns for L (Gen Invoice) and M (Gen PDF)
+    dv_yn = DataValidation(type="list", formula1='"Yes,No"', allow_blank=False)
+    ws.add_data_validation(dv_yn)
+    dv_yn.add(f"L2:L{TEMPLATE_ROWS}")
+    dv_yn.add(f"M2:M{TEMPLATE_ROWS}")
+
+    # Defaults
+    ws['L2'] = "Yes"
+    ws['M2'] = "Yes"
+    ws['W2'] = "30 Days"  # Mode/Terms of Payment
+    ws['Y2'] = "EMAIL Approval"  # Other References
@@ -0,0 +1,215 @@
+"""Streaming Excel exports built on openpyxl write-only workbooks.
+
+Rows are pulled from ``.iterator(chunk_size=...)`` querysets and written straight
+into a write-only workbook backed by a temporary file, so memory use stays flat
+no matter how many invoices are exported.
+"""
+import datetime
+import tempfile
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+from django.db.models import Case, When
+from django.http import FileResponse
+from django.utils import timezone
+
+from .models import (
+    Buyer, Item, StoreLocation, SalesInvoice, InvoiceItem,
+    get_company_state_code, split_gst, TRANSPORT_GST_RATE, TRANSPORT_HSN
+)
+
+EXPORT_CHUNK_SIZE = 2000
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill(start_color="808080", end_color="808080", fill_type="solid")  # Grey
+FIRST_HEADER_FILL = PatternFill(start_color="0070C0", end_color="0070C0", fill_type="solid")  # Blue
+
+# Headers match the bulk upload templates so an export can be edited and re-uploaded
+MASTER_HEADERS = {
+    'buyer': (["Buyer Name*", "Address", "GSTIN", "State", "Phone", "Email"], [30, 40, 20, 20, 20, 30]),
+    'item': (["Item Name*", "Category", "Article/SKU", "Description", "Price*", "GST Rate (0.18)*", "HSN Code", "Unit (Nos)"],
+             [30, 20, 20, 40, 15, 15, 15, 15]),
+    'location': (["Location Name*", "Site Code", "Address", "City", "State", "GSTIN", "Priority"],
+                 [30, 15, 40, 20, 20, 20, 15]),
+}
+
+INVOICE_HEADERS = [
+    'App Invoice No.', 'Tally Invoice No.', 'Invoice Date', 'Status', 'Buyer', 'Customer GSTIN',
+    'Location', 'Site Code', 'Place of Supply', 'Taxable Value', 'CGST', 'SGST', 'IGST',
+    'Transport Charges', 'Total Amount',
+]
+LINE_ITEM_HEADERS = [
+    'App Invoice No.', 'Tally Invoice No.', 'Invoice Date', 'Location', 'Item Name', 'Article/SKU',
+    'HSN/SAC', 'Description', 'Quantity', 'Quantity Billed', 'Unit Rate', 'Discount Type',
+    'Discount Value', 'Taxable Value', 'GST Rate', 'CGST', 'SGST', 'IGST', 'Line Total',
+]
+
+
+class ExportSheet:
+    """One worksheet of an export: a title, header row, column widths and a row iterator."""
+
+    def __init__(self, title, headers, rows, widths=None):
+        self.title = title
+        self.headers = headers
+        self.rows = rows
+        self.widths = widths or [20] * len(headers)
+
+
+def write_workbook(sheets, target):
+    """Writes the sheets into a write-only workbook and saves it to ``target`` (path or file object)."""
+    wb = openpyxl.Workbook(write_only=True)
+    for sheet in sheets:
+        ws = wb.create_sheet(title=sheet.title[:31])
+        # Column widths must be set before the first row in write-only mode
+        for i, width in enumerate(sheet.widths, 1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+
+        header = []
+        for i, title in enumerate(sheet.headers):
+            cell = WriteOnlyCell(ws, value=title)
+            cell.font = HEADER_FONT
+            cell.fill = FIRST_HEADER_FILL if i == 0 else HEADER_FILL
+            cell.alignment = Alignment(horizontal='center')
+            header.append(cell)
+        ws.append(header)
+
+        for row in sheet.rows:
+            ws.append(row)
+    wb.save(target)
+
+
+def workbook_response(sheets, filename):
+    """Builds the workbook in a temporary file and streams it back in chunks."""
+    # TemporaryFile is removed when FileResponse closes it (also on Windows)
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    write_workbook(sheets, tmp)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def export_filename(label, mode="Export"):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
+    return f"Bulk_{label}_{mode}_{timestamp}.xlsx"
+
+
+# --- MASTER DATA ---
+
+def buyer_rows():
+    qs = Buyer.objects.order_by('name').values_list('name', 'address', 'gstin', 'state')
+    for name, address, gstin, state in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # Phone/Email columns are kept for template compatibility; Buyer has no such fields
+        yield [name, address, gstin, state, "", ""]
+
+
+def item_rows():
+    qs = Item.objects.order_by('name').values_list(
+        'name', 'category__name', 'article_code', 'description', 'price', 'gst_rate', 'hsn_code', 'unit'
+    )
+    for name, category, article, description, price, gst_rate, hsn_code, unit in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [name, category or "", article, description, price, float(gst_rate) if gst_rate else 0.00, hsn_code, unit]
+
+
+def location_rows():
+    qs = StoreLocation.objects.order_by('name').values_list('name', 'site_code', 'address', 'city', 'state', 'gstin', 'priority')
+    for row in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield list(row)
+
+
+MASTER_ROWS = {'buyer': buyer_rows, 'item': item_rows, 'location': location_rows}
+
+
+def master_data_sheets(upload_type):
+    headers, widths = MASTER_HEADERS[upload_type]
+    return [ExportSheet(f"{upload_type.title()} Data", headers, MASTER_ROWS[upload_type](), widths)]
+
+
+# --- INVOICES ---
+
+def parse_date_range(date_from, date_to):
+    """Turns 'YYYY-MM-DD' strings into aware datetime bounds [start, end). Invalid values are ignored."""
+    def parse(value):
+        try:
+            return datetime.datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return None
+
+    start, end = parse(date_from), parse(date_to)
+    tz = timezone.get_current_timezone()
+    start_dt = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min), tz) if start else None
+    end_dt = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min), tz) if end else None
+    return start_dt, end_dt
+
+
+def filter_by_date(queryset, start, end, field='date'):
+    if start:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    return queryset
+
+
+def _local_date(value):
+    return timezone.localtime(value).date() if value else None
+
+
+def invoice_rows(start=None, end=None):
+    # Trashed transport charges are not billed
+    transport = Case(When(transportcharges__is_deleted=False, then='transportcharges__charges'))
+    qs = filter_by_date(SalesInvoice.objects.all(), start, end).order_by('date', 'id').annotate(transport=transport).values_list(
+        'app_invoice_number', 'tally_invoice_number', 'date', 'status', 'buyer__name', 'customer_gstin',
+        'location__name', 'location__site_code', 'place_of_supply', 'cgst_total', 'sgst_total', 'igst_total',
+        'transport', 'total',
+    )
+    for (app_no, tally_no, date, status, buyer, gstin, location, site_code, pos,
+         cgst, sgst, igst, transport, total) in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        taxable = total - cgst - sgst - igst
+        yield [app_no, tally_no, _local_date(date), status, buyer, gstin, location, site_code, pos,
+               taxable, cgst, sgst, igst, transport, total]
+
+
+def line_item_rows(start=None, end=None):
+    company_state_code = get_company_state_code()
+    qs = filter_by_date(InvoiceItem.objects.filter(invoice__is_deleted=False), start, end, field='invoice__date')
+    qs = qs.order_by('invoice__date', 'invoice_id', 'id').values_list(
+        'invoice__app_invoice_number', 'invoice__tally_invoice_number', 'invoice__date', 'invoice__location__name',
+        'invoice__place_of_supply', 'invoice__location__state_code', 'item__name', 'item__article_code',
+        'item__hsn_sac', 'description', 'quantity', 'quantity_billed', 'price', 'discount_type', 'discount_value',
+        'gst_rate',
+    )
+    for (app_no, tally_no, date, location, pos, location_state, item_name, article, hsn, description,
+         quantity, quantity_billed, price, discount_type, discount_value, gst_rate) in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        is_inter_state = (pos or location_state) != company_state_code
+        _, _, taxable = InvoiceItem.compute_taxable(quantity_billed, price, discount_type, discount_value)
+        tax, cgst, sgst, igst = split_gst(taxable, gst_rate, is_inter_state)
+        yield [app_no, tally_no, _local_date(date), location, item_name, article, hsn, description,
+               quantity, quantity_billed, price, discount_type, discount_value, taxable, gst_rate,
+               cgst, sgst, igst, taxable + tax]
+
+
+def transport_line_rows(start=None, end=None):
+    """Transport charges as extra tax lines, so line-item totals add up to invoice totals."""
+    company_state_code = get_company_state_code()
+    qs = filter_by_date(SalesInvoice.objects.filter(transportcharges__charges__gt=0, transportcharges__is_deleted=False), start, end)
+    qs = qs.order_by('date', 'id').values_list(
+        'app_invoice_number', 'tally_invoice_number', 'date', 'location__name', 'place_of_supply',
+        'location__state_code', 'transportcharges__charges', 'transportcharges__description',
+    )
+    for app_no, tally_no, date, location, pos, location_state, charges, description in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        is_inter_state = (pos or location_state) != company_state_code
+        tax, cgst, sgst, igst = split_gst(charges, TRANSPORT_GST_RATE, is_inter_state)
+        yield [app_no, tally_no, _local_date(date), location, 'Transport Charges', '', TRANSPORT_HSN, description,
+               1, 1, charges, '', 0, charges, TRANSPORT_GST_RATE, cgst, sgst, igst, charges + tax]
+
+
+def invoice_sheets(start=None, end=None):
+    def all_lines():
+        yield from line_item_rows(start, end)
+        yield from transport_line_rows(start, end)
+
+    return [
+        ExportSheet('Invoices', INVOICE_HEADERS, invoice_rows(start, end), [18, 18, 14, 8, 30, 18, 30, 12, 10, 15, 12, 12, 12, 15, 15]),
+        ExportSheet('Line Items', LINE_ITEM_HEADERS, all_lines(), [18, 18, 14, 30, 30, 15, 10, 40] + [12] * 11),
+    ]
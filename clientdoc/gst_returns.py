@@ -0,0 +1,247 @@
+"""GSTR-1 style return data for a date range.
+
+Every section is one aggregate query over the stored InvoiceTaxLine rows (see
+``SalesInvoice.calculate_gst_totals``), so normally no invoice is recalculated
+here. Invoices of the period that have no stored lines are counted and their
+lines built in memory, so they are never silently left out. The sections are
+streamed out either as a write-only workbook or as JSON.
+
+Invoices with a customer GSTIN are B2B, all others are summarised as B2C by place
+of supply and rate. Trashed invoices only show up as cancelled in the document
+summary.
+"""
+import heapq
+import json
+import logging
+import re
+
+from django.db.models import Count, Q, Sum
+from django.http import StreamingHttpResponse
+
+from .exports import EXPORT_CHUNK_SIZE, ExportSheet, _local_date, filter_by_date, workbook_response
+from .models import (
+    InvoiceItem, InvoiceTaxLine, SalesInvoice, TRANSPORT_GST_RATE, TRANSPORT_HSN, get_company_state_code,
+    prefetch_invoice_lines,
+)
+
+logger = logging.getLogger(__name__)
+
+TAX_SUMS = {
+    'taxable': Sum('taxable_value'),
+    'igst': Sum('igst'),
+    'cgst': Sum('cgst'),
+    'sgst': Sum('sgst'),
+}
+
+
+class ReturnSection:
+    """One part of the return: a sheet title, JSON key, (header, key) columns and a row iterator."""
+
+    def __init__(self, title, key, columns, rows, widths):
+        self.title = title
+        self.key = key
+        self.headers = [header for header, _ in columns]
+        self.keys = [key for _, key in columns]
+        self.rows = rows
+        self.widths = widths
+
+
+def _tax_lines(start, end):
+    return filter_by_date(InvoiceTaxLine.objects.filter(invoice__is_deleted=False), start, end, field='invoice__date')
+
+
+def computed_tax_lines(start=None, end=None):
+    """Tax lines of the period's active invoices that have none stored, built in memory (not saved)."""
+    # Invoices without items or transport have no lines to miss
+    billable = Q(invoiceitem__isnull=False) | Q(transportcharges__charges__gt=0, transportcharges__is_deleted=False)
+    invoices = list(
+        filter_by_date(SalesInvoice.objects.filter(billable, tax_lines__isnull=True).distinct(), start, end)
+        .select_related('buyer', 'location', 'transportcharges')
+    )
+    if not invoices:
+        return []
+    logger.warning("GSTR-1: %d invoices have no stored tax lines, computing them (run rebuild_tax_lines --missing)",
+                   len(invoices))
+    prefetch_invoice_lines(invoices)
+    company_state_code = get_company_state_code()
+    lines = []
+    for invoice in invoices:
+        place_of_supply = invoice.place_of_supply or (invoice.location.state_code if invoice.location else '29')
+        lines += invoice.build_tax_lines(place_of_supply != company_state_code)[0]
+    return lines
+
+
+def _line_values(line):
+    """An unsaved tax line as the row dict of the aggregate queries below."""
+    invoice = line.invoice
+    return {
+        'invoice_id': invoice.id, 'invoice__customer_gstin': invoice.customer_gstin,
+        'invoice__buyer__name': invoice.buyer.name if invoice.buyer else None,
+        'invoice__location__name': invoice.location.name if invoice.location else None,
+        'invoice__tally_invoice_number': invoice.tally_invoice_number,
+        'invoice__app_invoice_number': invoice.app_invoice_number, 'invoice__date': invoice.date,
+        'invoice__total': invoice.total, 'invoice__place_of_supply': invoice.place_of_supply,
+        'hsn': line.hsn, 'gst_rate': line.gst_rate, 'invoices': 1,
+        'taxable': line.taxable_value, 'igst': line.igst, 'cgst': line.cgst, 'sgst': line.sgst,
+    }
+
+
+def _merge_sums(rows, extra, keys, fields=tuple(TAX_SUMS)):
+    """Adds the ``extra`` row dicts into the grouped ``rows`` by ``keys``, summing ``fields``; sorted by ``keys``."""
+    merged = {tuple(row[k] for k in keys): dict(row) for row in rows}
+    for row in extra:
+        key = tuple(row[k] for k in keys)
+        if key in merged:
+            for field in fields:
+                merged[key][field] += row[field]
+        else:
+            merged[key] = dict(row)
+    return [merged[key] for key in sorted(merged, key=lambda key: tuple('' if k is None else k for k in key))]
+
+
+def _has_gstin():
+    return Q(invoice__customer_gstin__isnull=False) & ~Q(invoice__customer_gstin='')
+
+
+def b2b_rows(start=None, end=None, computed=None):
+    """One row per invoice and rate, grouped by the receiver's GSTIN."""
+    computed = computed_tax_lines(start, end) if computed is None else computed
+    qs = _tax_lines(start, end).filter(_has_gstin()).values(
+        'invoice_id', 'invoice__customer_gstin', 'invoice__buyer__name', 'invoice__location__name',
+        'invoice__tally_invoice_number', 'invoice__app_invoice_number', 'invoice__date', 'invoice__total',
+        'invoice__place_of_supply', 'gst_rate',
+    ).annotate(**TAX_SUMS).order_by('invoice__customer_gstin', 'invoice__date', 'invoice_id', 'gst_rate')
+
+    order = ('invoice__customer_gstin', 'invoice__date', 'invoice_id', 'gst_rate')
+    # Computed lines are per HSN; summed per invoice and rate they merge into the query's order
+    extra = _merge_sums([], [_line_values(line) for line in computed if line.invoice.customer_gstin], order)
+    rows = heapq.merge(qs.iterator(chunk_size=EXPORT_CHUNK_SIZE), extra, key=lambda row: tuple(row[k] for k in order))
+    for row in rows:
+        yield [
+            row['invoice__customer_gstin'], row['invoice__buyer__name'] or row['invoice__location__name'],
+            row['invoice__tally_invoice_number'] or row['invoice__app_invoice_number'], _local_date(row['invoice__date']),
+            row['invoice__total'], row['invoice__place_of_supply'], row['gst_rate'] * 100,
+            row['taxable'], row['igst'], row['cgst'], row['sgst'],
+        ]
+
+
+def b2c_rows(start=None, end=None, computed=None):
+    """Unregistered receivers, summed per place of supply and rate."""
+    computed = computed_tax_lines(start, end) if computed is None else computed
+    qs = _tax_lines(start, end).exclude(_has_gstin()).values('invoice__place_of_supply', 'gst_rate').annotate(
+        invoices=Count('invoice', distinct=True), **TAX_SUMS,
+    ).order_by('invoice__place_of_supply', 'gst_rate')
+    rows = qs.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    keys = ('invoice__place_of_supply', 'gst_rate')
+    # Summed per invoice first, so each computed invoice counts once per rate
+    extra = _merge_sums([], [_line_values(line) for line in computed if not line.invoice.customer_gstin], ('invoice_id',) + keys)
+    if extra:
+        rows = _merge_sums(rows, extra, keys, fields=('invoices',) + tuple(TAX_SUMS))
+    for row in rows:
+        supply_type = 'Inter-State' if row['igst'] else 'Intra-State'
+        yield [
+            row['invoice__place_of_supply'], supply_type, row['gst_rate'] * 100, row['invoices'],
+            row['taxable'], row['igst'], row['cgst'], row['sgst'],
+        ]
+
+
+def hsn_rows(start=None, end=None, computed=None):
+    """HSN/SAC and rate totals; quantities are the billed quantities of the line items (transport counts once per invoice)."""
+    computed = computed_tax_lines(start, end) if computed is None else computed
+    items = filter_by_date(InvoiceItem.objects.filter(invoice__is_deleted=False), start, end, field='invoice__date')
+    quantities = {
+        (hsn, rate): qty
+        for hsn, rate, qty in items.values('item__hsn_sac', 'gst_rate').annotate(qty=Sum('quantity_billed'))
+        .values_list('item__hsn_sac', 'gst_rate', 'qty')
+    }
+    invoices = filter_by_date(
+        SalesInvoice.objects.filter(transportcharges__charges__gt=0, transportcharges__is_deleted=False), start, end,
+    )
+    transport_key = (TRANSPORT_HSN, TRANSPORT_GST_RATE)
+    quantities[transport_key] = quantities.get(transport_key, 0) + invoices.count()
+
+    rows = _tax_lines(start, end).values('hsn', 'gst_rate').annotate(**TAX_SUMS).order_by('hsn', 'gst_rate')
+    if computed:
+        rows = _merge_sums(rows, [_line_values(line) for line in computed], ('hsn', 'gst_rate'))
+    for row in rows:
+        tax = row['igst'] + row['cgst'] + row['sgst']
+        # Services (chapter 99) have no unit quantity code
+        uqc = 'NA' if row['hsn'].startswith('99') else 'NOS-NUMBERS'
+        yield [
+            row['hsn'], uqc, quantities.get((row['hsn'], row['gst_rate']), 0), row['gst_rate'] * 100,
+            row['taxable'] + tax, row['taxable'], row['igst'], row['cgst'], row['sgst'],
+        ]
+
+
+def _serial_key(number):
+    """Orders document numbers by their trailing number ('Tsol-100000' after 'Tsol-99999'), then as text."""
+    match = re.search(r'(\d+)\D*$', number)
+    return (int(match.group(1)) if match else -1, number)
+
+
+def document_rows(start=None, end=None):
+    """Number ranges of the invoices issued in the period; trashed invoices count as cancelled."""
+    invoices = filter_by_date(SalesInvoice.all_objects.all(), start, end)
+    for label, field in (('App invoice numbers', 'app_invoice_number'), ('Tally invoice numbers', 'tally_invoice_number')):
+        numbered = invoices.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        summary = numbered.aggregate(total=Count('id'), cancelled=Count('id', filter=Q(is_deleted=True)))
+        if summary['total']:
+            # Compared in Python: as text 'Tsol-100000' sorts before 'Tsol-99999'
+            keys = [_serial_key(number) for number in numbered.values_list(field, flat=True).iterator(chunk_size=5000)]
+            yield [
+                'Invoices for outward supply', label, min(keys)[1], max(keys)[1],
+                summary['total'], summary['cancelled'], summary['total'] - summary['cancelled'],
+            ]
+
+
+def gstr1_sections(start=None, end=None):
+    computed = computed_tax_lines(start, end)
+    return [
+        ReturnSection('B2B', 'b2b', [
+            ('Receiver GSTIN', 'gstin'), ('Receiver Name', 'receiver'), ('Invoice No.', 'invoice_number'),
+            ('Invoice Date', 'invoice_date'), ('Invoice Value', 'invoice_value'), ('Place of Supply', 'place_of_supply'),
+            ('Rate %', 'rate'), ('Taxable Value', 'taxable_value'), ('IGST', 'igst'), ('CGST', 'cgst'), ('SGST', 'sgst'),
+        ], b2b_rows(start, end, computed), [18, 30, 18, 14, 15, 10, 8, 15, 12, 12, 12]),
+        ReturnSection('B2C', 'b2c', [
+            ('Place of Supply', 'place_of_supply'), ('Supply Type', 'supply_type'), ('Rate %', 'rate'),
+            ('Invoices', 'invoices'), ('Taxable Value', 'taxable_value'), ('IGST', 'igst'), ('CGST', 'cgst'), ('SGST', 'sgst'),
+        ], b2c_rows(start, end, computed), [15, 14, 8, 10, 15, 12, 12, 12]),
+        ReturnSection('HSN Summary', 'hsn', [
+            ('HSN/SAC', 'hsn'), ('UQC', 'uqc'), ('Total Quantity', 'quantity'), ('Rate %', 'rate'),
+            ('Total Value', 'total_value'), ('Taxable Value', 'taxable_value'), ('IGST', 'igst'), ('CGST', 'cgst'), ('SGST', 'sgst'),
+        ], hsn_rows(start, end, computed), [12, 14, 14, 8, 15, 15, 12, 12, 12]),
+        ReturnSection('Documents', 'documents', [
+            ('Nature of Document', 'nature'), ('Series', 'series'), ('Sr. No. From', 'from'), ('Sr. No. To', 'to'),
+            ('Total Number', 'total'), ('Cancelled', 'cancelled'), ('Net Issued', 'net_issued'),
+        ], document_rows(start, end), [28, 22, 18, 18, 12, 12, 12]),
+    ]
+
+
+def gstr1_workbook_response(sections, filename):
+    return workbook_response([ExportSheet(s.title, s.headers, s.rows, s.widths) for s in sections], filename)
+
+
+def _json_value(value):
+    if hasattr(value, 'as_tuple'):  # Decimal
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def gstr1_json_chunks(sections, period):
+    """Yields the return as one JSON object, a row at a time."""
+    yield '{"period": ' + json.dumps(period)
+    for section in sections:
+        yield f', "{section.key}": ['
+        for i, row in enumerate(section.rows):
+            record = {key: _json_value(value) for key, value in zip(section.keys, row)}
+            yield (', ' if i else '') + json.dumps(record)
+        yield ']'
+    yield '}'
+
+
+def gstr1_json_response(sections, period, filename):
+    response = StreamingHttpResponse(gstr1_json_chunks(sections, period), content_type='application/json')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
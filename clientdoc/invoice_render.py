@@ -0,0 +1,164 @@
+"""Read-only view of an invoice for the printed documents.
+
+The invoice PDF, the DC PDF and their HTML print pages all show the same line
+rows and totals. ``build_invoice_render`` loads the lines with their items in
+one query and collects everything the documents need in a single pass. The
+lines are loaded as a prefetch, so calling ``prefetch_lines`` before
+``calculate_gst_totals`` lets both share that query.
+
+The HSN/rate tax matrix is read from the stored InvoiceTaxLine rows; invoices
+whose totals were never recalculated since those were added get them computed
+on the fly instead.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from .models import TransportCharges, TRANSPORT_GST_RATE, TRANSPORT_HSN, get_company_state_code, prefetch_invoice_lines
+
+ZERO = Decimal('0.00')
+
+
+@dataclass(frozen=True)
+class RenderLine:
+    number: int
+    name: str
+    # Snapshot description, falling back to the item master's
+    description: str
+    # Item master description only (the DC never showed the snapshot)
+    item_description: str
+    hsn: str
+    unit: str
+    quantity: int
+    price: Decimal
+    gst_rate: Decimal
+    taxable: Decimal
+
+
+@dataclass(frozen=True)
+class TransportLine:
+    number: int
+    description: str
+    hsn: str
+    charges: Decimal
+    gst_rate: Decimal
+
+
+@dataclass(frozen=True)
+class TaxBucket:
+    hsn: str
+    gst_rate: Decimal
+    taxable: Decimal
+    cgst: Decimal
+    sgst: Decimal
+    igst: Decimal
+
+    @classmethod
+    def from_tax_line(cls, line):
+        return cls(line.hsn, line.gst_rate, line.taxable_value, line.cgst, line.sgst, line.igst)
+
+    @property
+    def half_rate_percent(self):
+        # CGST and SGST rate, each half of the GST rate
+        return self.gst_rate * 50
+
+    @property
+    def tax(self):
+        return self.cgst + self.sgst + self.igst
+
+
+@dataclass(frozen=True)
+class InvoiceRender:
+    lines: tuple
+    transport: TransportLine  # None when there are no transport charges
+    tax_buckets: tuple
+    total_qty: int
+    taxable: Decimal
+    cgst: Decimal
+    sgst: Decimal
+    igst: Decimal
+    total: Decimal
+    is_igst: bool
+    amount_in_words: str
+    tax_amount_in_words: str
+
+    @property
+    def tax(self):
+        return self.cgst + self.sgst + self.igst
+
+
+def prefetch_lines(invoice):
+    """Loads ``invoice.invoiceitem_set`` with the items in one query; a no-op when already loaded."""
+    prefetch_invoice_lines([invoice])
+
+
+def _transport_charges(invoice):
+    try:
+        charges = invoice.transportcharges
+    except TransportCharges.DoesNotExist:
+        return None
+    return None if charges.is_deleted else charges
+
+
+def build_invoice_render(invoice, company=None):
+    """Builds the InvoiceRender of ``invoice``; totals are read from its (already calculated) fields.
+
+    ``company`` only supplies the seller's state code; without one it is looked up.
+    """
+    prefetch_lines(invoice)
+    company_state_code = getattr(company, 'state_code', None) or get_company_state_code()
+    place_of_supply = invoice.place_of_supply or (invoice.location.state_code if invoice.location else '29')
+    is_igst = place_of_supply != company_state_code
+
+    lines = []
+    total_qty = 0
+    taxable_total = ZERO
+
+    for number, invoice_item in enumerate(invoice.invoiceitem_set.all(), 1):
+        item = invoice_item.item
+        gst_rate = invoice_item.gst_rate if invoice_item.gst_rate is not None else item.gst_rate
+        taxable = invoice_item.taxable_value
+        lines.append(RenderLine(
+            number=number,
+            name=item.name,
+            description=invoice_item.description or item.description or '',
+            item_description=item.description or '',
+            hsn=item.hsn_sac,
+            unit=item.unit or 'Nos',
+            quantity=invoice_item.quantity,
+            price=invoice_item.price,
+            gst_rate=gst_rate,
+            taxable=taxable,
+        ))
+        total_qty += invoice_item.quantity
+        taxable_total += taxable
+
+    transport = None
+    charges = _transport_charges(invoice)
+    if charges and charges.charges > 0:
+        transport = TransportLine(
+            number=len(lines) + 1,
+            description=charges.description or '',
+            hsn=TRANSPORT_HSN,
+            charges=charges.charges,
+            gst_rate=TRANSPORT_GST_RATE,
+        )
+        taxable_total += charges.charges
+
+    tax_lines = list(invoice.tax_lines.all())
+    if not tax_lines and (lines or transport):
+        tax_lines = invoice.build_tax_lines(is_igst)[0]
+
+    return InvoiceRender(
+        lines=tuple(lines),
+        transport=transport,
+        tax_buckets=tuple(TaxBucket.from_tax_line(line) for line in tax_lines),
+        total_qty=total_qty,
+        taxable=taxable_total,
+        cgst=invoice.cgst_total,
+        sgst=invoice.sgst_total,
+        igst=invoice.igst_total,
+        total=invoice.total,
+        is_igst=is_igst,
+        amount_in_words=invoice.amount_in_words or '',
+        tax_amount_in_words=invoice.tax_amount_in_words or '',
+    )
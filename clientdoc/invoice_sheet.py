@@ -0,0 +1,236 @@
+"""Reading and validating bulk invoice upload sheets.
+
+``parse_invoice_sheet`` is shared by the real import (views.process_invoice_upload)
+and ``validate_invoice_sheet``, the dry run that checks a sheet against the
+master data without writing anything.
+"""
+import os
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+from django.db.models.functions import Upper
+
+from .models import Buyer, Item, StoreLocation, SalesInvoice
+
+# Column positions in the invoice template (see excel_templates.INVOICE_TEMPLATE_HEADERS)
+# 0: Buyer, 1: Location, 2: Item, 3: Description, 4: Qty, 5: Unit Rate, 6: SGST, 7: CGST, 8: IGST,
+# 9: Trans Charges, 10: Total, 11: Gen Inv, 12: Gen PDF, 13: Tally Inv, 14: Inv Date
+DATE_COLUMNS = {'inv_date': 14, 'buyer_ord_date': 16, 'del_note_date': 21}
+FILE_COLUMNS = ['doc_inv', 'doc_dc', 'doc_po', 'doc_email'] + [f'doc_img_{i}' for i in range(1, 6)]
+MAX_REPORTED_ISSUES = 1000
+
+
+def parse_date(date_val):
+    if not date_val: return None
+    if isinstance(date_val, datetime): return date_val
+    try: return datetime.strptime(str(date_val).strip(), '%Y-%m-%d')
+    except ValueError: return None
+
+
+def is_yes(value):
+    return bool(value) and str(value).strip().lower() == 'yes'
+
+
+def parse_invoice_sheet(file):
+    """Reads the sheet and groups rows per invoice (by tally number, else one invoice per row).
+
+    Returns ``(grouped_rows, log, skipped)`` where ``skipped`` lists ``(row, reason)`` for rows
+    left out ('not_generated' or 'missing_data'). Row dicts keep the raw date cells so the
+    validator can report on them.
+    """
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        log = []
+        skipped = []
+        grouped_rows = {}
+
+        for index, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            if not row or not any(row): continue
+
+            def get_col(idx): return row[idx] if idx < len(row) else None
+
+            if not is_yes(get_col(11)):
+                log.append(f"Row {index}: Skipped (Generate != Yes)")
+                skipped.append((index, 'not_generated'))
+                continue
+
+            location_name = get_col(1)
+            item_name = get_col(2)
+            qty = get_col(4)
+
+            if not (location_name and item_name and qty):
+                log.append(f"Row {index}: Skipped (Missing essential Item/Location data)")
+                skipped.append((index, 'missing_data'))
+                continue
+
+            tally_no = str(get_col(13)).strip() if get_col(13) else None
+            key = f"TALLY::{tally_no}" if tally_no else f"UNIQUE::{uuid.uuid4()}"
+
+            row_data = {
+                'index': index,
+                'buyer_name': get_col(0),
+                'location_name': location_name,
+                'item_name': item_name,
+                'item_desc': get_col(3),
+                'qty': qty,
+                'unit_rate': get_col(5),
+                'trans_charges': get_col(9),
+                'gen_pdf': get_col(12),
+                'tally_no': tally_no,
+                'buyer_ord_no': get_col(15),
+                'disp_doc_no': get_col(17),
+                'disp_through': get_col(18),
+                'dest': get_col(19),
+                'del_note': get_col(20),
+                'pay_terms': get_col(22) or "30 Days",
+                'ref_no': get_col(23),
+                'other_ref': get_col(24) or "EMAIL Approval",
+                'terms_del': get_col(25),
+                'remark': get_col(26),
+                'dc_notes': get_col(27),
+                'trans_desc': get_col(28),
+                # File Paths
+                'doc_inv': get_col(29),
+                'doc_dc': get_col(30),
+                'doc_po': get_col(31),
+                'doc_email': get_col(32),
+                'doc_img_1': get_col(33),
+                'doc_img_2': get_col(34),
+                'doc_img_3': get_col(35),
+                'doc_img_4': get_col(36),
+                'doc_img_5': get_col(37),
+                'raw_dates': {},
+            }
+            for field, col in DATE_COLUMNS.items():
+                row_data[field] = parse_date(get_col(col))
+                row_data['raw_dates'][field] = get_col(col)
+            grouped_rows.setdefault(key, []).append(row_data)
+
+        return grouped_rows, log, skipped
+    finally:
+        # Read-only workbooks keep the file open (and locked on Windows) until closed
+        wb.close()
+
+
+# --- VALIDATION ---
+
+class NameIndex:
+    """Case-insensitive name lookup built from one query, matching the import's __iexact lookups."""
+
+    def __init__(self, queryset):
+        self.names = {str(name).strip().upper() for name in queryset.values_list('name', flat=True).iterator()}
+
+    def __contains__(self, name):
+        return str(name).strip().upper() in self.names
+
+
+class ValidationReport:
+    def __init__(self):
+        self.issues = []
+        self.error_count = 0
+        self.warning_count = 0
+        self.rows = 0
+        self.skipped = 0
+        self.groups = 0
+        self.would_create = 0
+        self.would_update = 0
+        self.seconds = 0.0
+
+    def add(self, row, column, message, level='error'):
+        if level == 'error':
+            self.error_count += 1
+        else:
+            self.warning_count += 1
+        if len(self.issues) < MAX_REPORTED_ISSUES:
+            self.issues.append({'row': row, 'column': column, 'message': message, 'level': level})
+
+    @property
+    def is_valid(self):
+        return self.error_count == 0
+
+    @property
+    def truncated(self):
+        return self.error_count + self.warning_count > len(self.issues)
+
+
+def _is_number(value, whole=False):
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return False
+    if not number.is_finite():
+        return False
+    return number == number.to_integral_value() if whole else True
+
+
+def _existing_tally_numbers(tally_numbers):
+    found = set()
+    numbers = sorted({t.upper() for t in tally_numbers})
+    for i in range(0, len(numbers), 500):
+        found.update(
+            SalesInvoice.objects.annotate(tally_upper=Upper('tally_invoice_number'))
+            .filter(tally_upper__in=numbers[i:i + 500])
+            .values_list('tally_upper', flat=True)
+        )
+    return found
+
+
+def validate_invoice_sheet(file):
+    """Dry run of an invoice upload: reports row level problems without writing anything."""
+    started = time.perf_counter()
+    report = ValidationReport()
+
+    grouped_rows, _, skipped = parse_invoice_sheet(file)
+    for row, reason in skipped:
+        if reason == 'not_generated':
+            report.skipped += 1
+        else:
+            report.add(row, 'Location / Item / Quantity', "Missing location, item or quantity")
+
+    locations = NameIndex(StoreLocation.objects.all())
+    buyers = NameIndex(Buyer.objects.all())
+    items = NameIndex(Item.objects.all())
+    existing = _existing_tally_numbers([rows[0]['tally_no'] for rows in grouped_rows.values() if rows[0]['tally_no']])
+
+    report.groups = len(grouped_rows)
+    for rows in grouped_rows.values():
+        first_row = rows[0]
+        if first_row['tally_no'] and first_row['tally_no'].upper() in existing:
+            report.would_update += 1
+        else:
+            report.would_create += 1
+
+        if first_row['location_name'] not in locations:
+            report.add(first_row['index'], 'Location Name', f"Location '{first_row['location_name']}' not found")
+        if first_row['buyer_name'] and first_row['buyer_name'] not in buyers:
+            report.add(first_row['index'], 'Buyer Name', f"Buyer '{first_row['buyer_name']}' not found, invoice will have no buyer", 'warning')
+        for r in rows[1:]:
+            # Only the first row of a group sets the header; differing values are ignored by the import
+            if str(r['location_name']).strip().upper() != str(first_row['location_name']).strip().upper():
+                report.add(r['index'], 'Location Name', f"Differs from row {first_row['index']} of the same invoice, the first row wins", 'warning')
+
+        for r in rows:
+            report.rows += 1
+            if r['item_name'] not in items:
+                report.add(r['index'], 'Item Name', f"Item '{r['item_name']}' not found, line will be skipped")
+            if not _is_number(r['qty'], whole=True) or Decimal(str(r['qty']).strip()) <= 0:
+                report.add(r['index'], 'Quantity', f"Quantity '{r['qty']}' is not a positive whole number")
+            if r['unit_rate'] not in (None, '') and not _is_number(r['unit_rate']):
+                report.add(r['index'], 'Unit Rate', f"Unit rate '{r['unit_rate']}' is not a number, item price will be used")
+            if r['trans_charges'] not in (None, '') and not _is_number(r['trans_charges']):
+                report.add(r['index'], 'Transport Charges', f"Transport charges '{r['trans_charges']}' is not a number")
+            for field, raw in r['raw_dates'].items():
+                if raw not in (None, '') and r[field] is None:
+                    report.add(r['index'], field.replace('_', ' ').title(), f"Date '{raw}' is not in YYYY-MM-DD format")
+            for field in FILE_COLUMNS:
+                path = r[field]
+                if path and not os.path.exists(str(path)):
+                    report.add(r['index'], field.replace('_', ' ').title(), f"File '{path}' not found, it will not be attached", 'warning')
+
+    report.issues.sort(key=lambda issue: issue['row'])
+    report.seconds = round(time.perf_counter() - started, 2)
+    return report
@@ -0,0 +1,78 @@
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from clientdoc.models import ActivityLog
+
+
+class Command(BaseCommand):
+    help = 'Moves activity log entries older than the retention period into monthly JSON Lines files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180, help='Keep entries newer than this many days in the database')
+        parser.add_argument('--output-dir', default=os.path.join(settings.BASE_DIR, 'archive', 'activity'),
+                            help='Folder for the activity_YYYY-MM.jsonl files')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Entries archived and deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['chunk_size'] < 1:
+            raise CommandError("--days must be >= 0 and --chunk-size >= 1.")
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old_entries = ActivityLog.objects.filter(timestamp__lt=cutoff)
+        total = old_entries.count()
+        if not total:
+            self.stdout.write("Nothing to archive.")
+            return
+        if options['dry_run']:
+            self.stdout.write(f"{total} entries older than {cutoff:%Y-%m-%d} would be archived to {options['output_dir']}.")
+            return
+
+        os.makedirs(options['output_dir'], exist_ok=True)
+        per_month = {}
+        archived = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                old_entries.filter(id__gt=last_id).order_by('id')
+                .values('id', 'timestamp', 'action', 'details')[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            self.write_chunk(chunk, options['output_dir'], per_month)
+            # Only delete once the chunk is safely on disk
+            with transaction.atomic():
+                ActivityLog.objects.filter(id__in=[e['id'] for e in chunk]).delete()
+            last_id = chunk[-1]['id']
+            archived += len(chunk)
+            self.stdout.write(f"Archived {archived}/{total}")
+
+        for month, count in sorted(per_month.items()):
+            self.stdout.write(f"  {month}: {count} entries")
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} entries to {options['output_dir']}."))
+
+    def write_chunk(self, chunk, output_dir, per_month):
+        by_month = {}
+        for entry in chunk:
+            month = timezone.localtime(entry['timestamp']).strftime('%Y-%m')
+            by_month.setdefault(month, []).append(entry)
+
+        for month, entries in by_month.items():
+            path = os.path.join(output_dir, f"activity_{month}.jsonl")
+            with open(path, 'a', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps({
+                        'id': entry['id'],
+                        'timestamp': entry['timestamp'].isoformat(),
+                        'action': entry['action'],
+                        'details': entry['details'],
+                    }) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            per_month[month] = per_month.get(month, 0) + len(entries)
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from clientdoc.sqlite_tuning import apply_pragmas, get_pragmas
+
+# Django's old setup: rollback journal, sqlite3's 5 second default lock timeout
+PROFILES = {
+    'default': {'pragmas': {}, 'timeout': 5.0},
+    'tuned': {'pragmas': None, 'timeout': None},  # filled from settings at run time
+}
+
+
+class Command(BaseCommand):
+    help = ('Compares the default and tuned SQLite profiles: parallel readers and small writers '
+            'running while a long bulk import holds the write lock (uses a throwaway database)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Parallel reader threads (list pages)')
+        parser.add_argument('--writers', type=int, default=1, help='Parallel small writers (users saving forms)')
+        parser.add_argument('--import-rows', type=int, default=20000, help='Rows inserted by the simulated import')
+        parser.add_argument('--import-seconds', type=float, default=8.0,
+                            help='How long the import keeps its transaction open')
+        parser.add_argument('--seed-rows', type=int, default=50000, help='Rows present before the import starts')
+        parser.add_argument('--profile', choices=list(PROFILES), action='append',
+                            help='Profile(s) to run (default: both)')
+
+    def handle(self, *args, **options):
+        PROFILES['tuned']['pragmas'] = get_pragmas()
+        PROFILES['tuned']['timeout'] = float(settings.DATABASES['default'].get('OPTIONS', {}).get('timeout', 20))
+
+        results = {}
+        for name in options['profile'] or list(PROFILES):
+            self.stdout.write(f"Running '{name}' profile...")
+            results[name] = self.run_profile(PROFILES[name], options)
+
+        self.stdout.write(
+            f"\n{'profile':<10} {'reads':>7} {'read p50':>10} {'read p95':>10} {'read max':>10} "
+            f"{'writes':>7} {'write max':>10} {'locked':>7} {'import':>9}"
+        )
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<10} {r['reads']:>7} {r['read_p50']:>8.1f}ms {r['read_p95']:>8.1f}ms {r['read_max']:>8.1f}ms "
+                f"{r['writes']:>7} {r['write_max']:>8.1f}ms {r['locked']:>7} {r['import_s']:>8.2f}s"
+            )
+
+    def connect(self, path, profile):
+        conn = sqlite3.connect(path, timeout=profile['timeout'], check_same_thread=False, isolation_level=None)
+        apply_pragmas(conn, profile['pragmas'])
+        return conn
+
+    def run_profile(self, profile, options):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3', prefix='transol_concurrency_')
+        os.close(handle)
+        try:
+            self.seed(path, profile, options['seed_rows'])
+            return self.run_load(path, profile, options)
+        finally:
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def seed(self, path, profile, rows):
+        conn = self.connect(path, profile)
+        conn.execute("CREATE TABLE invoice (id INTEGER PRIMARY KEY, name TEXT, location TEXT, total REAL, created REAL)")
+        conn.execute("CREATE INDEX invoice_created ON invoice (created)")
+        conn.execute("CREATE TABLE activity (id INTEGER PRIMARY KEY, action TEXT, created REAL)")
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO invoice (name, location, total, created) VALUES (?, ?, ?, ?)",
+            ((f"INV-{i}", f"Store {i % 500}", i * 1.5, i) for i in range(rows))
+        )
+        conn.execute("COMMIT")
+        conn.close()
+
+    def run_load(self, path, profile, options):
+        stop = threading.Event()
+        lock = threading.Lock()
+        stats = {'read_ms': [], 'write_ms': [], 'locked': 0}
+
+        def record(key, start):
+            with lock:
+                stats[key].append((time.perf_counter() - start) * 1000)
+
+        def reader():
+            conn = self.connect(path, profile)
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    # A list page: latest rows plus a count for the paginator
+                    conn.execute("SELECT id, name, location, total FROM invoice ORDER BY created DESC LIMIT 25").fetchall()
+                    conn.execute("SELECT COUNT(*) FROM invoice").fetchone()
+                    record('read_ms', start)
+                except sqlite3.OperationalError:
+                    with lock:
+                        stats['locked'] += 1
+            conn.close()
+
+        def writer():
+            conn = self.connect(path, profile)
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    conn.execute("INSERT INTO activity (action, created) VALUES ('Edit Item', ?)", (time.time(),))
+                    record('write_ms', start)
+                except sqlite3.OperationalError:
+                    with lock:
+                        stats['locked'] += 1
+                time.sleep(0.2)
+            conn.close()
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer) for _ in range(options['writers'])]
+        for t in threads:
+            t.start()
+
+        # The import: one long transaction, rows written in small steps like a per-row processor
+        import_start = time.perf_counter()
+        conn = self.connect(path, profile)
+        rows, steps = options['import_rows'], 100
+        per_step = max(1, rows // steps)
+        conn.execute("BEGIN IMMEDIATE")
+        for step in range(steps):
+            conn.executemany(
+                "INSERT INTO invoice (name, location, total, created) VALUES (?, ?, ?, ?)",
+                ((f"IMP-{step}-{i}", "Imported", 1.0, 1e9 + step * per_step + i) for i in range(per_step))
+            )
+            time.sleep(options['import_seconds'] / steps)
+        conn.execute("COMMIT")
+        conn.close()
+        import_s = time.perf_counter() - import_start
+
+        # Let readers see the committed data for a moment, then stop
+        time.sleep(0.5)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        reads = sorted(stats['read_ms']) or [0.0]
+        return {
+            'reads': len(stats['read_ms']),
+            'read_p50': statistics.median(reads),
+            'read_p95': reads[int(len(reads) * 0.95) - 1] if len(reads) > 1 else reads[0],
+            'read_max': reads[-1],
+            'writes': len(stats['write_ms']),
+            'write_max': max(stats['write_ms'] or [0.0]),
+            'locked': stats['locked'],
+            'import_s': import_s,
+        }
@@ -0,0 +1,140 @@
+import os
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+SOURCE_ALIAS = 'sqlite_source'
+
+
+class Command(BaseCommand):
+    help = ('Copies every table from an SQLite database file into the configured default database '
+            '(e.g. PostgreSQL) in chunks. Run "migrate" on the target first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=os.path.join(settings.BASE_DIR, 'db.sqlite3'), help='SQLite file to copy from')
+        parser.add_argument('--database', default='default', help='Target database alias')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows read and inserted per batch')
+        parser.add_argument('--flush', action='store_true',
+                            help='Empty the target tables first (needed after migrate, which creates content types and permissions)')
+
+    def handle(self, *args, **options):
+        source_path = options['source']
+        target = options['database']
+        if not os.path.exists(source_path):
+            raise CommandError(f"SQLite file not found: {source_path}")
+        if connections[target].vendor == 'sqlite' and os.path.abspath(str(connections[target].settings_dict['NAME'])) == os.path.abspath(source_path):
+            raise CommandError("The target database is the source file. Set DB_ENGINE/DB_NAME for the target first.")
+
+        self.add_source_connection(source_path)
+        models = self.models_in_dependency_order()
+
+        if options['flush']:
+            call_command('flush', database=target, interactive=False, inhibit_post_migrate=True, verbosity=0)
+            self.stdout.write("Flushed target tables.")
+        else:
+            non_empty = [m._meta.label for m in models if m._base_manager.using(target).exists()]
+            if non_empty:
+                raise CommandError(f"Target tables are not empty ({', '.join(non_empty[:5])}...). Re-run with --flush.")
+
+        started = time.perf_counter()
+        total_rows = 0
+        for model in models:
+            total_rows += self.copy_model(model, target, options['chunk_size'])
+
+        self.reset_sequences(models, target)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Copied {total_rows} rows from {len(models)} tables in {elapsed:.1f}s."))
+
+    def add_source_connection(self, path):
+        connections.databases[SOURCE_ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'ATOMIC_REQUESTS': False,
+            'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': False,
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'TEST': {},
+        }
+
+    def models_in_dependency_order(self):
+        """All concrete tables (incl. m2m through tables), parents before the tables that point at them."""
+        candidates = [
+            m for m in apps.get_models(include_auto_created=True)
+            if m._meta.managed and not m._meta.proxy
+        ]
+        ordered, done = [], set()
+
+        def visit(model, path=()):
+            if model in done or model in path:
+                return
+            for field in model._meta.concrete_fields:
+                related = field.related_model
+                if field.is_relation and related and related is not model and related in candidates:
+                    visit(related, path + (model,))
+            done.add(model)
+            ordered.append(model)
+
+        for model in candidates:
+            visit(model)
+        return ordered
+
+    @contextmanager
+    def keep_timestamps(self, model):
+        """bulk_create would overwrite auto_now/auto_now_add values with the current time."""
+        changed = []
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+        try:
+            yield
+        finally:
+            for field, auto_now, auto_now_add in changed:
+                field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+    def copy_model(self, model, target, chunk_size):
+        label = model._meta.label
+        source_qs = model._base_manager.using(SOURCE_ALIAS).order_by('pk')
+        total = source_qs.count()
+        if not total:
+            self.stdout.write(f"{label}: empty")
+            return 0
+
+        field_names = [f.attname for f in model._meta.concrete_fields]
+        copied = 0
+        batch = []
+        with self.keep_timestamps(model):
+            for values in source_qs.values_list(*field_names).iterator(chunk_size=chunk_size):
+                batch.append(model(**dict(zip(field_names, values))))
+                if len(batch) >= chunk_size:
+                    copied += self.insert(model, batch, target)
+                    batch = []
+                    self.stdout.write(f"{label}: {copied}/{total}")
+            if batch:
+                copied += self.insert(model, batch, target)
+        self.stdout.write(f"{label}: {copied}/{total} done")
+        return copied
+
+    def insert(self, model, batch, target):
+        with transaction.atomic(using=target):
+            model._base_manager.using(target).bulk_create(batch)
+        return len(batch)
+
+    def reset_sequences(self, models, target):
+        """Moves PostgreSQL id sequences past the copied ids (no-op on SQLite)."""
+        connection = connections[target]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+            self.stdout.write(f"Reset {len(statements)} id sequences.")
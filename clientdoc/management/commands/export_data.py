@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from clientdoc.exports import (
+    MASTER_HEADERS, export_filename, parse_date_range, write_workbook,
+    master_data_sheets, invoice_sheets
+)
+
+
+class Command(BaseCommand):
+    help = 'Exports master data or invoices (with line items and tax) to an Excel file using a streaming writer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', default='invoice', choices=['invoice'] + list(MASTER_HEADERS))
+        parser.add_argument('--from', dest='date_from', help='Invoice date from (YYYY-MM-DD), inclusive')
+        parser.add_argument('--to', dest='date_to', help='Invoice date to (YYYY-MM-DD), inclusive')
+        parser.add_argument('--output', help='Target .xlsx path (default: timestamped name in current folder)')
+
+    def handle(self, *args, **options):
+        export_type = options['type']
+        output = options['output'] or export_filename(export_type.title())
+
+        if export_type == 'invoice':
+            start, end = parse_date_range(options['date_from'], options['date_to'])
+            if (options['date_from'] and not start) or (options['date_to'] and not end):
+                raise CommandError("Dates must be in YYYY-MM-DD format.")
+            sheets = invoice_sheets(start, end)
+        else:
+            sheets = master_data_sheets(export_type)
+
+        write_workbook(sheets, output)
+        self.stdout.write(self.style.SUCCESS(f"Exported {export_type} data to {output}"))
@@ -0,0 +1,161 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from clientdoc.models import Buyer, DeletedRow, InvoiceItem, Item, SalesInvoice, StoreLocation
+
+# Table name -> model; every concrete column is exported, trashed rows included (is_deleted tells them apart)
+TABLES = {
+    'invoices': SalesInvoice,
+    'line_items': InvoiceItem,
+    'locations': StoreLocation,
+    'buyers': Buyer,
+    'items': Item,
+}
+# Columns of the <table>_<stamp>_deleted files a delta run writes for purged rows. Line items have none:
+# the lines of a purged invoice go with it. SQLite can hand a purged id out again, so readers apply the
+# deletions of a run before its delta rows.
+TOMBSTONE_FIELDS = ('row_id', 'deleted_at')
+FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+WATERMARK_FILE = 'watermark.json'
+
+
+def arrow_type(pa, field):
+    if field.is_relation:
+        return pa.int64()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return pa.int64()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    return pa.string()
+
+
+class Command(BaseCommand):
+    help = ('Exports invoices, line items, locations, buyers and items to Parquet/Arrow files for offline analysis. '
+            'Each run only writes the rows changed since the previous one, plus the ids of purged rows (needs pyarrow).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=os.path.join(settings.BASE_DIR, 'snapshots'),
+                            help='Folder for the per-table files and the watermark')
+        parser.add_argument('--format', default='parquet', choices=list(FORMATS))
+        parser.add_argument('--full', action='store_true', help='Ignore the watermark and export every row')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows held in memory and written per batch')
+        parser.add_argument('--overlap-seconds', type=int, default=60,
+                            help='Re-read rows this much older than the watermark, for transactions that were still open')
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise CommandError("export_snapshot needs pyarrow (pip install pyarrow).")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be >= 1.")
+
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+        watermark_path = os.path.join(output_dir, WATERMARK_FILE)
+        watermarks = {} if options['full'] else self.read_watermarks(watermark_path)
+
+        # Taken before reading, so rows saved during the export are picked up again next time
+        started = timezone.now()
+        stamp = started.strftime('%Y%m%dT%H%M%S')
+        overlap = timezone.timedelta(seconds=options['overlap_seconds'])
+        for table, model in TABLES.items():
+            since = watermarks.get(table)
+            since = since - overlap if since else None
+            kind = 'delta' if since else 'full'
+            path = os.path.join(output_dir, table, f"{table}_{stamp}_{kind}.{FORMATS[options['format']]}")
+            rows = self.export_table(pa, model, self.changed_rows(model, since), path, options['format'], options['chunk_size'])
+            watermarks[table] = started
+            self.stdout.write(f"{table}: {rows} rows ({kind})" + (f" -> {path}" if rows else ""))
+            if since and model is not InvoiceItem:
+                path = os.path.join(output_dir, table, f"{table}_{stamp}_deleted.{FORMATS[options['format']]}")
+                fields = [DeletedRow._meta.get_field(name) for name in TOMBSTONE_FIELDS]
+                rows = self.export_table(pa, DeletedRow, self.deleted_rows(model, since), path, options['format'],
+                                         options['chunk_size'], fields=fields)
+                self.stdout.write(f"{table}: {rows} deleted" + (f" -> {path}" if rows else ""))
+
+        tmp_path = watermark_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({table: value.isoformat() for table, value in watermarks.items()}, f, indent=2)
+        os.replace(tmp_path, watermark_path)
+        self.stdout.write(self.style.SUCCESS(f"Snapshot written to {output_dir}, watermark {started.isoformat()}"))
+
+    def read_watermarks(self, path):
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                return {table: parse_datetime(value) for table, value in json.load(f).items() if table in TABLES}
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Unreadable watermark file {path}: {e}. Fix it or re-run with --full.")
+
+    def changed_rows(self, model, since):
+        qs = model._base_manager.order_by('pk')
+        if since is None:
+            return qs
+        if model is InvoiceItem:
+            # Deleted lines leave no row behind, so the lines of every changed invoice are exported
+            # again; readers replace an invoice's lines by invoice_id.
+            return qs.filter(Q(updated_at__gt=since) | Q(invoice__updated_at__gt=since))
+        return qs.filter(updated_at__gt=since)
+
+    def deleted_rows(self, model, since):
+        return DeletedRow.objects.filter(model=model._meta.model_name, deleted_at__gt=since).order_by('pk')
+
+    def export_table(self, pa, model, qs, path, file_format, chunk_size, fields=None):
+        import pandas as pd
+
+        fields = fields or model._meta.concrete_fields
+        columns = [f.attname for f in fields]
+        schema = pa.schema([pa.field(f.attname, arrow_type(pa, f)) for f in fields])
+
+        writer = sink = None
+        tmp_path = path + '.tmp'
+        written = 0
+        chunk = []
+
+        def flush():
+            nonlocal writer, sink
+            if writer is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if file_format == 'parquet':
+                    import pyarrow.parquet as pq
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                else:
+                    sink = pa.OSFile(tmp_path, 'wb')
+                    writer = pa.ipc.new_file(sink, schema)
+            frame = pd.DataFrame.from_records(chunk, columns=columns)
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            chunk.clear()
+
+        try:
+            for row in qs.values_list(*columns).iterator(chunk_size=min(chunk_size, 5000)):
+                chunk.append(row)
+                written += 1
+                if len(chunk) >= chunk_size:
+                    flush()
+            if chunk:
+                flush()
+        finally:
+            if writer is not None:
+                writer.close()
+            if sink is not None:
+                sink.close()
+        if written:
+            os.replace(tmp_path, path)
+        return written
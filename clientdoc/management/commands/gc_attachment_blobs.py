@@ -0,0 +1,82 @@
+import os
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from clientdoc.attachments import BLOB_DIR, is_blob
+from clientdoc.models import AttachmentBlob
+
+
+def referenced_blob_names():
+    """Blob names used by any file field of any model (trashed rows included, they can be restored)."""
+    names = set()
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                qs = model._base_manager.filter(**{f"{field.name}__startswith": f"{BLOB_DIR}/"})
+                names.update(qs.values_list(field.name, flat=True).iterator())
+    return {name.replace('\\', '/') for name in names}
+
+
+class Command(BaseCommand):
+    help = 'Deletes attachment blobs that no record references any more, plus stray files in the blob folder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help='Leave blobs and files younger than this alone (an import may not have linked them yet)')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        min_age = timedelta(hours=options['min_age_hours'])
+        # Blobs are recorded before the chunk that links them commits, so young ones are kept
+        candidates = AttachmentBlob.objects.filter(created_at__lt=timezone.now() - min_age)
+        referenced = referenced_blob_names()
+
+        # Compared in Python: the referenced set can be larger than SQLite's parameter limit
+        unused = [blob for blob in candidates.iterator() if blob.name not in referenced]
+        removed_rows = removed_bytes = 0
+        for blob in unused:
+            removed_rows += 1
+            removed_bytes += blob.size
+            if not dry_run:
+                path = os.path.join(settings.MEDIA_ROOT, blob.name)
+                if os.path.exists(path):
+                    os.remove(path)
+                blob.delete()
+
+        # Files left behind by rolled back imports have no row at all
+        known = set(AttachmentBlob.objects.values_list('name', flat=True))
+        cutoff = time.time() - min_age.total_seconds()
+        stray_files = stray_bytes = 0
+        root = os.path.join(settings.MEDIA_ROOT, BLOB_DIR)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, settings.MEDIA_ROOT).replace('\\', '/')
+                if not is_blob(name) or name in known or name in referenced:
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                stray_files += 1
+                stray_bytes += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+
+        if not dry_run:
+            # Drop shard folders that are now empty
+            for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+                if dirpath != root and not os.listdir(dirpath):
+                    os.rmdir(dirpath)
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {removed_rows} unused blobs ({removed_bytes / 1024 / 1024:.1f} MB) "
+            f"and {stray_files} stray files ({stray_bytes / 1024 / 1024:.1f} MB)."
+        ))
@@ -0,0 +1,111 @@
+import os
+import shutil
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from clientdoc.attachments import BLOB_DIR
+
+# Top-level media folders that are not file field storage: the template cache is rebuilt on
+# demand and the shared blobs are collected by gc_attachment_blobs.
+SKIP_DIRS = {'cache', BLOB_DIR}
+
+
+def referenced_names():
+    """Storage names held by any file/image field of any model (trashed rows included, they can be restored)."""
+    names = set()
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                qs = model._base_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                names.update(qs.values_list(field.name, flat=True).iterator(chunk_size=5000))
+    return {name.replace('\\', '/') for name in names}
+
+
+def media_files(root, skip):
+    """Yields (storage name, DirEntry) for every file below ``root``, except the top-level folders in ``skip``."""
+    stack = [(root, '')]
+    while stack:
+        path, prefix = stack.pop()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if prefix or entry.name not in skip:
+                        stack.append((entry.path, name + '/'))
+                elif entry.is_file(follow_symlinks=False):
+                    yield name, entry
+
+
+class Command(BaseCommand):
+    help = ('Deletes (or moves to a quarantine folder) media files that no file field references any more, '
+            'e.g. replaced PO copies, rebuilt bundles and files of purged records')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+        parser.add_argument('--quarantine', metavar='DIR',
+                            help='Move unreferenced files into DIR (same relative paths) instead of deleting them')
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help='Leave files younger than this alone (their row may not be committed yet)')
+
+    def handle(self, *args, **options):
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            raise CommandError(f"MEDIA_ROOT {root} does not exist.")
+        quarantine = os.path.abspath(options['quarantine']) if options['quarantine'] else None
+        skip = set(SKIP_DIRS)
+        if quarantine and os.path.dirname(quarantine) == root:
+            # A quarantine folder inside MEDIA_ROOT must not be collected itself
+            skip.add(os.path.basename(quarantine))
+        elif quarantine and quarantine.startswith(root + os.sep):
+            raise CommandError("--quarantine must be outside MEDIA_ROOT or directly below it.")
+
+        dry_run = options['dry_run']
+        referenced = referenced_names()
+        cutoff = time.time() - options['min_age_hours'] * 3600
+
+        kept = kept_bytes = 0
+        removed = {}  # top-level folder -> [files, bytes]
+        emptied_dirs = set()
+        for name, entry in media_files(root, skip):
+            stat = entry.stat(follow_symlinks=False)
+            if name in referenced or stat.st_mtime > cutoff:
+                kept += 1
+                kept_bytes += stat.st_size
+                continue
+            totals = removed.setdefault(name.split('/')[0] if '/' in name else '.', [0, 0])
+            totals[0] += 1
+            totals[1] += stat.st_size
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {name} ({stat.st_size} bytes)")
+            if dry_run:
+                continue
+            if quarantine:
+                target = os.path.join(quarantine, *name.split('/'))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(entry.path, target)
+            else:
+                os.remove(entry.path)
+            emptied_dirs.add(os.path.dirname(entry.path))
+
+        # Drop nested folders left empty, but keep the top-level upload folders
+        for path in sorted(emptied_dirs, key=len, reverse=True):
+            while os.path.dirname(path) != root and path.startswith(root + os.sep):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    break
+                path = os.path.dirname(path)
+
+        for folder, (count, size) in sorted(removed.items()):
+            self.stdout.write(f"{folder}: {count} files, {size / 1024 / 1024:.1f} MB")
+        count = sum(c for c, _ in removed.values())
+        size = sum(s for _, s in removed.values())
+        verb = "Would remove" if dry_run else ("Quarantined" if quarantine else "Deleted")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {count} unreferenced files ({size / 1024 / 1024:.1f} MB); "
+            f"kept {kept} files ({kept_bytes / 1024 / 1024:.1f} MB)."
+        ))
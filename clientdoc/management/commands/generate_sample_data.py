@@ -0,0 +1,228 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from clientdoc.analytics import mark_dirty
+from clientdoc.models import (
+    Buyer, StoreLocation, ItemCategory, Item, SalesInvoice, InvoiceItem, InvoiceTaxLine,
+    DeliveryChallan, TransportCharges, ConfirmationDocument, STATE_CODE_MAP, get_company_state_code,
+    prefetch_invoice_lines,
+)
+
+GST_RATES = [Decimal('0.05'), Decimal('0.12'), Decimal('0.18'), Decimal('0.18'), Decimal('0.28')]
+STATUSES = ['DRF', 'DC', 'TRP', 'FIN']
+STATUS_WEIGHTS = [10, 15, 35, 40]
+CITIES = ['Bengaluru', 'Mysuru', 'Mangaluru', 'Hubballi', 'Chennai', 'Mumbai', 'Hyderabad', 'Kochi', 'Pune', 'Delhi']
+UNITS = ['Nos', 'Nos', 'Nos', 'Sqft', 'Kg']
+
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic dataset (locations, buyers, items, invoices, line items) for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=1000, help='Number of invoices to create')
+        parser.add_argument('--lines', type=int, default=10, help='Average line items per invoice')
+        parser.add_argument('--locations', type=int, default=200)
+        parser.add_argument('--items', type=int, default=500)
+        parser.add_argument('--buyers', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--days', type=int, default=365, help='Spread invoice dates over this many days')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, same seed gives the same dataset')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Invoices written per transaction')
+        parser.add_argument('--prefix', default='SYN', help='Name prefix used to tag generated rows')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated rows with this prefix first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.company_state_code = get_company_state_code()
+
+        if options['clear']:
+            self.clear()
+
+        categories = self.make_categories(options['categories'])
+        locations = self.make_locations(options['locations'])
+        buyers = self.make_buyers(options['buyers'])
+        items = self.make_items(options['items'], categories)
+        self.make_invoices(options, locations, buyers, items)
+
+    # --- MASTER DATA ---
+
+    def _bulk_named(self, model, objs, manager=None):
+        """Bulk inserts named rows (skipping existing names) and returns them reloaded with ids."""
+        manager = manager or model._default_manager
+        with transaction.atomic():
+            model._default_manager.bulk_create(objs, batch_size=500, ignore_conflicts=True)
+        names = [o.name for o in objs]
+        by_name = {}
+        for i in range(0, len(names), 500):
+            for obj in manager.filter(name__in=names[i:i + 500]):
+                by_name[obj.name] = obj
+        return [by_name[n] for n in names]
+
+    def make_categories(self, count):
+        objs = [ItemCategory(name=f"{self.prefix} Category {i:03d}") for i in range(1, count + 1)]
+        categories = self._bulk_named(ItemCategory, objs)
+        self.stdout.write(f"Categories: {len(categories)}")
+        return categories
+
+    def make_locations(self, count):
+        states = [s for s in STATE_CODE_MAP if s != 'Other']
+        objs = []
+        for i in range(1, count + 1):
+            # Most stores are local (intra-state) like the real data, some are inter-state
+            state = 'Karnataka' if self.rng.random() < 0.7 else self.rng.choice(states)
+            city = self.rng.choice(CITIES)
+            objs.append(StoreLocation(
+                name=f"{self.prefix} Store {i:05d}",
+                site_code=f"P{i:05d}",
+                address=f"Shop {self.rng.randint(1, 300)}, Main Road, {city}",
+                city=city,
+                state=state,
+                state_code=STATE_CODE_MAP[state],
+                pincode=str(self.rng.randint(560001, 590000)),
+                priority=self.rng.choice(['P1', 'P2', 'P3', 'P4']),
+            ))
+        locations = self._bulk_named(StoreLocation, objs, StoreLocation.all_objects)
+        self.stdout.write(f"Locations: {len(locations)}")
+        return locations
+
+    def make_buyers(self, count):
+        objs = [
+            Buyer(
+                name=f"{self.prefix} Buyer {i:04d}",
+                address=f"{self.rng.randint(1, 99)} Corporate Park, Bengaluru",
+                gstin=f"29AAAC{i:04d}A1Z{i % 10}",
+                state='Karnataka',
+                state_code='29',
+            )
+            for i in range(1, count + 1)
+        ]
+        buyers = self._bulk_named(Buyer, objs, Buyer.all_objects)
+        self.stdout.write(f"Buyers: {len(buyers)}")
+        return buyers
+
+    def make_items(self, count, categories):
+        objs = []
+        for i in range(1, count + 1):
+            hsn = self.rng.choice(['844311', '4911', '3919', '3926', '9403'])
+            objs.append(Item(
+                name=f"{self.prefix} Item {i:05d}",
+                category=self.rng.choice(categories) if categories else None,
+                article_code=f"SKU-{i:06d}",
+                description=f"Synthetic item {i}",
+                hsn_sac=hsn,
+                hsn_code=hsn,
+                price=Decimal(self.rng.randint(50, 50000)) / 10,
+                unit=self.rng.choice(UNITS),
+                gst_rate=self.rng.choice(GST_RATES),
+            ))
+        items = self._bulk_named(Item, objs, Item.all_objects)
+        self.stdout.write(f"Items: {len(items)}")
+        return items
+
+    # --- INVOICES ---
+
+    def make_invoices(self, options, locations, buyers, items):
+        total = options['invoices']
+        batch_size = options['batch_size']
+        now = timezone.now()
+        # Reserve the whole range up front so regular invoice saves never collide with it
+        next_seq = SalesInvoice.next_app_sequence(total)
+        created = 0
+        line_count = 0
+
+        while created < total:
+            batch = min(batch_size, total - created)
+            with transaction.atomic():
+                line_count += self._make_invoice_batch(batch, next_seq + created, now, options, locations, buyers, items)
+            created += batch
+            self.stdout.write(f"Invoices: {created}/{total} ({line_count} line items)")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated {created} invoices with {line_count} line items."))
+        self.stdout.write("Their months are marked for the sales rollups; run refresh_rollups to build them now.")
+
+    def _make_invoice_batch(self, batch, start_seq, now, options, locations, buyers, items):
+        rng = self.rng
+        invoices = []
+        plans = []
+        for n in range(batch):
+            seq = start_seq + n
+            location = rng.choice(locations)
+            buyer = rng.choice(buyers) if buyers and rng.random() < 0.8 else None
+            date = now - timedelta(days=rng.randint(0, options['days']), minutes=rng.randint(0, 1440))
+            status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+            n_lines = max(1, int(rng.gauss(options['lines'], options['lines'] / 3)))
+            lines = [(rng.choice(items), rng.randint(1, 20)) for _ in range(n_lines)]
+            transport = Decimal(rng.randint(2, 40) * 50) if status in ('TRP', 'FIN') else Decimal('0.00')
+
+            invoices.append(SalesInvoice(
+                app_invoice_number=f"Tsol-{seq:05d}",
+                tally_invoice_number=f"{self.prefix}-{seq:07d}",
+                location=location,
+                buyer=buyer,
+                date=date,
+                created_at=date,
+                buyers_order_date=date,
+                delivery_note_date=date,
+                status=status,
+                place_of_supply=location.state_code,
+                customer_gstin=(buyer.gstin if buyer else location.gstin),
+            ))
+            plans.append((lines, transport, status, date))
+
+        SalesInvoice.objects.bulk_create(invoices, batch_size=500)
+        numbers = [inv.app_invoice_number for inv in invoices]
+        ids = dict(SalesInvoice.all_objects.filter(app_invoice_number__in=numbers).values_list('app_invoice_number', 'id'))
+
+        line_objs, dcs, transports, confirmations = [], [], [], []
+        for inv, (lines, transport, status, date) in zip(invoices, plans):
+            invoice_id = ids[inv.app_invoice_number]
+            for item, qty in lines:
+                line_objs.append(InvoiceItem(
+                    invoice_id=invoice_id, item_id=item.id, quantity=qty,
+                    quantity_shipped=qty, quantity_billed=qty,
+                    price=item.price, gst_rate=item.gst_rate,
+                ))
+            if status in ('DC', 'TRP', 'FIN'):
+                dcs.append(DeliveryChallan(invoice_id=invoice_id, date=date, created_at=date, notes=f"KA01-{invoice_id}"))
+            if status in ('TRP', 'FIN'):
+                transports.append(TransportCharges(invoice_id=invoice_id, date=date, created_at=date, charges=transport, description='Local transport'))
+                confirmations.append(ConfirmationDocument(invoice_id=invoice_id, date=date, created_at=date))
+
+        InvoiceItem.objects.bulk_create(line_objs, batch_size=2000)
+        DeliveryChallan.objects.bulk_create(dcs, batch_size=1000)
+        TransportCharges.objects.bulk_create(transports, batch_size=1000)
+        ConfirmationDocument.objects.bulk_create(confirmations, batch_size=1000)
+        self._write_totals(ids.values())
+        mark_dirty(*(date for _, _, _, date in plans))
+        return len(line_objs)
+
+    def _write_totals(self, invoice_ids):
+        """Totals and tax lines from the stored lines, as calculate_gst_totals would write them."""
+        invoices = list(SalesInvoice.all_objects.filter(id__in=invoice_ids).select_related('transportcharges'))
+        prefetch_invoice_lines(invoices)
+        tax_lines = []
+        for invoice in invoices:
+            lines, total_tax = invoice.build_tax_lines(invoice.place_of_supply != self.company_state_code)
+            invoice.cgst_total = sum((line.cgst for line in lines), Decimal('0.00'))
+            invoice.sgst_total = sum((line.sgst for line in lines), Decimal('0.00'))
+            invoice.igst_total = sum((line.igst for line in lines), Decimal('0.00'))
+            invoice.total = sum((line.taxable_value for line in lines), Decimal('0.00')) + total_tax
+            tax_lines += lines
+        SalesInvoice.all_objects.bulk_update(invoices, ['cgst_total', 'sgst_total', 'igst_total', 'total'], batch_size=500)
+        InvoiceTaxLine.objects.bulk_create(tax_lines, batch_size=2000)
+
+    def clear(self):
+        with transaction.atomic():
+            invoices = SalesInvoice.all_objects.filter(tally_invoice_number__startswith=f"{self.prefix}-")
+            deleted, _ = invoices.delete()
+            Item.all_objects.filter(name__startswith=f"{self.prefix} Item ").delete()
+            StoreLocation.all_objects.filter(name__startswith=f"{self.prefix} Store ").delete()
+            Buyer.all_objects.filter(name__startswith=f"{self.prefix} Buyer ").delete()
+            ItemCategory.objects.filter(name__startswith=f"{self.prefix} Category ").delete()
+        self.stdout.write(self.style.WARNING(f"Cleared previously generated data ({deleted} rows incl. related)."))
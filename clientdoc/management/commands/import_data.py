@@ -1,6 +1,7 @@
 import pandas as pd
 from django.core.management.base import BaseCommand
-from clientdoc.models import Item, ItemCategory, StoreLocation
+from clientdoc.master_data import upsert_frame
+from clientdoc.models import Item, StoreLocation
 
 class Command(BaseCommand):
     help = 'Imports items and locations from Excel files in Imports folder'
@@ -11,59 +12,35 @@ class Command(BaseCommand):
 
     def import_locations(self):
         try:
-            df = pd.read_excel('Imports/client_location.xlsx')
-            count = 0
-            for _, row in df.iterrows():
-                site_name = str(row.get('Site', '')).strip()
-                if not site_name or pd.isna(site_name):
-                    continue
-                
-                StoreLocation.objects.update_or_create(
-                    name=site_name,
-                    defaults={
-                        'site_code': row.get('Site Code', ''),
-                        'city': row.get('City', ''),
-                        'state': row.get('State', 'Karnataka'),
-                        'priority': row.get('Priority\n(P1,P2,P3,P4)', ''),
-                        'address': f"{row.get('City', '')}, {row.get('State', '')}"
-                    }
-                )
-                count += 1
-            self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} locations.'))
+            df = pd.read_excel('Imports/client_location.xlsx', dtype=object)
+            frame = pd.DataFrame({
+                'name': df.get('Site'),
+                'site_code': df.get('Site Code'),
+                'city': df.get('City'),
+                'state': df.get('State'),
+                'priority': df.get('Priority\n(P1,P2,P3,P4)'),
+            }, index=df.index)
+            # Address is "City, State" from the sheet cells
+            city = frame['city'].fillna('').astype(str).str.strip()
+            state = frame['state'].fillna('').astype(str).str.strip()
+            frame['address'] = (city + ', ' + state).str.strip(', ')
+            result = upsert_frame(StoreLocation, frame.assign(row_number=df.index + 2))
+            self.stdout.write(self.style.SUCCESS(f'Successfully imported locations: {result.summary()}.'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error importing locations: {e}'))
 
     def import_items(self):
         try:
-            df = pd.read_excel('Imports/Transcend Digital Solutions Products.xlsx')
-            count = 0
-            for _, row in df.iterrows():
-                particular = str(row.get('PARTICULAR', '')).strip()
-                if not particular or pd.isna(particular):
-                    continue
-                
-                category_name = str(row.get('Details', '')).strip()
-                category = None
-                if category_name and not pd.isna(category_name):
-                    category, _ = ItemCategory.objects.get_or_create(name=category_name)
-                
-                gst_val = row.get('GST %', 0.18)
-                if pd.isna(gst_val): gst_val = 0.18
-                
-                price_val = row.get('Rate', 0.0)
-                if pd.isna(price_val): price_val = 0.0
-
-                Item.objects.update_or_create(
-                    name=particular,
-                    defaults={
-                        'category': category,
-                        'article_code': row.get('Article', ''),
-                        'gst_rate': gst_val,
-                        'price': price_val,
-                        'description': row.get('Remarks', '') if not pd.isna(row.get('Remarks', '')) else ''
-                    }
-                )
-                count += 1
-            self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} items.'))
+            df = pd.read_excel('Imports/Transcend Digital Solutions Products.xlsx', dtype=object)
+            frame = pd.DataFrame({
+                'name': df.get('PARTICULAR'),
+                'category': df.get('Details'),
+                'article_code': df.get('Article'),
+                'gst_rate': df.get('GST %'),
+                'price': df.get('Rate'),
+                'description': df.get('Remarks'),
+            }, index=df.index)
+            result = upsert_frame(Item, frame.assign(row_number=df.index + 2))
+            self.stdout.write(self.style.SUCCESS(f'Successfully imported items: {result.summary()}.'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error importing items: {e}'))
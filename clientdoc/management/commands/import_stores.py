@@ -1,7 +1,8 @@
 import csv
 from io import StringIO
+import pandas as pd
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from clientdoc.master_data import upsert_frame
 from clientdoc.models import StoreLocation
 
 class Command(BaseCommand):
@@ -35,28 +36,17 @@ P713,PT-MALL OF ASIA-BENGALURU,"Pantaloons, Gf, Mall of Asia, Phoneix mall of As
             self.stdout.write(self.style.WARNING("CSV data is empty."))
             return
         
-        stores_to_create = []
-        
+        rows = []
         for row in reader:
             if len(row) < 3:
                 continue
-                
-            store_name = row[1].strip()
-            # Clean up newlines, quotes, and inconsistent spacing in the address
-            store_address = row[2].strip().replace('\n', ', ').replace('""', '"').strip('"') 
-            
-            # Check if a store with this name already exists
-            if not StoreLocation.objects.filter(name=store_name).exists():
-                stores_to_create.append(
-                    StoreLocation(
-                        name=store_name, 
-                        address=store_address
-                    )
-                )
+            rows.append({
+                'site_code': row[0],
+                'name': row[1].strip(),
+                # Clean up newlines, quotes, and inconsistent spacing in the address
+                'address': row[2].strip().replace('\n', ', ').replace('""', '"').strip('"'),
+            })
 
-        if stores_to_create:
-            with transaction.atomic():
-                StoreLocation.objects.bulk_create(stores_to_create)
-            self.stdout.write(self.style.SUCCESS(f"Successfully created {len(stores_to_create)} new StoreLocation records."))
-        else:
-            self.stdout.write(self.style.SUCCESS("No new stores to create. All listed stores already exist."))
+        # Only stores that are new or whose code/address differ from the list are written
+        result = upsert_frame(StoreLocation, pd.DataFrame(rows, columns=['name', 'site_code', 'address']))
+        self.stdout.write(self.style.SUCCESS(f"Stores: {result.summary()}."))
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from clientdoc.trash import PURGE_CHUNK_SIZE, TRASH_MODELS, expired, purge
+
+
+class Command(BaseCommand):
+    help = 'Permanently deletes rows that have been in the trash longer than the retention period, with their uploaded files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'TRASH_RETENTION_DAYS', 30),
+                            help='Purge rows trashed more than this many days ago')
+        parser.add_argument('--chunk-size', type=int, default=PURGE_CHUNK_SIZE, help='Rows deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be purged')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['chunk_size'] < 1:
+            raise CommandError("--days must be >= 0 and --chunk-size >= 1.")
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        # In TRASH_MODELS order, so invoices are gone before the master data they reference is tried
+        for name, model in TRASH_MODELS.items():
+            ids = expired(model, cutoff)
+            if options['dry_run']:
+                self.stdout.write(f"{name}: {len(ids)} would be purged")
+                total += len(ids)
+                continue
+            purged, _ = purge(model, ids, options['chunk_size'])
+            total += purged
+            self.stdout.write(f"{name}: {purged} purged")
+
+        verb = "Would purge" if options['dry_run'] else "Purged"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} rows trashed before {cutoff:%Y-%m-%d}."))
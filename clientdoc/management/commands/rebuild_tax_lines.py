@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from clientdoc.models import InvoiceTaxLine, SalesInvoice, get_company_state_code, prefetch_invoice_lines
+
+
+class Command(BaseCommand):
+    help = 'Rewrites the HSN/rate tax lines of invoices from their line items (stored totals are left as they are)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only invoices that have no tax lines yet')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Invoices per transaction')
+
+    def handle(self, *args, **options):
+        company_state_code = get_company_state_code()
+        # Trashed invoices too, they can be restored
+        invoices = SalesInvoice.all_objects.select_related('location', 'transportcharges').order_by('id')
+        if options['missing']:
+            invoices = invoices.filter(tax_lines__isnull=True)
+        ids = list(invoices.values_list('id', flat=True))
+
+        chunk_size = options['chunk_size']
+        written = 0
+        for start in range(0, len(ids), chunk_size):
+            chunk = list(invoices.filter(id__in=ids[start:start + chunk_size]))
+            prefetch_invoice_lines(chunk)
+            tax_lines = []
+            for invoice in chunk:
+                place_of_supply = invoice.place_of_supply or (invoice.location.state_code if invoice.location else '29')
+                tax_lines += invoice.build_tax_lines(place_of_supply != company_state_code)[0]
+            with transaction.atomic():
+                InvoiceTaxLine.objects.filter(invoice__in=chunk).delete()
+                InvoiceTaxLine.objects.bulk_create(tax_lines, batch_size=1000)
+            written += len(tax_lines)
+            self.stdout.write(f"{min(start + chunk_size, len(ids))}/{len(ids)} invoices")
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} tax lines for {len(ids)} invoices."))
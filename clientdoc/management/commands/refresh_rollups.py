@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from clientdoc.analytics import all_months, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly sales rollups of the months marked dirty (or of every month with --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every month, e.g. after the first migration')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        months = refresh_rollups(all_months() if options['all'] else None)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(months)} month(s) in {elapsed:.1f}s."))
@@ -0,0 +1,245 @@
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+import django
+import openpyxl
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from clientdoc import views
+from clientdoc.models import (
+    SalesInvoice, InvoiceItem, Item, StoreLocation, Buyer, ConfirmationDocument,
+    OurCompanyProfile, BulkInvoiceUpload
+)
+from clientdoc.pdf_generator import generate_invoice_pdf
+
+
+class Rollback(Exception):
+    """Raised to undo the writes of a benchmark run."""
+
+
+class Command(BaseCommand):
+    help = 'Times the invoice workflow hot paths and writes reproducible JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Result file (default: bench_results/benchmark_<timestamp>.json)')
+        parser.add_argument('--compare', help='Previous result file to compare against')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per benchmark')
+        parser.add_argument('--upload-rows', type=int, default=200, help='Rows in the generated upload sheet')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', help='Comma separated benchmark names to run')
+
+    def handle(self, *args, **options):
+        if not SalesInvoice.objects.exists():
+            raise CommandError("No invoices found. Run 'python manage.py generate_sample_data' first.")
+
+        self.rng = random.Random(options['seed'])
+        self.factory = RequestFactory()
+        self.options = options
+        self.company_profile = OurCompanyProfile.objects.first()
+        self.sample_invoice = self.pick_sample_invoice()
+
+        only = set(filter(None, (options['only'] or '').split(',')))
+        results = {}
+        for name, func in self.benchmarks():
+            if only and name not in only:
+                continue
+            results[name] = self.measure(func, options['repeat'], options['warmup'])
+            status = results[name].get('error') or f"median {results[name]['median_ms']:.1f} ms, {results[name]['queries']} queries"
+            self.stdout.write(f"{name:<40} {status}")
+
+        report = {'meta': self.meta(), 'benchmarks': results}
+        output = options['output'] or os.path.join(
+            'bench_results', f"benchmark_{timezone.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+        if getattr(self, '_upload_sheet', None):
+            os.remove(self._upload_sheet)
+
+    # --- HARNESS ---
+
+    def measure(self, func, repeat, warmup):
+        try:
+            for _ in range(warmup):
+                self.run_once(func)
+            runs = []
+            queries = 0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    self.run_once(func)
+                    runs.append(round((time.perf_counter() - start) * 1000, 3))
+                queries = len(ctx.captured_queries)
+        except Exception as e:
+            return {'error': f"{type(e).__name__}: {e}"}
+        return {
+            'runs_ms': runs,
+            'min_ms': min(runs),
+            'median_ms': statistics.median(runs),
+            'mean_ms': round(statistics.mean(runs), 3),
+            'max_ms': max(runs),
+            'queries': queries,
+        }
+
+    def run_once(self, func):
+        """Runs a benchmark inside a transaction that is always rolled back."""
+        try:
+            with transaction.atomic():
+                func()
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def meta(self):
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': self.options['repeat'],
+            'seed': self.options['seed'],
+            'dataset': {
+                'invoices': SalesInvoice.objects.count(),
+                'line_items': InvoiceItem.objects.count(),
+                'locations': StoreLocation.objects.count(),
+                'items': Item.objects.count(),
+                'buyers': Buyer.objects.count(),
+            },
+            'sample_invoice': self.sample_invoice.id,
+        }
+
+    def compare(self, baseline_path, results):
+        with open(baseline_path) as f:
+            baseline = json.load(f).get('benchmarks', {})
+        self.stdout.write(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>9}")
+        for name, current in results.items():
+            before = baseline.get(name)
+            if not before or 'median_ms' not in before or 'median_ms' not in current:
+                continue
+            change = (current['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+            line = f"{name:<40} {before['median_ms']:>10.1f}ms {current['median_ms']:>10.1f}ms {change:>+8.1f}%"
+            if change > 10:
+                line = self.style.ERROR(line)
+            elif change < -10:
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
+
+    # --- BENCHMARKS ---
+
+    def pick_sample_invoice(self):
+        # The invoice with the most line items in the TRP/FIN stages, so PDFs have all documents
+        candidates = SalesInvoice.objects.filter(status__in=['TRP', 'FIN']).order_by('id')[:200]
+        invoices = list(candidates) or list(SalesInvoice.objects.order_by('id')[:200])
+        return max(invoices, key=lambda inv: (inv.invoiceitem_set.count(), -inv.id))
+
+    def benchmarks(self):
+        location_name = self.sample_invoice.location.name
+        search_term = location_name[: max(3, len(location_name) // 2)]
+        list_views = [
+            ('list.invoices', views.invoice_list, {}),
+            ('list.invoices.search', views.invoice_list, {'q': search_term}),
+            ('list.invoices.sort_az', views.invoice_list, {'sort': 'az'}),
+            ('list.invoices.last_page', views.invoice_list, {'page': 'last'}),
+            ('list.dc', views.dc_list, {}),
+            ('list.dc.search', views.dc_list, {'q': search_term}),
+            ('list.transport', views.transport_list, {}),
+            ('list.confirmations', views.confirmation_list, {}),
+            ('list.items.search', views.item_list, {'q': 'Item 00'}),
+            ('list.locations.sort_za', views.store_location_list, {'sort': 'za'}),
+            ('list.buyers', views.buyer_list, {}),
+        ]
+        for name, view, params in list_views:
+            yield name, self.view_call(view, params)
+
+        yield 'invoice.calculate_gst_totals', self.bench_calculate_totals
+        yield 'pdf.generate_invoice_pdf', self.bench_invoice_pdf
+        yield 'pdf.finalize_bundle', self.bench_finalize_bundle
+        yield 'upload.process_invoice_upload', self.bench_invoice_upload
+        yield 'excel.template.invoice', self.view_call(views.download_sample_excel, {'type': 'invoice'})
+        for upload_type in ['item', 'location', 'buyer']:
+            yield f"excel.export.{upload_type}", self.view_call(views.download_sample_excel, {'type': upload_type, 'export': 'true'})
+
+    def view_call(self, view, params):
+        def run():
+            response = view(self.factory.get('/', params))
+            # Consume streamed responses too, so the full cost is measured
+            if getattr(response, 'streaming', False):
+                for _ in response.streaming_content:
+                    pass
+            else:
+                response.content
+        return run
+
+    def bench_calculate_totals(self):
+        invoice = SalesInvoice.objects.get(pk=self.sample_invoice.pk)
+        invoice.calculate_gst_totals()
+
+    def bench_invoice_pdf(self):
+        invoice = SalesInvoice.objects.get(pk=self.sample_invoice.pk)
+        generate_invoice_pdf(invoice, self.company_profile)
+
+    def bench_finalize_bundle(self):
+        invoice = SalesInvoice.objects.get(pk=self.sample_invoice.pk)
+        confirmation, _ = ConfirmationDocument.objects.get_or_create(invoice=invoice)
+        views.build_confirmation_bundle(invoice, confirmation, self.company_profile)
+
+    def bench_invoice_upload(self):
+        path = self.upload_sheet()
+        with open(path, 'rb') as f:
+            record = BulkInvoiceUpload(log='')
+            record.file.save('benchmark_upload.xlsx', File(f), save=True)
+        try:
+            views.process_invoice_upload(record)
+        finally:
+            record.file.delete(save=False)
+
+    def upload_sheet(self):
+        """Builds (once) an invoice upload sheet from existing master data, 1-5 rows per invoice."""
+        if getattr(self, '_upload_sheet', None):
+            return self._upload_sheet
+        locations = list(StoreLocation.objects.order_by('id').values_list('name', flat=True)[:500])
+        items = list(Item.objects.order_by('id').values_list('name', flat=True)[:2000])
+        buyers = list(Buyer.objects.order_by('id').values_list('name', flat=True)[:200]) or [None]
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(['header'] * 38)
+        rows = 0
+        group = 0
+        while rows < self.options['upload_rows']:
+            group += 1
+            location, buyer = self.rng.choice(locations), self.rng.choice(buyers)
+            for _ in range(self.rng.randint(1, 5)):
+                row = [None] * 38
+                row[0], row[1], row[2] = buyer, location, self.rng.choice(items)
+                row[4] = self.rng.randint(1, 20)
+                row[9] = 500 if group % 2 else None
+                row[11], row[12] = 'Yes', 'No'
+                row[13] = f"BENCH-{group:06d}"
+                row[14] = '2025-01-15'
+                row[27] = 'KA01AB1234'
+                ws.append(row)
+                rows += 1
+
+        handle, path = tempfile.mkstemp(suffix='.xlsx', prefix='transol_bench_')
+        os.close(handle)
+        wb.save(path)
+        self._upload_sheet = path
+        return path
@@ -0,0 +1,99 @@
+import os
+import shutil
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from clientdoc.attachments import is_blob
+from clientdoc.uploads import ShardedUploadTo, file_date
+
+
+def sharded_fields():
+    """(model, field) of every file field stored with a ShardedUploadTo."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and isinstance(field.upload_to, ShardedUploadTo):
+                yield model, field
+
+
+def place(old_path, new_path):
+    """Makes the file available under its new path too: a hard link where possible, else a copy."""
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    try:
+        os.link(old_path, new_path)
+    except OSError:
+        shutil.copy2(old_path, new_path)
+
+
+class Command(BaseCommand):
+    help = ('Moves files stored under the old flat upload folders into their shard folders and updates the '
+            'stored names, a batch at a time; the app can keep running meanwhile')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows updated per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the files that would be moved')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be >= 1.")
+
+        total = 0
+        for model, field in sharded_fields():
+            moved, missing = self.shard_field(model, field, options['batch_size'], options['dry_run'])
+            total += moved
+            label = f"{model._meta.label}.{field.name}"
+            self.stdout.write(f"{label}: {moved} {'to move' if options['dry_run'] else 'moved'}"
+                              + (f", {missing} missing on disk" if missing else ""))
+
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} files into shard folders."))
+
+    def shard_field(self, model, field, batch_size, dry_run):
+        upload_to = field.upload_to
+        qs = model._base_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+        new_names = {}  # old name -> new name, rows sharing a file share its new copy
+        moved = missing = 0
+        last_pk = 0
+        while True:
+            rows = list(qs.filter(pk__gt=last_pk).order_by('pk').values_list('pk', field.name)[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            batch = []
+            for pk, name in rows:
+                if is_blob(name) or upload_to.is_sharded(name):
+                    continue
+                old_path = os.path.join(settings.MEDIA_ROOT, name)
+                if name not in new_names:
+                    if not os.path.exists(old_path):
+                        missing += 1
+                        continue
+                    if dry_run:
+                        new_names[name] = None
+                    else:
+                        new_name = default_storage.get_available_name(upload_to.name_for(name, file_date(old_path)))
+                        place(old_path, os.path.join(settings.MEDIA_ROOT, new_name))
+                        new_names[name] = new_name
+                batch.append((pk, name))
+            if dry_run:
+                moved += len(batch)
+                continue
+
+            with transaction.atomic():
+                for pk, name in batch:
+                    # Only if the row still holds the old name; a concurrent upload wins
+                    moved += model._base_manager.filter(pk=pk, **{field.name: name}).update(**{field.name: new_names[name]})
+
+        if not dry_run:
+            # Every row of this field now uses the new names, so the old copies can go
+            for old_name, new_name in new_names.items():
+                if qs.filter(**{field.name: old_name}).exists():
+                    continue
+                old_path = os.path.join(settings.MEDIA_ROOT, old_name)
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+        return moved, missing
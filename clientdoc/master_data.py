@@ -0,0 +1,225 @@
+"""Bulk insert/update of master data (buyers, locations, items) from spreadsheets.
+
+Used by the master data bulk uploads and the ``import_data`` command. A sheet is
+read into a DataFrame, cleaned column by column, matched against the existing
+names in a few queries and written with bulk_create and batched UPDATEs, instead
+of one update_or_create per row.
+
+Bulk writes skip save() and the post_save signals, so the derived
+fields (state_code, hsn_code) are filled through ``fill_derived_fields`` and the
+cached upload templates are invalidated here.
+"""
+from decimal import Decimal
+
+import pandas as pd
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .excel_templates import invalidate_templates
+from .models import Buyer, Item, ItemCategory, StoreLocation
+
+BATCH_SIZE = 500
+# Names per IN (...) lookup, below SQLite's variable limit
+LOOKUP_CHUNK = 500
+
+# Blank cells get these values, like the old per-row ``row[n] or default``
+TEXT_DEFAULTS = {
+    Buyer: {'address': '', 'gstin': '', 'state': 'Karnataka'},
+    StoreLocation: {'site_code': '', 'address': '', 'city': '', 'state': 'Karnataka', 'gstin': '', 'priority': ''},
+    Item: {'article_code': '', 'description': '', 'hsn_code': '844311', 'unit': 'Nos'},
+}
+DECIMAL_DEFAULTS = {
+    Item: {'price': Decimal('0.00'), 'gst_rate': Decimal('0.18')},
+}
+
+# Column order of the bulk upload templates (exports.MASTER_HEADERS); None columns are ignored.
+# Buyer has no phone/email fields, the template keeps those columns for compatibility only.
+UPLOAD_COLUMNS = {
+    'buyer': (Buyer, ['name', 'address', 'gstin', 'state', None, None]),
+    'item': (Item, ['name', 'category', 'article_code', 'description', 'price', 'gst_rate', 'hsn_code', 'unit']),
+    'location': (StoreLocation, ['name', 'site_code', 'address', 'city', 'state', 'gstin', 'priority']),
+}
+
+
+class UpsertResult:
+    def __init__(self):
+        # (sheet row number, name, 'created' | 'updated' | 'unchanged' | 'skipped', message)
+        self.rows = []
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    def add(self, row_number, name, outcome, message=''):
+        self.rows.append((row_number, name, outcome, message))
+        if outcome in ('created', 'updated', 'unchanged'):
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def summary(self):
+        return f"{self.created} created, {self.updated} updated, {self.unchanged} unchanged"
+
+
+def fingerprint(obj, fields):
+    """The values an import would write for ``obj``, normalised so stored and sheet values compare equal."""
+    return tuple(f.to_python(getattr(obj, f.attname)) for f in fields)
+
+
+def _text(series, default):
+    values = series.where(series.notna(), '').astype(str).str.strip()
+    return values.where(values != '', default)
+
+
+def _decimal(series, default, places):
+    numbers = pd.to_numeric(series, errors='coerce').round(places)
+    return [Decimal(f"{v:.{places}f}") if pd.notna(v) else default for v in numbers]
+
+
+def clean_frame(model, df):
+    """Normalises a frame whose columns are field names (plus 'row_number').
+
+    Rows without a name are dropped. Text blanks become the field default and
+    numbers that do not parse fall back to the default as well.
+    """
+    df = df.copy()
+    df['name'] = _text(df['name'], '')
+    df = df[df['name'] != '']
+    for field, default in TEXT_DEFAULTS[model].items():
+        if field in df:
+            df[field] = _text(df[field], default)
+    for field, default in DECIMAL_DEFAULTS.get(model, {}).items():
+        if field in df:
+            df[field] = _decimal(df[field], default, model._meta.get_field(field).decimal_places)
+    if 'category' in df:
+        df['category'] = _text(df['category'], '')
+    return df
+
+
+def resolve_categories(names):
+    """Returns {name: id} for the given category names, creating the missing ones in one batch."""
+    names = sorted({n for n in names if n})
+    ids = dict(ItemCategory.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [n for n in names if n not in ids]
+    if missing:
+        ItemCategory.objects.bulk_create([ItemCategory(name=n) for n in missing], batch_size=BATCH_SIZE, ignore_conflicts=True)
+        ids.update(ItemCategory.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def _existing(model, names):
+    # all_objects: names are unique across the trash too, so a deleted row is updated (and restored)
+    found = {}
+    for i in range(0, len(names), LOOKUP_CHUNK):
+        for obj in model.all_objects.filter(name__in=names[i:i + LOOKUP_CHUNK]):
+            found[obj.name] = obj
+    return found
+
+
+def bulk_update_rows(model, objs, field_names):
+    """Writes ``field_names`` of ``objs`` with one executemany'd UPDATE ... WHERE id = %s.
+
+    QuerySet.bulk_update builds a CASE WHEN per field and row, which takes longer to
+    compile in Python than the database needs to run the plain statements.
+    """
+    if not objs:
+        return
+    fields = [model._meta.get_field(name) for name in field_names]
+    quote = connection.ops.quote_name
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        quote(model._meta.db_table),
+        ", ".join(f"{quote(f.column)} = %s" for f in fields),
+        quote(model._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        for i in range(0, len(objs), BATCH_SIZE):
+            cursor.executemany(sql, [
+                [f.get_db_prep_save(getattr(obj, f.attname), connection) for f in fields] + [obj.pk]
+                for obj in objs[i:i + BATCH_SIZE]
+            ])
+
+
+def upsert_frame(model, df):
+    """Creates or updates one ``model`` row per cleaned frame row, matched on the exact name.
+
+    Existing rows are only written when their fingerprint (the compared field values)
+    differs from the sheet. When a name appears more than once the last row wins, as
+    with the old per-row import.
+    """
+    result = UpsertResult()
+    if 'row_number' not in df:
+        df = df.assign(row_number=range(2, len(df) + 2))
+    df = clean_frame(model, df)
+
+    duplicated = df.duplicated('name', keep='last')
+    last_row = dict(zip(df['name'], df['row_number']))
+    for row_number, name in zip(df.loc[duplicated, 'row_number'], df.loc[duplicated, 'name']):
+        result.add(row_number, name, 'skipped', f"Duplicate name, row {last_row[name]} is used instead")
+    df = df[~duplicated]
+
+    fields = [c for c in df.columns if c not in ('name', 'row_number')]
+    category_ids = None
+    if 'category' in fields:
+        category_ids = resolve_categories(df['category'])
+        fields = [('category_id' if f == 'category' else f) for f in fields]
+
+    derived = [f.name for f in model._meta.concrete_fields if f.name in ('state_code', 'hsn_code')]
+    compared_fields = sorted(set(fields + derived + ['is_deleted']))
+    compared = [model._meta.get_field(name) for name in compared_fields]
+    # The raw UPDATE skips auto_now, so the change timestamp is written explicitly
+    update_fields = compared_fields + ['updated_at']
+    now = timezone.now()
+
+    existing = _existing(model, list(df['name']))
+    to_create, to_update = [], []
+    for record in df.to_dict('records'):
+        if category_ids is not None:
+            record['category_id'] = category_ids.get(record.pop('category'))
+        obj = existing.get(record['name'])
+        before = fingerprint(obj, compared) if obj is not None else None
+        if obj is None:
+            obj = model(name=record['name'])
+        for field in fields:
+            setattr(obj, field, record[field])
+        obj.is_deleted = False
+        obj.fill_derived_fields()
+
+        if before is None:
+            outcome = 'created'
+            to_create.append(obj)
+        elif fingerprint(obj, compared) != before:
+            outcome = 'updated'
+            obj.updated_at = now
+            to_update.append(obj)
+        else:
+            # Stored values already match the sheet, the row is not written at all
+            outcome = 'unchanged'
+        result.add(record['row_number'], record['name'], outcome)
+
+    if to_create or to_update:
+        with transaction.atomic():
+            model.all_objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+            bulk_update_rows(model, to_update, update_fields)
+            # Bulk writes send no post_save signals
+            transaction.on_commit(invalidate_templates)
+
+    result.rows.sort(key=lambda r: r[0])
+    return result
+
+
+def read_upload_sheet(file, upload_type):
+    """Reads a master data upload into (model, frame) using the template's column positions."""
+    model, columns = UPLOAD_COLUMNS[upload_type]
+    df = pd.read_excel(file, header=0, dtype=object)
+    present = min(df.shape[1], len(columns))
+    df = df.iloc[:, :present]
+    df.columns = [c or f'_unused_{i}' for i, c in enumerate(columns[:present])]
+    # Missing trailing columns read as blank cells, like openpyxl rows padded with None
+    for column in columns[present:]:
+        if column:
+            df[column] = None
+    df = df[[c for c in columns if c]]
+    return model, df.assign(row_number=df.index + 2)
+
+
+def import_upload_sheet(file, upload_type):
+    """Reads and upserts a master data upload; returns an UpsertResult."""
+    model, df = read_upload_sheet(file, upload_type)
+    return upsert_frame(model, df)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0021_invoiceitem_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='confirmationdocument',
+            name='bundle_metrics',
+            field=models.JSONField(blank=True, help_text='Per-stage timings, sizes and page counts of the last bundle build', null=True),
+        ),
+    ]
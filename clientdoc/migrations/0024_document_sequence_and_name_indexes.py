@@ -0,0 +1,38 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:24
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0023_activitylog_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='buyer',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='buyer_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='item_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesinvoice',
+            index=models.Index(django.db.models.functions.text.Upper('tally_invoice_number'), name='invoice_tally_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storelocation',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='location_name_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0024_document_sequence_and_name_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='checkpoint',
+            field=models.PositiveIntegerField(default=0, help_text='Invoice groups already committed'),
+        ),
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='total_groups',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='upload_type',
+            field=models.CharField(default='invoice', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='bulkinvoiceupload',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Processed', 'Processed'), ('Failed', 'Failed')], default='Pending', max_length=20),
+        ),
+    ]
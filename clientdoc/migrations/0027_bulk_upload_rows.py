@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0026_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkUploadRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.PositiveIntegerField(blank=True, null=True)),
+                ('group_key', models.CharField(blank=True, max_length=100)),
+                ('outcome', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('skipped', 'Skipped'), ('warning', 'Warning'), ('error', 'Error'), ('info', 'Info')], max_length=10)),
+                ('message', models.TextField(blank=True)),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='clientdoc.salesinvoice')),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='clientdoc.bulkinvoiceupload')),
+            ],
+            options={
+                'ordering': ['row_number', 'id'],
+                'indexes': [models.Index(fields=['upload', 'outcome'], name='clientdoc_b_upload__40be42_idx'), models.Index(fields=['upload', 'row_number'], name='clientdoc_b_upload__ef7f3e_idx')],
+            },
+        ),
+    ]
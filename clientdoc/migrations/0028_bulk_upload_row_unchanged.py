@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0027_bulk_upload_rows'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bulkuploadrow',
+            name='outcome',
+            field=models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('unchanged', 'Unchanged'), ('skipped', 'Skipped'), ('warning', 'Warning'), ('error', 'Error'), ('info', 'Info')], max_length=10),
+        ),
+    ]
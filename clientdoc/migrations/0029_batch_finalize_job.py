@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0028_bulk_upload_row_unchanged'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchFinalizeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Queued', max_length=20)),
+                ('description', models.CharField(blank=True, help_text='How the invoices were selected', max_length=255)),
+                ('invoice_ids', models.JSONField(default=list)),
+                ('finished_ids', models.JSONField(default=list)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('log', models.TextField(blank=True)),
+                ('zip_file', models.FileField(blank=True, null=True, upload_to='batch_finalize/')),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:46
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0029_batch_finalize_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceTaxLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hsn', models.CharField(max_length=20, verbose_name='HSN/SAC')),
+                ('gst_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('taxable_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('cgst', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('sgst', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('igst', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tax_lines', to='clientdoc.salesinvoice')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['hsn', 'gst_rate'], name='invoice_tax_line_hsn_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='invoicetaxline',
+            constraint=models.UniqueConstraint(fields=('invoice', 'hsn', 'gst_rate'), name='invoice_tax_line_unique'),
+        ),
+    ]
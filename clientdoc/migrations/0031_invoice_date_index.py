@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0030_invoice_tax_line'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salesinvoice',
+            index=models.Index(fields=['date'], name='invoice_date_idx'),
+        ),
+    ]
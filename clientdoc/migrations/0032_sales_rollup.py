@@ -0,0 +1,39 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:50
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0031_invoice_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupDirtyMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('marked_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('quantity', models.IntegerField(default=0)),
+                ('taxable_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('tax_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('buyer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='clientdoc.buyer')),
+                ('item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='clientdoc.item')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clientdoc.storelocation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='sales_rollup_month_idx')],
+            },
+        ),
+    ]
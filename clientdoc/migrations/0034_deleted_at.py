@@ -0,0 +1,59 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:53
+
+from django.db import migrations, models
+from django.utils import timezone
+
+SOFT_DELETE_MODELS = ['Buyer', 'ConfirmationDocument', 'DeliveryChallan', 'Item', 'SalesInvoice', 'StoreLocation', 'TransportCharges']
+
+
+def stamp_trashed_rows(apps, schema_editor):
+    # Rows already in the trash start their retention period now
+    now = timezone.now()
+    for name in SOFT_DELETE_MODELS:
+        apps.get_model('clientdoc', name).objects.filter(is_deleted=True, deleted_at__isnull=True).update(deleted_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0033_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buyer',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='confirmationdocument',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliverychallan',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='salesinvoice',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='storelocation',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transportcharges',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(stamp_trashed_rows, migrations.RunPython.noop),
+    ]
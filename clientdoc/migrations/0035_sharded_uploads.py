@@ -0,0 +1,59 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:58
+
+import clientdoc.uploads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0034_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='batchfinalizejob',
+            name='zip_file',
+            field=models.FileField(blank=True, null=True, upload_to=clientdoc.uploads.ShardedUploadTo('batch_finalize', by='hash')),
+        ),
+        migrations.AlterField(
+            model_name='bulkinvoiceupload',
+            name='file',
+            field=models.FileField(upload_to=clientdoc.uploads.ShardedUploadTo('bulk_uploads')),
+        ),
+        migrations.AlterField(
+            model_name='confirmationdocument',
+            name='approval_email_file',
+            field=models.FileField(blank=True, null=True, upload_to=clientdoc.uploads.ShardedUploadTo('confirmation_docs/email'), verbose_name='Approval Email PDF'),
+        ),
+        migrations.AlterField(
+            model_name='confirmationdocument',
+            name='combined_pdf',
+            field=models.FileField(blank=True, null=True, upload_to=clientdoc.uploads.ShardedUploadTo('confirmations', by='hash')),
+        ),
+        migrations.AlterField(
+            model_name='confirmationdocument',
+            name='po_file',
+            field=models.FileField(blank=True, null=True, upload_to=clientdoc.uploads.ShardedUploadTo('confirmation_docs/po'), verbose_name='PO Copy'),
+        ),
+        migrations.AlterField(
+            model_name='confirmationdocument',
+            name='uploaded_dc',
+            field=models.FileField(blank=True, null=True, upload_to=clientdoc.uploads.ShardedUploadTo('confirmation_docs/dc'), verbose_name='Custom DC PDF'),
+        ),
+        migrations.AlterField(
+            model_name='confirmationdocument',
+            name='uploaded_invoice',
+            field=models.FileField(blank=True, null=True, upload_to=clientdoc.uploads.ShardedUploadTo('confirmation_docs/inv'), verbose_name='Custom Invoice PDF'),
+        ),
+        migrations.AlterField(
+            model_name='ourcompanyprofile',
+            name='signature',
+            field=models.ImageField(blank=True, help_text='Upload signature image for PDFs', null=True, upload_to=clientdoc.uploads.ShardedUploadTo('company_signatures')),
+        ),
+        migrations.AlterField(
+            model_name='packedimage',
+            name='image',
+            field=models.ImageField(upload_to=clientdoc.uploads.ShardedUploadTo('packed_images')),
+        ),
+    ]
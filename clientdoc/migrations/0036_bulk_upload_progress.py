@@ -0,0 +1,41 @@
+# Generated by Django 4.2.23 on 2026-10-18 23:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def stamp_from_upload_time(apps, schema_editor):
+    BulkInvoiceUpload = apps.get_model('clientdoc', 'BulkInvoiceUpload')
+    BulkInvoiceUpload.objects.update(updated_at=models.F('uploaded_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0035_sharded_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='created_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='error_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='updated_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(stamp_from_upload_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.23 on 2026-10-19 00:10
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations
+
+CHUNK_SIZE = 500
+
+# Frozen copies of the models.py constants and rounding as of this migration;
+# the historical models have none of the model methods.
+TRANSPORT_GST_RATE = Decimal('0.18')
+TRANSPORT_HSN = '9967'
+CENT = Decimal('0.01')
+
+
+def split_gst(taxable, gst_rate, is_inter_state):
+    """Returns (cgst, sgst, igst) for a taxable value."""
+    tax_amount = (taxable * gst_rate).quantize(CENT)
+    if is_inter_state:
+        return Decimal('0.00'), Decimal('0.00'), tax_amount
+    half_tax = (tax_amount / Decimal('2.00')).quantize(CENT)
+    return half_tax, half_tax, Decimal('0.00')
+
+
+def line_taxable(quantity_billed, price, discount_type, discount_value):
+    """Taxable value of an invoice line: gross less the discount, never negative."""
+    gross = (Decimal(quantity_billed) * price).quantize(CENT)
+    if discount_type == 'Percentage':
+        discount = (gross * (discount_value / Decimal('100.00'))).quantize(CENT)
+    else:
+        discount = discount_value.quantize(CENT)
+    taxable = gross - discount
+    return taxable if taxable > 0 else Decimal('0.00')
+
+
+def backfill_tax_lines(apps, schema_editor):
+    """Writes the tax lines of active invoices saved before InvoiceTaxLine existed.
+
+    Mirrors SalesInvoice.build_tax_lines; trashed invoices are left to the readers'
+    fallback (or rebuild_tax_lines) as they are not reported.
+    """
+    SalesInvoice = apps.get_model('clientdoc', 'SalesInvoice')
+    InvoiceTaxLine = apps.get_model('clientdoc', 'InvoiceTaxLine')
+    OurCompanyProfile = apps.get_model('clientdoc', 'OurCompanyProfile')
+
+    profile = OurCompanyProfile.objects.first()
+    company_state_code = (profile and profile.state_code) or getattr(settings, 'COMPANY_STATE_CODE', '29')
+
+    ids = list(
+        SalesInvoice.objects.filter(is_deleted=False, tax_lines__isnull=True).order_by('id').values_list('id', flat=True)
+    )
+    for start in range(0, len(ids), CHUNK_SIZE):
+        invoices = (
+            SalesInvoice.objects.filter(id__in=ids[start:start + CHUNK_SIZE])
+            .select_related('location', 'transportcharges')
+            .prefetch_related('invoiceitem_set__item')
+        )
+        tax_lines = []
+        for invoice in invoices:
+            place_of_supply = invoice.place_of_supply or (invoice.location.state_code if invoice.location else '29')
+            is_inter_state = place_of_supply != company_state_code
+            buckets = {}
+
+            def add(hsn, gst_rate, taxable):
+                cgst, sgst, igst = split_gst(taxable, gst_rate, is_inter_state)
+                line = buckets.get((hsn, gst_rate))
+                if line is None:
+                    line = buckets[(hsn, gst_rate)] = InvoiceTaxLine(
+                        invoice=invoice, hsn=hsn, gst_rate=gst_rate, taxable_value=Decimal('0.00'),
+                        cgst=Decimal('0.00'), sgst=Decimal('0.00'), igst=Decimal('0.00'),
+                    )
+                line.taxable_value += taxable
+                line.cgst += cgst
+                line.sgst += sgst
+                line.igst += igst
+
+            for item in invoice.invoiceitem_set.all():
+                gst_rate = item.gst_rate if item.gst_rate is not None else item.item.gst_rate
+                taxable = line_taxable(item.quantity_billed, item.price, item.discount_type, item.discount_value)
+                add(item.item.hsn_sac, gst_rate, taxable)
+            trp = getattr(invoice, 'transportcharges', None)
+            if trp and trp.charges > 0 and not trp.is_deleted:
+                add(TRANSPORT_HSN, TRANSPORT_GST_RATE, trp.charges)
+            tax_lines += buckets.values()
+        InvoiceTaxLine.objects.bulk_create(tax_lines, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0036_bulk_upload_progress'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_tax_lines, migrations.RunPython.noop),
+    ]
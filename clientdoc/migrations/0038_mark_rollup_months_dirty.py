@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-19 00:40
+
+from django.db import migrations
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def mark_all_months(apps, schema_editor):
+    """Queues every month with invoices, so rollups of data saved before they existed get built.
+
+    The next invoice change (or the refresh_rollups command) rebuilds them.
+    """
+    SalesInvoice = apps.get_model('clientdoc', 'SalesInvoice')
+    RollupDirtyMonth = apps.get_model('clientdoc', 'RollupDirtyMonth')
+    months = SalesInvoice.objects.annotate(month=TruncMonth('date')).values_list('month', flat=True).distinct()
+    RollupDirtyMonth.objects.bulk_create(
+        [RollupDirtyMonth(month=month) for month in {timezone.localtime(m).date() for m in months if m}], ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0037_backfill_tax_lines'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_all_months, migrations.RunPython.noop),
+    ]
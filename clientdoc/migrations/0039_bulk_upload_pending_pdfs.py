@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 23:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0038_mark_rollup_months_dirty'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkinvoiceupload',
+            name='pending_pdfs',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-18 23:58
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def stamp_from_progress(apps, schema_editor):
+    BatchFinalizeJob = apps.get_model('clientdoc', 'BatchFinalizeJob')
+    BatchFinalizeJob.objects.update(updated_at=Coalesce('finished_at', 'created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientdoc', '0039_bulk_upload_pending_pdfs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batchfinalizejob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(stamp_from_progress, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,91 @@
 from django.db import models
 from django.utils import timezone
 from decimal import Decimal
+from datetime import timedelta
 from django.db.models import Max 
 from django.db.models import Sum 
+from django.db.models.functions import Upper
 from django.db import transaction 
 from num2words import num2words # New library
 from django.conf import settings
+from django.dispatch import Signal
 from .constants import INDIAN_STATE_CODES
+from .uploads import ShardedUploadTo
+
+
+def get_company_state_code():
+    """Returns the seller's GST state code (company profile overrides settings)."""
+    company_state_code = getattr(settings, 'COMPANY_STATE_CODE', '29')
+    try:
+        profile = OurCompanyProfile.objects.first()
+        if profile and profile.state_code:
+            company_state_code = profile.state_code
+    except Exception:
+        pass
+    return company_state_code
+
+
+def split_gst(taxable, gst_rate, is_inter_state):
+    """Returns (tax_amount, cgst, sgst, igst) for a taxable value, rounded like the invoice totals."""
+    tax_amount = (taxable * gst_rate).quantize(Decimal('0.01'))
+    if is_inter_state:
+        return tax_amount, Decimal('0.00'), Decimal('0.00'), tax_amount
+    half_tax = (tax_amount / Decimal('2.00')).quantize(Decimal('0.01'))
+    return tax_amount, half_tax, half_tax, Decimal('0.00')
+
+
+# Transport is billed as a service at the standard 18% rate
+TRANSPORT_GST_RATE = Decimal('0.18')
+TRANSPORT_HSN = '9967'
+
+
+# Sent after SoftDeleteQuerySet.soft_delete()/restore() with the affected pks (update() sends no post_save)
+soft_delete_changed = Signal()
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def _set_deleted(self, pks, is_deleted, when):
+        values = {'is_deleted': is_deleted, 'deleted_at': when if is_deleted else None}
+        if any(f.name == 'updated_at' for f in self.model._meta.concrete_fields):
+            # update() skips auto_now, the snapshot export needs to see the change
+            values['updated_at'] = timezone.now()
+        count = self.model._base_manager.filter(pk__in=pks).update(**values)
+        soft_delete_changed.send(sender=self.model, pks=pks, is_deleted=is_deleted)
+        return count
+
+    def _cascade(self):
+        """(related model, FK name) of every reverse relation listed in the model's SOFT_DELETE_CASCADE."""
+        for accessor in self.model.SOFT_DELETE_CASCADE:
+            rel = self.model._meta.get_field(accessor)
+            yield rel.related_model, rel.field.name
+
+    def soft_delete(self, when=None):
+        """Moves the rows (and their SOFT_DELETE_CASCADE documents) to the trash with one UPDATE per model."""
+        when = when or timezone.now()
+        pks = list(self.filter(is_deleted=False).values_list('pk', flat=True))
+        if not pks:
+            return 0
+        with transaction.atomic():
+            count = self._set_deleted(pks, True, when)
+            for related, field in self._cascade():
+                related.all_objects.filter(**{f'{field}__in': pks}).soft_delete(when)
+        return count
 
-
-class SoftDeleteManager(models.Manager):
+    def restore(self):
+        """Takes the rows out of the trash, with the cascaded documents that were trashed together with them."""
+        pks = list(self.filter(is_deleted=True).values_list('pk', flat=True))
+        if not pks:
+            return 0
+        with transaction.atomic():
+            # Before the parents, whose deleted_at identifies the documents to bring back
+            for related, field in self._cascade():
+                related.all_objects.filter(
+                    **{f'{field}__in': pks, 'deleted_at': models.F(f'{field}__deleted_at')}
+                ).restore()
+            return self._set_deleted(pks, False, None)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
     def get_queryset(self):
         return super().get_queryset().filter(is_deleted=False)
 
@@ -18,33 +94,82 @@ class SoftDeleteManager(models.Manager):
 
 class SoftDeleteModel(models.Model):
     is_deleted = models.BooleanField(default=False)
+    # When the row went to the trash; purge_trash removes rows older than the retention period
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
     
     objects = SoftDeleteManager()
-    all_objects = models.Manager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
+    # Reverse one-to-one/FK accessors trashed and restored together with the row
+    SOFT_DELETE_CASCADE = ()
 
     class Meta:
         abstract = True
 
     def delete(self, using=None, keep_parents=False):
+        now = timezone.now()
+        type(self).all_objects.filter(pk=self.pk).soft_delete(now)
         self.is_deleted = True
-        self.save()
+        self.deleted_at = now
+        self.clear_related_cache()
 
     def restore(self):
+        type(self).all_objects.filter(pk=self.pk).restore()
         self.is_deleted = False
-        self.save()
+        self.deleted_at = None
+        self.clear_related_cache()
+
+    def clear_related_cache(self):
+        """Forgets prefetched rows and cached cascade documents, which the UPDATEs of a cascade or an edit leave stale.
+
+        prefetch_invoice_lines skips instances that are already prefetched, so without this
+        a later read would be served the old rows.
+        """
+        self.__dict__.pop('_prefetched_objects_cache', None)
+        for accessor in self.SOFT_DELETE_CASCADE:
+            self._state.fields_cache.pop(accessor, None)
     
     def hard_delete(self):
         super().delete()
 
 class ActivityLog(models.Model):
     action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is logged (not when a buffered batch is flushed); indexed for the dashboard
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     details = models.TextField(blank=True, null=True)
 
     def __str__(self):
         return f"{self.timestamp} - {self.action}"
 
 
+class DocumentSequence(models.Model):
+    """Last number handed out per document series (e.g. app invoice numbers)."""
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+    @classmethod
+    def reserve(cls, name, count=1, seed=None):
+        """Reserves ``count`` consecutive numbers and returns the first one.
+
+        The UPDATE takes a row lock on PostgreSQL (the write lock on SQLite), so
+        concurrent callers never get the same number. ``seed`` returns the last
+        value already in use and is only called when the series does not exist yet.
+        """
+        with transaction.atomic():
+            updated = cls.objects.filter(name=name).update(last_value=models.F('last_value') + count)
+            if not updated:
+                start = seed() if seed else 0
+                # get_or_create copes with another process creating the row first
+                sequence, created = cls.objects.select_for_update().get_or_create(
+                    name=name, defaults={'last_value': start + count}
+                )
+                if not created:
+                    cls.objects.filter(pk=sequence.pk).update(last_value=models.F('last_value') + count)
+            last_value = cls.objects.filter(name=name).values_list('last_value', flat=True).get()
+        return last_value - count + 1
 
 
 # --- COMPANY AND LOCATION MODELS ---
@@ -67,7 +192,7 @@ class OurCompanyProfile(models.Model):
     branch_name = models.CharField(max_length=100, default="ULSOOR")
     
     # Signature
-    signature = models.ImageField(upload_to='company_signatures/', blank=True, null=True, help_text="Upload signature image for PDFs")
+    signature = models.ImageField(upload_to=ShardedUploadTo('company_signatures'), blank=True, null=True, help_text="Upload signature image for PDFs")
 
     class Meta:
         verbose_name = "Our Company Profile (Only One Entry)"
@@ -115,12 +240,22 @@ class Buyer(SoftDeleteModel):
     state = models.CharField(max_length=50, choices=STATE_CHOICES, default="Karnataka")
     state_code = models.CharField(max_length=2, default="29")
     pincode = models.CharField(max_length=10, blank=True, null=True)
+    # Set on every save; export_snapshot picks up the rows changed since its last run
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
-    def save(self, *args, **kwargs):
+    def fill_derived_fields(self):
+        # Also called by master_data for rows written with bulk_create/bulk_update
         if self.state in STATE_CODE_MAP:
             self.state_code = STATE_CODE_MAP[self.state]
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
         super().save(*args, **kwargs)
 
+    class Meta:
+        # Bulk uploads match names with __iexact, which PostgreSQL runs as UPPER(name) = UPPER(%s)
+        indexes = [models.Index(Upper('name'), name='buyer_name_upper_idx')]
+
     def __str__(self):
         return self.name
 
@@ -135,12 +270,20 @@ class StoreLocation(SoftDeleteModel):
     pincode = models.CharField(max_length=10, blank=True, null=True)
     gstin = models.CharField(max_length=15, blank=True, null=True)
     priority = models.CharField(max_length=10, blank=True, null=True, verbose_name="Priority (P1-P4)")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
-    def save(self, *args, **kwargs):
+    def fill_derived_fields(self):
+        # Also called by master_data for rows written with bulk_create/bulk_update
         if self.state in STATE_CODE_MAP:
             self.state_code = STATE_CODE_MAP[self.state]
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [models.Index(Upper('name'), name='location_name_upper_idx')]
+
     def __str__(self):
         return f"{self.name} ({self.city or 'No City'})"
 
@@ -175,18 +318,30 @@ class Item(SoftDeleteModel):
     gst_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.18, choices=GST_CHOICES, verbose_name="GST Rate") 
     # GST Enhancements
     hsn_code = models.CharField(max_length=20, blank=True, null=True, verbose_name="HSN Code")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
-    def save(self, *args, **kwargs):
+    def fill_derived_fields(self):
         # Sync older hsn_sac to new hsn_code if needed, or vice-versa
         if not self.hsn_code and self.hsn_sac:
              self.hsn_code = self.hsn_sac
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [models.Index(Upper('name'), name='item_name_upper_idx')]
+
     def __str__(self):
         return self.name
 
 # --- INVOICE AND RELATED MODELS ---
 
+APP_INVOICE_SEQUENCE = 'app_invoice_number'
+# Invoice fields the sales rollups depend on; line item saves mark their month themselves (signals.py)
+ROLLUP_FIELDS = ('date', 'total', 'is_deleted', 'location_id', 'buyer_id')
+
+
 class SalesInvoice(SoftDeleteModel):
     STATUS_CHOICES = [
         ('DRF', 'Draft (Invoice Created)'),
@@ -194,11 +349,13 @@ class SalesInvoice(SoftDeleteModel):
         ('TRP', 'Transport Charges Logged'),
         ('FIN', 'Finalized (PDF Generated)')
     ]
+    SOFT_DELETE_CASCADE = ('deliverychallan', 'transportcharges', 'confirmationdocument')
 
     buyer = models.ForeignKey(Buyer, on_delete=models.PROTECT, null=True, blank=True, verbose_name="Buyer (Bill To)")
     location = models.ForeignKey(StoreLocation, on_delete=models.PROTECT, verbose_name="Location (Ship To/Consignee)")
     date = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     status = models.CharField(max_length=3, choices=STATUS_CHOICES, default='DRF')
     
@@ -230,18 +387,33 @@ class SalesInvoice(SoftDeleteModel):
     # Store calculated Words
     amount_in_words = models.CharField(max_length=255, blank=True, null=True)
     tax_amount_in_words = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        # Re-uploads look invoices up by tally number with __iexact
+        indexes = [
+            models.Index(Upper('tally_invoice_number'), name='invoice_tally_upper_idx'),
+            # Date ranges of exports and GST returns
+            models.Index(fields=['date'], name='invoice_date_idx'),
+        ]
         
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so a save only marks the rollups when a value they depend on changed, and
+        # moving an invoice to another month also refreshes the old month
+        instance._loaded_rollup_state = {
+            name: values[field_names.index(name)] for name in ROLLUP_FIELDS if name in field_names
+        }
+        return instance
+
+    def rollup_state(self):
+        """The loaded values of ROLLUP_FIELDS (deferred ones are not fetched)."""
+        return {name: self.__dict__[name] for name in ROLLUP_FIELDS if name in self.__dict__}
+
     def calculate_gst_totals(self):
         """Calculates Taxes based on Place of Supply vs Company State."""
         # 1. Fetch Company State
-        company_state_code = getattr(settings, 'COMPANY_STATE_CODE', '29')
-        # Check specific model if available override
-        try:
-            profile = OurCompanyProfile.objects.first()
-            if profile and profile.state_code:
-                company_state_code = profile.state_code
-        except Exception:
-            pass
+        company_state_code = get_company_state_code()
             
         # 2. Determine POS
         if not self.place_of_supply:
@@ -258,51 +430,11 @@ class SalesInvoice(SoftDeleteModel):
         # 3. Determine Tax Type
         is_inter_state = (self.place_of_supply != company_state_code)
         
-        total_cgst = Decimal('0.00')
-        total_sgst = Decimal('0.00')
-        total_igst = Decimal('0.00')
-        grand_total = Decimal('0.00')
-        total_tax = Decimal('0.00')
-
-        for item in self.invoiceitem_set.all():
-            taxable = item.taxable_value
-            gst_rate = item.item.gst_rate # Use item rate or snapshot?? Models say calculate_total used snapshot.
-            # Use snapshot if available
-            if item.gst_rate is not None:
-                gst_rate = item.gst_rate
-
-            tax_amount = (taxable * gst_rate).quantize(Decimal('0.01'))
-            
-            if is_inter_state:
-                total_igst += tax_amount
-            else:
-                half_tax = (tax_amount / Decimal('2.00')).quantize(Decimal('0.01'))
-                total_cgst += half_tax
-                total_sgst += half_tax
-            
-            grand_total += taxable + tax_amount
-            total_tax += tax_amount
-
-        # --- Add Transport Charges if Any ---
-        if hasattr(self, 'transportcharges'):
-            trp = self.transportcharges
-            if trp and trp.charges > 0:
-                # Assuming 18% GST on Transport for now (Standard Service Rate)
-                # Or check if specific config exists. User said "along with gst".
-                trp_taxable = trp.charges
-                trp_gst_rate = Decimal('0.18') 
-                
-                trp_tax_amt = (trp_taxable * trp_gst_rate).quantize(Decimal('0.01'))
-                
-                if is_inter_state:
-                    total_igst += trp_tax_amt
-                else:
-                    half_tax = (trp_tax_amt / Decimal('2.00')).quantize(Decimal('0.01'))
-                    total_cgst += half_tax
-                    total_sgst += half_tax
-                
-                grand_total += trp_taxable + trp_tax_amt
-                total_tax += trp_tax_amt
+        tax_lines, total_tax = self.build_tax_lines(is_inter_state)
+        total_cgst = sum((line.cgst for line in tax_lines), Decimal('0.00'))
+        total_sgst = sum((line.sgst for line in tax_lines), Decimal('0.00'))
+        total_igst = sum((line.igst for line in tax_lines), Decimal('0.00'))
+        grand_total = sum((line.taxable_value for line in tax_lines), Decimal('0.00')) + total_tax
 
         self.cgst_total = total_cgst
         self.sgst_total = total_sgst
@@ -316,34 +448,84 @@ class SalesInvoice(SoftDeleteModel):
         except Exception:
              self.amount_in_words = "Error generating words"
 
-        self.save()
+        with transaction.atomic():
+            self.save()
+            self.tax_lines.all().delete()
+            InvoiceTaxLine.objects.bulk_create(tax_lines)
+
+    def build_tax_lines(self, is_inter_state):
+        """Groups the line items (and transport) by HSN and GST rate.
+
+        Returns the unsaved InvoiceTaxLine rows and the total tax. Each line is split
+        with ``split_gst`` before grouping, so the rows add up to the invoice totals.
+        """
+        prefetch_invoice_lines([self])
+        buckets = {}
+        total_tax = Decimal('0.00')
+
+        def add(hsn, gst_rate, taxable):
+            tax_amount, cgst, sgst, igst = split_gst(taxable, gst_rate, is_inter_state)
+            line = buckets.get((hsn, gst_rate))
+            if line is None:
+                line = buckets[(hsn, gst_rate)] = InvoiceTaxLine(invoice=self, hsn=hsn, gst_rate=gst_rate)
+            line.taxable_value += taxable
+            line.cgst += cgst
+            line.sgst += sgst
+            line.igst += igst
+            return tax_amount
+
+        for item in self.invoiceitem_set.all():
+            # Snapshot rate; the item master rate is only a fallback
+            gst_rate = item.gst_rate if item.gst_rate is not None else item.item.gst_rate
+            total_tax += add(item.item.hsn_sac, gst_rate, item.taxable_value)
+
+        # --- Add Transport Charges if Any ---
+        if hasattr(self, 'transportcharges'):
+            trp = self.transportcharges
+            # Trashed transport charges are not billed
+            if trp and trp.charges > 0 and not trp.is_deleted:
+                # Transport is billed as a service at the standard rate
+                total_tax += add(TRANSPORT_HSN, TRANSPORT_GST_RATE, trp.charges)
+
+        return list(buckets.values()), total_tax
 
     def save(self, *args, **kwargs):
         if not self.app_invoice_number:
             # FIX: Robust sequential number generation with retry logic
             for attempt in range(5): # Retry up to 5 times
+                # Reserved outside the savepoint so a failed save doesn't hand the same number out again
+                new_seq = SalesInvoice.next_app_sequence()
+                self.app_invoice_number = f"Tsol-{new_seq:05d}"
                 try:
                     with transaction.atomic():
-                        # Find the highest existing app_invoice_number sequence
-                        last_invoice = SalesInvoice.objects.all().order_by('-app_invoice_number').only('app_invoice_number').first()
-                        
-                        new_seq = 1
-                        if last_invoice and last_invoice.app_invoice_number:
-                            try:
-                                last_seq = int(last_invoice.app_invoice_number.split('-')[1])
-                                new_seq = last_seq + 1
-                            except (ValueError, IndexError):
-                                new_seq = 1
-        
-                        self.app_invoice_number = f"Tsol-{new_seq:05d}"
                         super().save(*args, **kwargs)
                         break # Success!
                 except Exception: # Catch IntegrityError or other save issues
-                    if attempt == 4: raise # Re-raise if last attempt
+                    if attempt == 4:
+                        self.app_invoice_number = None
+                        raise # Re-raise if last attempt
                     continue # Try again
         else:
             super().save(*args, **kwargs)
 
+    @staticmethod
+    def next_app_sequence(count=1):
+        """Reserves the next Tsol-XXXXX sequence number(s) and returns the first one."""
+        return DocumentSequence.reserve(APP_INVOICE_SEQUENCE, count, seed=SalesInvoice.max_app_sequence)
+
+    @staticmethod
+    def max_app_sequence():
+        """Highest Tsol-XXXXX number in use (trashed invoices keep their numbers)."""
+        # Compared numerically: as text 'Tsol-100000' sorts before 'Tsol-99999'
+        highest = 0
+        numbers = SalesInvoice.all_objects.filter(app_invoice_number__startswith='Tsol-').values_list('app_invoice_number', flat=True)
+        for number in numbers.iterator(chunk_size=5000):
+            try:
+                highest = max(highest, int(number.split('-')[1]))
+            except (ValueError, IndexError):
+                continue
+        return highest
+
     def calculate_total(self):
         """Wrapper for new calculate_gst_totals to maintain compatibility."""
         self.calculate_gst_totals()
@@ -388,6 +570,7 @@ class InvoiceItem(models.Model):
         (Decimal('0.40'), '40%'),
     ]
     gst_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0.18, choices=GST_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         # Auto-populate from item if not set
@@ -400,28 +583,66 @@ class InvoiceItem(models.Model):
             pass # We rely on view or manual input.
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def compute_taxable(quantity_billed, price, discount_type, discount_value):
+        """Returns (gross, discount, taxable) from raw column values (used by exports on .values() rows)."""
+        gross = (Decimal(quantity_billed) * price).quantize(Decimal('0.01'))
+        if discount_type == 'Percentage':
+            discount = (gross * (discount_value / Decimal('100.00'))).quantize(Decimal('0.01'))
+        else:
+            discount = discount_value.quantize(Decimal('0.01'))
+        taxable = gross - discount
+        return gross, discount, (taxable if taxable > 0 else Decimal('0.00'))
+
     @property
     def gross_amount(self):
         """Returns Quantity Billed * Price"""
-        return (Decimal(self.quantity_billed) * self.price).quantize(Decimal('0.01'))
+        return self.compute_taxable(self.quantity_billed, self.price, self.discount_type, self.discount_value)[0]
 
     @property
     def discount_amount(self):
         """Returns calculated discount amount"""
-        gross = self.gross_amount
-        if self.discount_type == 'Percentage':
-            return (gross * (self.discount_value / Decimal('100.00'))).quantize(Decimal('0.01'))
-        return self.discount_value.quantize(Decimal('0.01'))
+        return self.compute_taxable(self.quantity_billed, self.price, self.discount_type, self.discount_value)[1]
 
     @property
     def taxable_value(self):
         """Returns Gross - Discount"""
-        val = self.gross_amount - self.discount_amount
-        return val if val > 0 else Decimal('0.00')
+        return self.compute_taxable(self.quantity_billed, self.price, self.discount_type, self.discount_value)[2]
 
     def __str__(self):
         return f"{self.item.name} for Invoice {self.invoice.id}"
 
+def prefetch_invoice_lines(invoices):
+    """Loads ``invoiceitem_set`` (with the items) of the invoices in one query; already loaded ones are skipped."""
+    models.prefetch_related_objects(
+        invoices, models.Prefetch('invoiceitem_set', queryset=InvoiceItem.objects.select_related('item').order_by('id'))
+    )
+
+class InvoiceTaxLine(models.Model):
+    """Per-invoice tax summary by HSN and GST rate, rewritten by calculate_gst_totals.
+
+    Backs the tax matrix of the printed invoice and the HSN-wise reports.
+    """
+    invoice = models.ForeignKey(SalesInvoice, on_delete=models.CASCADE, related_name='tax_lines')
+    hsn = models.CharField(max_length=20, verbose_name="HSN/SAC")
+    gst_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    taxable_value = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    cgst = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    sgst = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    igst = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        ordering = ['id']
+        constraints = [models.UniqueConstraint(fields=['invoice', 'hsn', 'gst_rate'], name='invoice_tax_line_unique')]
+        indexes = [models.Index(fields=['hsn', 'gst_rate'], name='invoice_tax_line_hsn_idx')]
+
+    @property
+    def tax(self):
+        return self.cgst + self.sgst + self.igst
+
+    def __str__(self):
+        return f"{self.hsn} @ {self.gst_rate} for Invoice {self.invoice_id}"
+
 class DeliveryChallan(SoftDeleteModel):
     """Stores data for the Delivery Challan document."""
     invoice = models.OneToOneField(SalesInvoice, on_delete=models.CASCADE)
@@ -452,15 +673,16 @@ class ConfirmationDocument(SoftDeleteModel):
     created_at = models.DateTimeField(default=timezone.now)
     
     # Uploaded Documents
-    po_file = models.FileField(upload_to='confirmation_docs/po/', blank=True, null=True, verbose_name="PO Copy")
-    approval_email_file = models.FileField(upload_to='confirmation_docs/email/', blank=True, null=True, verbose_name="Approval Email PDF")
+    po_file = models.FileField(upload_to=ShardedUploadTo('confirmation_docs/po'), blank=True, null=True, verbose_name="PO Copy")
+    approval_email_file = models.FileField(upload_to=ShardedUploadTo('confirmation_docs/email'), blank=True, null=True, verbose_name="Approval Email PDF")
     
     # Custom Uploads (Overrides generated ones if present)
-    uploaded_invoice = models.FileField(upload_to='confirmation_docs/inv/', blank=True, null=True, verbose_name="Custom Invoice PDF")
-    uploaded_dc = models.FileField(upload_to='confirmation_docs/dc/', blank=True, null=True, verbose_name="Custom DC PDF")
+    uploaded_invoice = models.FileField(upload_to=ShardedUploadTo('confirmation_docs/inv'), blank=True, null=True, verbose_name="Custom Invoice PDF")
+    uploaded_dc = models.FileField(upload_to=ShardedUploadTo('confirmation_docs/dc'), blank=True, null=True, verbose_name="Custom DC PDF")
 
     # Final Output
-    combined_pdf = models.FileField(upload_to='confirmations/', blank=True, null=True)
+    combined_pdf = models.FileField(upload_to=ShardedUploadTo('confirmations', by='hash'), blank=True, null=True)
+    bundle_metrics = models.JSONField(blank=True, null=True, help_text="Per-stage timings, sizes and page counts of the last bundle build")
     
     def __str__(self):
         return f"Confirmation for Invoice {self.invoice.id}"
@@ -468,19 +690,184 @@ class ConfirmationDocument(SoftDeleteModel):
 class PackedImage(models.Model):
     """Stores multiple images of packed goods linked to a ConfirmationDocument."""
     confirmation = models.ForeignKey(ConfirmationDocument, on_delete=models.CASCADE, null=True) 
-    image = models.ImageField(upload_to='packed_images/')
+    image = models.ImageField(upload_to=ShardedUploadTo('packed_images'))
     notes = models.TextField(blank=True, null=True, verbose_name="Image Notes") 
 
     def __str__(self):
         invoice_id = self.confirmation.invoice.id if self.confirmation and self.confirmation.invoice else "N/A"
         return f"Image for Confirmation {invoice_id}"
 
+class AttachmentBlob(models.Model):
+    """A file stored once by content (sha256) and referenced by any number of file fields."""
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=100, help_text="Storage name, e.g. blobs/ab/cd/<digest>.pdf")
+    original_name = models.CharField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.original_name or self.name} ({self.digest[:12]})"
+
+
+class AttachmentSource(models.Model):
+    """Remembers which blob a local source file hashed to, so unchanged files are not read again."""
+    path = models.CharField(max_length=1024, unique=True)
+    size = models.PositiveBigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.CASCADE, related_name='sources')
+
+    def __str__(self):
+        return self.path
+
+
 class BulkInvoiceUpload(models.Model):
     """Tracks bulk excel uploads for invoice generation."""
-    file = models.FileField(upload_to='bulk_uploads/')
+    file = models.FileField(upload_to=ShardedUploadTo('bulk_uploads'))
     uploaded_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, default='Pending', choices=[('Pending', 'Pending'), ('Processed', 'Processed'), ('Failed', 'Failed')])
+    upload_type = models.CharField(max_length=20, default='invoice')
+    status = models.CharField(max_length=20, default='Pending', choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Processed', 'Processed'), ('Failed', 'Failed')])
     log = models.TextField(blank=True, null=True, help_text="Log of success/errors during processing")
+    # Invoice uploads commit in chunks of groups; a rerun continues after the last committed group
+    checkpoint = models.PositiveIntegerField(default=0, help_text="Invoice groups already committed")
+    total_groups = models.PositiveIntegerField(default=0)
+    # Running totals of the committed groups, so a resumed run reports the whole upload
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # [invoice id, row, group key] of bundles a committed chunk still has to build; saved with its checkpoint
+    pending_pdfs = models.JSONField(default=list, blank=True)
+    # Saved with every chunk; a 'Processing' upload that stops moving is treated as interrupted
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def is_stale(self):
+        minutes = getattr(settings, 'BULK_UPLOAD_STALE_MINUTES', 15)
+        return self.updated_at < timezone.now() - timedelta(minutes=minutes)
+
+    @property
+    def can_resume(self):
+        if self.upload_type != 'invoice' or (self.checkpoint >= self.total_groups and not self.pending_pdfs):
+            return False
+        return self.status == 'Failed' or (self.status == 'Processing' and self.is_stale)
+
+    def __str__(self):
+        return f"Upload {self.id} at {self.uploaded_at}"
+
+
+class BulkUploadRow(models.Model):
+    """Result of one sheet row (or invoice group) of a bulk upload."""
+    OUTCOME_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('unchanged', 'Unchanged'),
+        ('skipped', 'Skipped'),
+        ('warning', 'Warning'),
+        ('error', 'Error'),
+        ('info', 'Info'),
+    ]
+    upload = models.ForeignKey(BulkInvoiceUpload, on_delete=models.CASCADE, related_name='rows')
+    row_number = models.PositiveIntegerField(null=True, blank=True)
+    group_key = models.CharField(max_length=100, blank=True)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES)
+    message = models.TextField(blank=True)
+    invoice = models.ForeignKey(SalesInvoice, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ['row_number', 'id']
+        indexes = [
+            models.Index(fields=['upload', 'outcome']),
+            models.Index(fields=['upload', 'row_number']),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.upload_id} row {self.row_number}: {self.outcome}"
+
+
+class BatchFinalizeJob(models.Model):
+    """Finalizes a list of invoices in the background and collects the bundles in a ZIP."""
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=20, default='Queued', choices=STATUS_CHOICES)
+    description = models.CharField(max_length=255, blank=True, help_text="How the invoices were selected")
+    invoice_ids = models.JSONField(default=list)
+    # Written only by the coordinating thread, so a restart can skip what is already done
+    finished_ids = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    log = models.TextField(blank=True)
+    zip_file = models.FileField(upload_to=ShardedUploadTo('batch_finalize', by='hash'), blank=True, null=True)
+    # Saved with every finished invoice; a 'Running' job that stops moving is treated as interrupted
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def percent(self):
+        return int(self.processed * 100 / self.total) if self.total else 100
+
+    @property
+    def is_active(self):
+        return self.status in ('Queued', 'Running')
+
+    @property
+    def is_stale(self):
+        minutes = getattr(settings, 'BATCH_FINALIZE_STALE_MINUTES', 15)
+        return self.updated_at < timezone.now() - timedelta(minutes=minutes)
+
+    @property
+    def can_restart(self):
+        return self.status == 'Failed' or (self.status == 'Running' and self.is_stale)
+
+    def __str__(self):
+        return f"Batch finalize {self.id} ({self.status})"
+
+
+class SalesRollup(models.Model):
+    """Monthly sales totals per location, buyer and item (item is empty for transport charges).
+
+    Rebuilt a month at a time from the invoices by ``analytics.refresh_rollups``;
+    invoice changes only mark their months in RollupDirtyMonth.
+    """
+    month = models.DateField(help_text="First day of the month")
+    location = models.ForeignKey(StoreLocation, on_delete=models.CASCADE)
+    buyer = models.ForeignKey(Buyer, on_delete=models.CASCADE, null=True, blank=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True)
+    quantity = models.IntegerField(default=0)
+    taxable_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    tax_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        indexes = [models.Index(fields=['month'], name='sales_rollup_month_idx')]
+
+    def __str__(self):
+        return f"Rollup {self.month:%Y-%m} location {self.location_id} item {self.item_id}"
+
+class RollupDirtyMonth(models.Model):
+    """A month whose SalesRollup rows are out of date."""
+    month = models.DateField(unique=True)
+    marked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}"
+
+
+class DeletedRow(models.Model):
+    """Tombstone of a hard-deleted invoice or master data row (written by signals.py).
+
+    Soft deletes show up in export_snapshot deltas through updated_at; purged rows
+    leave nothing behind, so their ids are kept here and exported as ``*_deleted``.
+    """
+    model = models.CharField(max_length=50, help_text="Model name, e.g. salesinvoice")
+    row_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'deleted_at'])]
 
     def __str__(self):
-        return f"Upload {self.id} at {self.uploaded_at}"
\ No newline at end of file
+        return f"{self.model} #{self.row_id} deleted {self.deleted_at}"
@@ -8,7 +8,7 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import os
 from io import BytesIO
-from decimal import Decimal
+from .invoice_render import build_invoice_render, prefetch_lines
 
 # Register Font for INR Symbol if available
 # User requested fallback to Rs. if issues persist.
@@ -126,7 +126,12 @@ def create_footer_with_signature(company, notes=""):
     ]))
     return t_foot
 
-def generate_invoice_pdf(invoice, company_input):
+def generate_invoice_pdf(invoice, company_input, render=None):
+    """Builds the tax invoice PDF. Without a prebuilt ``render`` the totals are recalculated first."""
+    if render is None:
+        prefetch_lines(invoice)
+        invoice.calculate_total()
+        render = build_invoice_render(invoice, company_input)
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=10*mm, rightMargin=10*mm, topMargin=10*mm, bottomMargin=10*mm)
     elements = []
@@ -215,60 +220,40 @@ def generate_invoice_pdf(invoice, company_input):
     item_header = ['Sl No.', 'Description of Goods', 'HSN/SAC', 'Quantity', 'Rate', 'per', 'Amount']
     item_data = [item_header]
     
-    total_qty = 0
-    invoice.calculate_total()
-    
-    for idx, item in enumerate(invoice.invoiceitem_set.all(), 1):
-        total_qty += item.quantity
+    for line in render.lines:
         item_data.append([
-            str(idx),
-            Paragraph(f"<b>{item.item.name}</b><br/>{item.description or item.item.description or ''}", style_normal),
-            item.item.hsn_sac,
-            f"{item.quantity} Nos",
-            f"Rs. {item.price}", # Snapshot price
-            item.item.unit or "Nos", # Use actual unit from Item master
-            f"Rs. {item.quantity * item.price}" # Snapshot price
+            str(line.number),
+            Paragraph(f"<b>{line.name}</b><br/>{line.description}", style_normal),
+            line.hsn,
+            f"{line.quantity} Nos",
+            f"Rs. {line.price}", # Snapshot price
+            line.unit, # Use actual unit from Item master
+            f"Rs. {line.taxable}"
         ])
     
-    taxable_value = sum(i.quantity * i.price for i in invoice.invoiceitem_set.all())
-    
-    # We can't display a single rate if items have different rates. 
-    # For the item table, we can show "See Tax Tbl" or the specific rate if passed.
-    # The current loop logic (not shown above, but in original code) iterates items.
-    
-    bill_details = f"Bill Details: New Ref {clean(invoice.tally_invoice_number or invoice.app_invoice_number)} 30 Days {invoice.total} Dr"
-    
-    # Calculate totals for summary (simplified for view)
-    # Calculate totals for summary
-    total_cgst = sum(i.quantity * i.price * (i.gst_rate / 2) for i in invoice.invoiceitem_set.all())
-    total_sgst = sum(i.quantity * i.price * (i.gst_rate / 2) for i in invoice.invoiceitem_set.all())
+    bill_details = f"Bill Details: New Ref {clean(invoice.tally_invoice_number or invoice.app_invoice_number)} 30 Days {render.total} Dr"
     
     # Transport Charges Injection
-    if hasattr(invoice, 'transportcharges') and invoice.transportcharges and invoice.transportcharges.charges > 0:
-        trp = invoice.transportcharges
-        trp_val = trp.charges
+    if render.transport:
+        trp = render.transport
         item_data.append([
-            str(len(invoice.invoiceitem_set.all()) + 1),
-            Paragraph(f"<b>Transport Charges</b><br/>{trp.description or ''}", style_normal),
-            '9967',
+            str(trp.number),
+            Paragraph(f"<b>Transport Charges</b><br/>{trp.description}", style_normal),
+            trp.hsn,
             "1",
-            f"Rs. {trp_val}",
+            f"Rs. {trp.charges}",
             "",
-            f"Rs. {trp_val}"
+            f"Rs. {trp.charges}"
         ])
         
-        # Add to Tax Calculation
-        total_cgst += trp_val * Decimal('0.09') # 9%
-        total_sgst += trp_val * Decimal('0.09') # 9%
-        taxable_value += trp_val
-        
     # We display the TOTAL CGST/SGST in the item table now, instead of per rate, 
     # because the detailed breakdown is in the Tax Analysis Matrix below.
-    item_data.append(['', Paragraph(f"<b>Output CGST (Total)</b>", style_normal), '', '', '', '', f"Rs. {total_cgst:.2f}"])
-    item_data.append(['', Paragraph(f"<b>Output SGST (Total)</b>", style_normal), '', '', '', '', f"Rs. {total_sgst:.2f}"])
+    item_data.append(['', Paragraph(f"<b>Output CGST (Total)</b>", style_normal), '', '', '', '', f"Rs. {render.cgst:.2f}"])
+    item_data.append(['', Paragraph(f"<b>Output SGST (Total)</b>", style_normal), '', '', '', '', f"Rs. {render.sgst:.2f}"])
+    if render.is_igst:
+        item_data.append(['', Paragraph(f"<b>Output IGST (Total)</b>", style_normal), '', '', '', '', f"Rs. {render.igst:.2f}"])
     item_data.append(['', Paragraph(f"<br/><b>Bill Details:</b><br/>{bill_details}", style_small), '', '', '', '', ''])
-
-    item_data.append(['', 'Total', '', f"{total_qty} Nos", '', '', f"{INR_SYMBOL} {invoice.total}"])
+    item_data.append(['', 'Total', '', f"{render.total_qty} Nos", '', '', f"{INR_SYMBOL} {render.total}"])
     
     col_widths = [10*mm, 78*mm, 20*mm, 25*mm, 20*mm, 10*mm, 25*mm]
     
@@ -286,7 +271,7 @@ def generate_invoice_pdf(invoice, company_input):
     ]))
     elements.append(t_items)
     
-    elements.append(Paragraph(f"Amount Chargeable (in words)<br/><b>{invoice.amount_in_words or ''}</b>", style_normal))
+    elements.append(Paragraph(f"Amount Chargeable (in words)<br/><b>{render.amount_in_words}</b>", style_normal))
     elements.append(Spacer(1, 2*mm))
 
     # --- Tax Analysis Matrix ---
@@ -295,36 +280,13 @@ def generate_invoice_pdf(invoice, company_input):
         ['', '', 'Rate', 'Amount', 'Rate', 'Amount', '']
     ]
     
-    hsn_map = {} 
-    for item in invoice.invoiceitem_set.all():
-        h = item.item.hsn_sac
-        val = item.quantity * item.price
-        rate = item.gst_rate
-        
-        # Key by HSN AND Rate to separate different tax rates for same HSN (rare but possible)
-        key = (h, rate)
-        hsn_map[key] = hsn_map.get(key, 0) + val
-        
-    # Add Transport to HSN Map
-    if hasattr(invoice, 'transportcharges') and invoice.transportcharges and invoice.transportcharges.charges > 0:
-        k = ('9967', Decimal('0.18'))
-        hsn_map[k] = hsn_map.get(k, 0) + invoice.transportcharges.charges
-        
-    total_tax_amt = 0
-    for (hsn, rate), val in hsn_map.items():
-        c_rate = rate / 2
-        s_rate = rate / 2
-        c_amt = val * c_rate
-        s_amt = val * s_rate
-        tot_t = c_amt + s_amt
-        total_tax_amt += tot_t
-        
+    for bucket in render.tax_buckets:
         tax_data.append([
-            hsn, f"Rs. {val:.2f}", f"{c_rate*100:.1f}%", f"Rs. {c_amt:.2f}", f"{s_rate*100:.1f}%", f"Rs. {s_amt:.2f}", f"Rs. {tot_t:.2f}"
+            bucket.hsn, f"Rs. {bucket.taxable:.2f}", f"{bucket.half_rate_percent:.1f}%", f"Rs. {bucket.cgst:.2f}", f"{bucket.half_rate_percent:.1f}%", f"Rs. {bucket.sgst:.2f}", f"Rs. {bucket.tax:.2f}"
         ])
     
     tax_data.append([
-        'Total', f"Rs. {taxable_value:.2f}", '', f"Rs. {total_cgst:.2f}", '', f"Rs. {total_sgst:.2f}", f"Rs. {total_tax_amt:.2f}"
+        'Total', f"Rs. {render.taxable:.2f}", '', f"Rs. {render.cgst:.2f}", '', f"Rs. {render.sgst:.2f}", f"Rs. {render.tax:.2f}"
     ])
     
     t_tax = Table(tax_data, colWidths=[25*mm, 35*mm, 15*mm, 30*mm, 15*mm, 30*mm, 40*mm])
@@ -341,7 +303,7 @@ def generate_invoice_pdf(invoice, company_input):
     ]))
     elements.append(t_tax)
     
-    elements.append(Paragraph(f"Tax Amount (in words) : <b>{invoice.tax_amount_in_words or ''}</b>", style_normal))
+    elements.append(Paragraph(f"Tax Amount (in words) : <b>{render.tax_amount_in_words}</b>", style_normal))
     elements.append(Spacer(1, 5*mm))
     
     elements.append(create_footer_with_signature(company, invoice.delivery_note))
@@ -352,7 +314,8 @@ def generate_invoice_pdf(invoice, company_input):
     buffer.seek(0)
     return buffer
 
-def generate_dc_pdf(invoice, dc, company_input):
+def generate_dc_pdf(invoice, dc, company_input, render=None):
+    render = render or build_invoice_render(invoice, company_input)
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=10*mm, rightMargin=10*mm, topMargin=10*mm, bottomMargin=10*mm)
     elements = []
@@ -415,18 +378,16 @@ def generate_dc_pdf(invoice, dc, company_input):
     # Items
     item_header = ['Sl No', 'Description of Goods', 'HSN/SAC', 'Quantity', 'Remarks']
     item_data = [item_header]
-    total_qty = 0
-    for idx, item in enumerate(invoice.invoiceitem_set.all(), 1):
-        total_qty += item.quantity
+    for line in render.lines:
         item_data.append([
-            str(idx),
-            Paragraph(f"<b>{item.item.name}</b><br/>{item.item.description or ''}", style_normal),
-            item.item.hsn_sac,
-            f"{item.quantity} Nos",
+            str(line.number),
+            Paragraph(f"<b>{line.name}</b><br/>{line.item_description}", style_normal),
+            line.hsn,
+            f"{line.quantity} Nos",
             ''
         ])
     
-    item_data.append(['', 'Total', '', f"{total_qty} Nos", ''])
+    item_data.append(['', 'Total', '', f"{render.total_qty} Nos", ''])
 
     t_items = Table(item_data, colWidths=[15*mm, 85*mm, 30*mm, 30*mm, 30*mm])
     t_items.setStyle(TableStyle([
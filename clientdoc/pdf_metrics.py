@@ -0,0 +1,87 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Stage names used by the confirmation bundle pipeline (finalize + bulk upload)
+BUNDLE_STAGES = [
+    'render_invoice',
+    'render_dc',
+    'render_transport',
+    'validate_uploads',
+    'render_images',
+    'merge',
+    'write',
+]
+
+
+def source_size(source):
+    """Returns the byte size of a BytesIO buffer or a file path (None if unknown)."""
+    if source is None:
+        return None
+    if hasattr(source, 'getbuffer'):
+        return source.getbuffer().nbytes
+    try:
+        return os.path.getsize(source)
+    except (OSError, TypeError):
+        return None
+
+
+class BundleMetrics:
+    """Collects timing, byte size and page count per stage while a PDF bundle is built."""
+
+    def __init__(self):
+        self.stages = []
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.bytes = None
+        self.pages = None
+
+    @contextmanager
+    def stage(self, name, source=None):
+        """Times a block. The yielded dict can be filled with 'bytes', 'pages' and 'source'."""
+        entry = {'stage': name, 'ms': 0.0, 'bytes': None, 'pages': None}
+        if source:
+            entry['source'] = source
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['ms'] = round((time.perf_counter() - start) * 1000, 2)
+            self.stages.append(entry)
+
+    def finish(self, output_bytes=None, pages=None):
+        """Stamps the total duration; may be called again after later stages (e.g. write)."""
+        self.total_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        if output_bytes is not None:
+            self.bytes = output_bytes
+        if pages is not None:
+            self.pages = pages
+
+    def totals_by_stage(self):
+        """Sums duration per stage name (stages like 'merge' run several times)."""
+        totals = {}
+        for entry in self.stages:
+            totals[entry['stage']] = round(totals.get(entry['stage'], 0) + entry['ms'], 2)
+        return totals
+
+    def as_dict(self):
+        return {
+            'total_ms': self.total_ms,
+            'bytes': self.bytes,
+            'pages': self.pages,
+            'by_stage': self.totals_by_stage(),
+            'stages': self.stages,
+        }
+
+    def summary(self):
+        """One line summary for upload logs, e.g. 'render_invoice 120ms, merge 8ms | total 300ms, 4 pages, 120.5 KB'."""
+        parts = [f"{name} {ms:.0f}ms" for name, ms in self.totals_by_stage().items()]
+        size = f"{self.bytes / 1024:.1f} KB" if self.bytes is not None else "? KB"
+        total = f"{self.total_ms:.0f}ms" if self.total_ms is not None else "?"
+        return f"{', '.join(parts)} | total {total}, {self.pages or 0} pages, {size}"
+
+    def log(self, label):
+        logger.info("PDF bundle metrics for %s: %s", label, self.summary(), extra={'bundle_metrics': self.as_dict()})
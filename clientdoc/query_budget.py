@@ -0,0 +1,37 @@
+"""Query count guard for views.
+
+``query_budget(n)`` counts the SQL statements a view runs (including template
+rendering, which happens inside ``render``) and logs a warning when there are
+more than ``n``. It is meant for pages whose query count should not grow with
+the number of rows shown, such as the paginated list pages.
+"""
+import functools
+import logging
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(limit):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            if counter.count > limit:
+                logger.warning("%s ran %d queries (budget %d) for %s",
+                               view.__name__, counter.count, limit, request.get_full_path())
+            return response
+        return wrapper
+    return decorator
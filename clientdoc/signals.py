@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Buyer, DeletedRow, InvoiceItem, Item, SalesInvoice, StoreLocation, TransportCharges, soft_delete_changed
+from .analytics import mark_dirty
+from .excel_templates import invalidate_templates
+from .sqlite_tuning import configure_connection
+
+connection_created.connect(configure_connection, dispatch_uid='clientdoc_sqlite_tuning')
+
+
+@receiver([post_save, post_delete, soft_delete_changed], sender=Buyer)
+@receiver([post_save, post_delete, soft_delete_changed], sender=Item)
+@receiver([post_save, post_delete, soft_delete_changed], sender=StoreLocation)
+def master_data_changed(sender, **kwargs):
+    """Invalidates the cached upload templates once the change is committed."""
+    transaction.on_commit(invalidate_templates)
+
+
+@receiver(post_delete, sender=SalesInvoice)
+@receiver(post_delete, sender=Buyer)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=StoreLocation)
+def record_tombstone(sender, instance, **kwargs):
+    """Keeps the id of a purged row for export_snapshot deltas (line items go with their invoice)."""
+    DeletedRow.objects.create(model=sender._meta.model_name, row_id=instance.pk)
+
+
+@receiver(post_save, sender=SalesInvoice)
+def invoice_saved(sender, instance, created, **kwargs):
+    """Marks the invoice's month (and the one it was loaded with) if a value the rollups use changed."""
+    loaded = getattr(instance, '_loaded_rollup_state', None)
+    current = instance.rollup_state()
+    if created or loaded is None or any(loaded.get(name) != value for name, value in current.items()):
+        mark_dirty(instance.date, (loaded or {}).get('date'))
+    # The next save of this instance compares against what is now stored
+    instance._loaded_rollup_state = current
+
+
+@receiver(post_delete, sender=SalesInvoice)
+def invoice_deleted(sender, instance, **kwargs):
+    mark_dirty(instance.date, getattr(instance, '_loaded_rollup_state', {}).get('date'))
+
+
+@receiver([post_save, post_delete], sender=InvoiceItem)
+def invoice_item_changed(sender, instance, **kwargs):
+    """Line quantities and items feed the rollups without necessarily changing the invoice total."""
+    try:
+        mark_dirty(instance.invoice.date)
+    except SalesInvoice.DoesNotExist:
+        pass
+
+
+@receiver([post_save, post_delete], sender=TransportCharges)
+def transport_changed(sender, instance, **kwargs):
+    try:
+        mark_dirty(instance.invoice.date)
+    except SalesInvoice.DoesNotExist:
+        pass
+
+
+@receiver(soft_delete_changed, sender=SalesInvoice)
+def invoices_trashed_or_restored(sender, pks, **kwargs):
+    mark_dirty(*SalesInvoice.all_objects.filter(pk__in=pks).values_list('date', flat=True))
+
+
+@receiver(soft_delete_changed, sender=TransportCharges)
+def transport_trashed_or_restored(sender, pks, **kwargs):
+    mark_dirty(*TransportCharges.all_objects.filter(pk__in=pks).values_list('invoice__date', flat=True))
+    # Trashed charges are not billed: recalculate the totals and tax lines of the (active) invoices
+    invoices = SalesInvoice.objects.filter(transportcharges__in=pks).select_related('location', 'buyer', 'transportcharges')
+    for invoice in invoices:
+        invoice.calculate_gst_totals()
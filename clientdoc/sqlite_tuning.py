@@ -0,0 +1,45 @@
+"""SQLite connection tuning applied through the connection_created signal."""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Order matters: journal_mode first, it needs a connection without an open transaction
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def get_pragmas():
+    """DEFAULT_PRAGMAS with settings.SQLITE_PRAGMAS on top (a None value switches a PRAGMA off)."""
+    return {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Runs the PRAGMA statements on a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            if value is None:
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # In-memory test databases cannot use WAL; skip them
+    if connection.is_in_memory_db():
+        return
+    try:
+        apply_pragmas(connection.connection, get_pragmas())
+    except Exception:
+        logger.exception("Could not apply SQLite PRAGMAs")
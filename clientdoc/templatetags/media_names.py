@@ -0,0 +1,11 @@
+import posixpath
+
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def basename(name):
+    """Last part of a storage name, e.g. 'confirmation_docs/po/2025/01/po.pdf' -> 'po.pdf'."""
+    return posixpath.basename(str(name or '').replace('\\', '/'))
@@ -1,3 +1,637 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .activity import buffered_activity_log, log_activity
+from .analytics import mark_dirty, month_start, refresh_rollups
+from .exports import invoice_rows, transport_line_rows
+from .gst_returns import b2b_rows, b2c_rows, document_rows, gstr1_sections, hsn_rows
+from .master_data import upsert_frame
+from . import trash
+from .models import (
+    ActivityLog, AttachmentBlob, BatchFinalizeJob, BulkInvoiceUpload, ConfirmationDocument, DeliveryChallan,
+    DocumentSequence, InvoiceItem, InvoiceTaxLine, Item, RollupDirtyMonth, SalesInvoice, SalesRollup, StoreLocation,
+    TransportCharges, prefetch_invoice_lines, soft_delete_changed,
+)
+from .sqlite_tuning import DEFAULT_PRAGMAS, get_pragmas
+from .management.commands import shard_media
+from .views import finalize_confirmation, process_invoice_upload
+
+
+def make_invoice(lines=((Decimal('100.00'), 2, Decimal('0.18')),), transport=None, location=None, **fields):
+    """An invoice with (price, quantity, gst_rate) lines and optional transport charges, totals calculated."""
+    location = location or StoreLocation.objects.get_or_create(name='Test Site', defaults={'address': 'Somewhere'})[0]
+    invoice = SalesInvoice.objects.create(location=location, **fields)
+    for number, (price, quantity, gst_rate) in enumerate(lines):
+        item, _ = Item.objects.get_or_create(name=f'Item {number}', defaults={'price': price, 'hsn_sac': f'8443{number:02d}'})
+        InvoiceItem.objects.create(invoice=invoice, item=item, price=price, quantity=quantity,
+                                   quantity_shipped=quantity, quantity_billed=quantity, gst_rate=gst_rate)
+    if transport is not None:
+        TransportCharges.objects.create(invoice=invoice, charges=transport)
+    invoice.calculate_gst_totals()
+    return invoice
+
+
+class TempMediaMixin:
+    """Runs each test against its own empty MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def media_file(self, name, age_hours=0, content=b'data'):
+        """Writes a file below MEDIA_ROOT, its mtime ``age_hours`` in the past; returns its path."""
+        path = os.path.join(self.media_root, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if age_hours:
+            stamp = time.time() - age_hours * 3600
+            os.utime(path, (stamp, stamp))
+        return path
+
+
+class ActivityLogBufferTests(TestCase):
+    def test_entries_of_rolled_back_transaction_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with buffered_activity_log():
+                log_activity("Kept")
+                try:
+                    with transaction.atomic():
+                        log_activity("Dropped")
+                        raise ValueError
+                except ValueError:
+                    pass
+
+        self.assertEqual(list(ActivityLog.objects.values_list('action', flat=True)), ["Kept"])
+
+    def test_entries_are_written_in_one_batch_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with buffered_activity_log():
+                with transaction.atomic():
+                    log_activity("First")
+                    log_activity("Second")
+                self.assertFalse(ActivityLog.objects.exists())
+
+        self.assertEqual(sorted(ActivityLog.objects.values_list('action', flat=True)), ["First", "Second"])
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 5000, 'mmap_size': None})
+    def test_settings_override_the_defaults(self):
+        pragmas = get_pragmas()
+        self.assertEqual(pragmas['busy_timeout'], 5000)
+        self.assertIsNone(pragmas['mmap_size'])
+        self.assertEqual(pragmas['synchronous'], DEFAULT_PRAGMAS['synchronous'])
+        # journal_mode must stay first
+        self.assertEqual(next(iter(pragmas)), 'journal_mode')
+
+
+class TrashedTransportTests(TestCase):
+    def test_trashed_transport_charges_are_not_billed_or_exported(self):
+        invoice = make_invoice(transport=Decimal('50.00'))
+        self.assertEqual(invoice.total, Decimal('295.00'))  # 200 + 50, plus 18%
+        self.assertEqual(len(list(transport_line_rows())), 1)
+
+        invoice.transportcharges.delete()
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total, Decimal('236.00'))
+        self.assertFalse(invoice.tax_lines.filter(hsn='9967').exists())
+        self.assertEqual(list(transport_line_rows()), [])
+        self.assertIsNone(next(invoice_rows())[13])
+
+
+def invoice_sheet(rows, gen_pdf=None):
+    """An invoice upload sheet; each row is (location, item, qty, tally number)."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['header'] * 38)
+    for location, item, qty, tally_no in rows:
+        row = [None] * 38
+        row[1], row[2], row[4], row[11], row[12], row[13] = location, item, qty, 'Yes', gen_pdf, tally_no
+        ws.append(row)
+    out = BytesIO()
+    wb.save(out)
+    return SimpleUploadedFile('invoices.xlsx', out.getvalue())
+
+
+@override_settings(BULK_UPLOAD_CHUNK_SIZE=1, ROLLUP_REFRESH_DELAY=None)
+class ChunkedUploadResumeTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        StoreLocation.objects.create(name='Test Site', address='Somewhere')
+        Item.objects.create(name='Toner', price=Decimal('10.00'))
+        self.upload = BulkInvoiceUpload.objects.create(file=invoice_sheet([
+            ('Test Site', 'Toner', 1, 'T-1'),
+            ('Test Site', 'Toner', 2, 'T-2'),
+            ('Test Site', None, None, 'T-X'),  # missing data
+            ('Test Site', 'Toner', 3, 'T-3'),
+        ]), log='')
+
+    def interrupted_run(self):
+        # The process dies while preparing the second chunk, after the first one committed
+        with mock.patch('clientdoc.views.import_attachments', side_effect=[{}, RuntimeError('killed')]):
+            with self.assertRaises(RuntimeError):
+                process_invoice_upload(self.upload)
+        self.upload.refresh_from_db()
+
+    def test_processing_upload_is_resumable_only_once_stale(self):
+        self.interrupted_run()
+        self.assertEqual((self.upload.status, self.upload.checkpoint, self.upload.total_groups), ('Processing', 1, 3))
+        self.assertFalse(self.upload.can_resume)
+
+        BulkInvoiceUpload.objects.filter(pk=self.upload.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.upload.refresh_from_db()
+        self.assertTrue(self.upload.can_resume)
+
+    def test_resume_reports_counts_of_the_whole_upload(self):
+        self.interrupted_run()
+        self.assertEqual((self.upload.created_count, self.upload.error_count), (1, 1))
+
+        self.upload.status = 'Failed'
+        self.assertTrue(self.upload.can_resume)
+        process_invoice_upload(self.upload)
+
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, 'Processed')
+        self.assertFalse(self.upload.can_resume)
+        self.assertTrue(self.upload.log.endswith("Summary: 3 created, 0 updated, 1 errors"))
+        self.assertEqual(SalesInvoice.objects.count(), 3)
+        # Rows of the first chunk are not recorded twice
+        self.assertEqual(self.upload.rows.filter(outcome='created').count(), 3)
+        self.assertEqual(self.upload.rows.filter(outcome='error').count(), 1)
+
+    def test_bundles_of_a_committed_chunk_are_built_on_resume(self):
+        upload = BulkInvoiceUpload.objects.create(file=invoice_sheet([('Test Site', 'Toner', 1, 'T-8')], gen_pdf='Yes'), log='')
+        # The process dies while rendering, after the chunk and its checkpoint committed
+        with mock.patch('clientdoc.views.build_confirmation_bundle', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                process_invoice_upload(upload)
+        upload.refresh_from_db()
+        invoice = SalesInvoice.objects.get(tally_invoice_number='T-8')
+        self.assertEqual((upload.checkpoint, upload.total_groups), (1, 1))
+        self.assertEqual(upload.pending_pdfs, [[invoice.id, 2, 'T-8']])
+
+        upload.status = 'Failed'
+        self.assertTrue(upload.can_resume)
+        with mock.patch('clientdoc.views.build_confirmation_bundle', return_value=b'%PDF-1.4 bundle'):
+            process_invoice_upload(upload)
+
+        upload.refresh_from_db()
+        invoice.refresh_from_db()
+        self.assertEqual((upload.status, upload.pending_pdfs), ('Processed', []))
+        self.assertEqual(invoice.status, 'FIN')
+        self.assertTrue(upload.rows.filter(outcome='info', invoice=invoice).exists())
+        self.assertTrue(upload.log.endswith("Summary: 1 created, 0 updated, 0 errors"))
+
+    @mock.patch('clientdoc.views.build_confirmation_bundle', return_value=b'%PDF-1.4 bundle')
+    def test_reuploaded_bundle_replaces_its_file(self, build):
+        for _ in range(2):
+            upload = BulkInvoiceUpload.objects.create(file=invoice_sheet([('Test Site', 'Toner', 1, 'T-9')], gen_pdf='Yes'), log='')
+            with self.captureOnCommitCallbacks(execute=True):
+                process_invoice_upload(upload)
+
+        conf = ConfirmationDocument.objects.get(invoice__tally_invoice_number='T-9')
+        upload_to = ConfirmationDocument._meta.get_field('combined_pdf').upload_to
+        self.assertEqual(conf.combined_pdf.name, upload_to(conf, 'confirmation_invoice_T-9.pdf'))
+        self.assertEqual(conf.invoice.status, 'FIN')
+        self.assertEqual(ActivityLog.objects.filter(action="Finalize Invoice").count(), 2)
+        folder = os.path.dirname(conf.combined_pdf.path)
+        self.assertEqual(os.listdir(folder), ['confirmation_invoice_T-9.pdf'])
+
+    @mock.patch('clientdoc.views.build_confirmation_bundle', return_value=b'%PDF-1.4 bundle')
+    def test_renumbered_bundle_removes_the_old_file_after_commit(self, build):
+        invoice = make_invoice(tally_invoice_number='T-1')
+        conf = ConfirmationDocument.objects.create(invoice=invoice)
+        old_path = finalize_confirmation(invoice, conf, None)
+
+        invoice.tally_invoice_number = 'T-2'
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            finalize_confirmation(invoice, conf, None)
+            raise RuntimeError
+        # Rolled back: the stored row still names the old bundle, which must still be there
+        conf.refresh_from_db()
+        self.assertEqual(conf.combined_pdf.path, old_path)
+        self.assertTrue(os.path.exists(old_path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new_path = finalize_confirmation(invoice, conf, None)
+            self.assertTrue(os.path.exists(old_path))
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(new_path))
+        self.assertEqual(conf.combined_pdf.path, new_path)
+
+
+class Gstr1Tests(TestCase):
+    def test_invoices_without_stored_tax_lines_are_computed(self):
+        make_invoice(customer_gstin='29ABCDE1234F1Z5')
+        make_invoice(transport=Decimal('50.00'))
+        stored = (list(b2b_rows()), list(b2c_rows()), list(hsn_rows()))
+
+        # Lines written by neither calculate_gst_totals nor the backfill
+        make_invoice(customer_gstin='29ABCDE1234F1Z5').tax_lines.all().delete()
+        second = make_invoice(transport=Decimal('50.00'))
+        second.tax_lines.all().delete()
+
+        with self.assertLogs('clientdoc.gst_returns', 'WARNING') as logs:
+            b2b, b2c, hsn, _ = [list(section.rows) for section in gstr1_sections()]
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("2 invoices have no stored tax lines", logs.output[0])
+
+        self.assertEqual(len(b2b), 2)
+        self.assertEqual(b2b[0][7:], b2b[1][7:])
+        self.assertEqual(len(b2c), 1)
+        # Two invoices at 18% (items and transport), summed as the stored ones
+        self.assertEqual(b2c[0][3], 2)
+        self.assertEqual(b2c[0][4:], [value * 2 for value in stored[1][0][4:]])
+        hsn = {row[0]: row for row in hsn}
+        self.assertEqual(hsn['844300'][5], stored[2][0][5] * 2)
+        self.assertEqual(hsn['9967'][5], Decimal('100.00'))
+
+    def test_hsn_quantity_is_the_billed_quantity(self):
+        invoice = make_invoice()
+        invoice.invoiceitem_set.update(quantity=5, quantity_shipped=5, quantity_billed=3)
+        invoice.calculate_gst_totals()
+
+        row = next(hsn_rows())
+        self.assertEqual(row[2], 3)
+        self.assertEqual(row[5], Decimal('300.00'))
+
+    def test_document_range_is_numeric(self):
+        for number in ('Tsol-99998', 'Tsol-99999', 'Tsol-100000'):
+            make_invoice(app_invoice_number=number, tally_invoice_number=number.replace('Tsol', 'TS'))
+        SalesInvoice.objects.get(app_invoice_number='Tsol-99999').delete()
+
+        app, tally = list(document_rows())
+        self.assertEqual(app[2:], ['Tsol-99998', 'Tsol-100000', 3, 1, 2])
+        self.assertEqual(tally[2:4], ['TS-99998', 'TS-100000'])
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.invoice = make_invoice()
+        refresh_rollups()
+
+    def test_only_changes_the_rollups_use_mark_the_month(self):
+        invoice = SalesInvoice.objects.get(pk=self.invoice.pk)
+        invoice.remark = "Call before delivery"
+        invoice.save()
+        invoice.status = 'FIN'
+        invoice.save(update_fields=['status'])
+        self.assertFalse(RollupDirtyMonth.objects.exists())
+
+        invoice.invoiceitem_set.update(quantity_billed=3)
+        invoice.calculate_gst_totals()
+        self.assertEqual(list(RollupDirtyMonth.objects.values_list('month', flat=True)), [month_start(invoice.date)])
+
+    def test_quantity_only_line_edit_marks_the_month(self):
+        line = InvoiceItem.objects.get(invoice=self.invoice)
+        line.quantity = 5  # delivered more than billed: total unchanged
+        line.save()
+        self.invoice.calculate_gst_totals()
+        self.assertEqual(list(RollupDirtyMonth.objects.values_list('month', flat=True)), [month_start(self.invoice.date)])
+
+        refresh_rollups()
+        self.assertEqual(SalesRollup.objects.get(item__isnull=False).quantity, 5)
+
+    def test_moving_an_invoice_marks_both_months(self):
+        invoice = SalesInvoice.objects.get(pk=self.invoice.pk)
+        old_month = month_start(invoice.date)
+        invoice.date = invoice.date - timedelta(days=62)
+        invoice.save()
+        self.assertEqual(set(RollupDirtyMonth.objects.values_list('month', flat=True)), {old_month, month_start(invoice.date)})
+
+    def test_months_are_queued_once_and_refreshed_after_commit(self):
+        with mock.patch('clientdoc.analytics.schedule_refresh') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertNumQueries(2):
+                    mark_dirty(self.invoice.date)
+                with self.assertNumQueries(1):
+                    mark_dirty(self.invoice.date)
+                schedule.assert_not_called()
+        self.assertTrue(schedule.called)
+
+    def test_analytics_page_does_not_refresh(self):
+        invoice = make_invoice(lines=((Decimal('10.00'), 1, Decimal('0.18')),))
+        response = self.client.get(reverse('clientdoc:sales_analytics'))
+
+        self.assertEqual(response.context['pending_months'], 1)
+        self.assertTrue(RollupDirtyMonth.objects.filter(month=month_start(invoice.date)).exists())
+        self.assertEqual(SalesRollup.objects.get().taxable_value, Decimal('200.00'))
+
+
+class DocumentSequenceTests(TestCase):
+    def test_reserve_hands_out_consecutive_ranges(self):
+        self.assertEqual(DocumentSequence.reserve('test', seed=lambda: 99998), 99999)
+        self.assertEqual(DocumentSequence.reserve('test', count=2, seed=lambda: 0), 100000)
+        self.assertEqual(DocumentSequence.reserve('test'), 100002)
+
+    def test_app_numbers_continue_past_99999(self):
+        make_invoice(app_invoice_number='Tsol-99999')
+        make_invoice(app_invoice_number='Tsol-100000')
+        make_invoice(app_invoice_number='Tsol-00010')
+
+        self.assertEqual(make_invoice().app_invoice_number, 'Tsol-100001')
+        self.assertEqual(make_invoice().app_invoice_number, 'Tsol-100002')
+
+
+class MasterDataUpsertTests(TestCase):
+    def frame(self, price='10.50'):
+        return pd.DataFrame({'name': ['Toner', 'Drum', 'Toner '], 'price': ['9', price, '11'], 'unit': ['Nos', None, 'Box']})
+
+    def test_unchanged_rows_are_not_written(self):
+        result = upsert_frame(Item, self.frame())
+        self.assertEqual((result.created, result.updated, result.unchanged), (2, 0, 0))
+        # The first Toner row is replaced by the last one
+        self.assertEqual([row[2] for row in result.rows], ['skipped', 'created', 'created'])
+        toner = Item.objects.get(name='Toner')
+        self.assertEqual((toner.price, toner.unit), (Decimal('11.00'), 'Box'))
+
+        stamp = Item.objects.get(name='Drum').updated_at
+        with self.assertNumQueries(1):  # the name lookup only
+            result = upsert_frame(Item, self.frame())
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 0, 2))
+
+        result = upsert_frame(Item, self.frame(price='12'))
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 1, 1))
+        drum = Item.objects.get(name='Drum')
+        self.assertEqual(drum.price, Decimal('12.00'))
+        self.assertGreater(drum.updated_at, stamp)
+
+    def test_trashed_row_is_restored(self):
+        upsert_frame(Item, self.frame())
+        Item.objects.get(name='Drum').delete()
+
+        result = upsert_frame(Item, self.frame())
+        self.assertEqual((result.updated, result.unchanged), (1, 1))
+        self.assertTrue(Item.objects.filter(name='Drum').exists())
+
+
+class SampleDataTests(TestCase):
+    def test_generated_invoices_have_totals_tax_lines_and_dirty_months(self):
+        call_command('generate_sample_data', invoices=5, lines=3, locations=3, items=5, buyers=2, categories=1,
+                     stdout=StringIO())
+
+        invoices = SalesInvoice.objects.filter(tally_invoice_number__startswith='SYN-')
+        self.assertEqual(invoices.count(), 5)
+        self.assertFalse(invoices.filter(tax_lines__isnull=True).exists())
+        self.assertTrue(RollupDirtyMonth.objects.exists())
+        for invoice in invoices:
+            stored = (invoice.total, sorted(invoice.tax_lines.values_list('hsn', 'gst_rate', 'taxable_value', 'cgst', 'igst')))
+            invoice.calculate_gst_totals()
+            self.assertEqual(
+                (invoice.total, sorted(invoice.tax_lines.values_list('hsn', 'gst_rate', 'taxable_value', 'cgst', 'igst'))),
+                stored,
+            )
+
+
+class SoftDeleteCascadeTests(TestCase):
+    def setUp(self):
+        self.changes = []
+
+        def record(sender, pks, is_deleted, **kwargs):
+            self.changes.append((sender, list(pks), is_deleted))
+        soft_delete_changed.connect(record)
+        self.addCleanup(soft_delete_changed.disconnect, record)
+
+    def test_trash_restore_and_purge_an_invoice(self):
+        invoice = make_invoice(transport=Decimal('50.00'))
+        dc = DeliveryChallan.objects.create(invoice=invoice)
+        # Trashed on its own before the invoice, so it stays in the trash on restore
+        ConfirmationDocument.objects.create(invoice=invoice).delete()
+        self.changes.clear()
+        prefetch_invoice_lines([invoice])
+        self.assertFalse(invoice.transportcharges.is_deleted)
+
+        invoice.delete()
+        self.assertEqual(self.changes, [
+            (SalesInvoice, [invoice.pk], True),
+            (DeliveryChallan, [dc.pk], True),
+            (TransportCharges, [invoice.transportcharges.pk], True),
+        ])
+        # Cached before the cascade, read again after it
+        self.assertTrue(invoice.transportcharges.is_deleted)
+        self.assertFalse(hasattr(invoice, '_prefetched_objects_cache'))
+        self.assertFalse(SalesInvoice.objects.exists())
+        self.assertFalse(TransportCharges.objects.exists())
+        self.assertEqual(SalesInvoice.objects.trash().get().deleted_at, DeliveryChallan.all_objects.get().deleted_at)
+
+        self.changes.clear()
+        invoice.restore()
+        self.assertEqual(sorted((sender.__name__, is_deleted) for sender, _, is_deleted in self.changes),
+                         [('DeliveryChallan', False), ('SalesInvoice', False), ('TransportCharges', False)])
+        self.assertTrue(DeliveryChallan.objects.filter(pk=dc.pk).exists())
+        self.assertFalse(invoice.transportcharges.is_deleted)
+        self.assertFalse(ConfirmationDocument.objects.exists())
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total, Decimal('295.00'))
+        self.assertEqual(invoice.tax_lines.count(), 2)
+
+        invoice.delete()
+        self.assertEqual(trash.purge(SalesInvoice, [invoice.pk]), (1, 0))
+        for model in (SalesInvoice, DeliveryChallan, TransportCharges, ConfirmationDocument):
+            self.assertFalse(model.all_objects.exists(), model.__name__)
+        self.assertFalse(InvoiceItem.objects.exists())
+        self.assertFalse(InvoiceTaxLine.objects.exists())
+
+    def test_active_invoices_are_not_purged(self):
+        invoice = make_invoice()
+        self.assertEqual(trash.purge(SalesInvoice, [invoice.pk]), (0, 1))
+        self.assertTrue(SalesInvoice.objects.filter(pk=invoice.pk).exists())
+
+    def test_bulk_trashed_documents_show_in_the_trash_and_restore(self):
+        invoice = make_invoice()
+        dc = DeliveryChallan.objects.create(invoice=invoice)
+        self.client.post(reverse('clientdoc:bulk_delete', args=['dc']), {'dc_ids': [dc.pk]})
+        self.assertFalse(DeliveryChallan.objects.exists())
+
+        response = self.client.get(reverse('clientdoc:trash_list'), {'tab': 'dcs'})
+        self.assertEqual(response.context['model_name'], 'dc')
+        self.assertEqual([obj.pk for obj in response.context['page_obj']], [dc.pk])
+        self.assertIn(('dcs', 'Delivery Challans', 1), response.context['tabs'])
+
+        self.client.post(reverse('clientdoc:trash_bulk_action'),
+                         {'model': 'dc', 'ids': [dc.pk], 'action': 'restore', 'tab': 'dcs'})
+        self.assertTrue(DeliveryChallan.objects.filter(pk=dc.pk).exists())
+
+
+class BatchFinalizeRestartTests(TestCase):
+    def job(self, status, age_minutes=0):
+        job = BatchFinalizeJob.objects.create(status=status, invoice_ids=[1], total=1)
+        BatchFinalizeJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=age_minutes))
+        return job
+
+    def restart(self, job):
+        self.client.post(reverse('clientdoc:batch_finalize_restart', args=[job.pk]))
+        job.refresh_from_db()
+        return job
+
+    @mock.patch('clientdoc.views.start_batch_job')
+    def test_only_failed_or_stalled_jobs_restart(self, start):
+        self.assertEqual(self.restart(self.job('Completed', age_minutes=60)).status, 'Completed')
+        self.assertEqual(self.restart(self.job('Running')).status, 'Running')
+        start.assert_not_called()
+
+        stalled = self.job('Running', age_minutes=60)
+        self.assertTrue(self.restart(stalled).updated_at > timezone.now() - timedelta(minutes=1))
+        failed = self.restart(self.job('Failed'))
+        self.assertEqual(failed.status, 'Running')
+        self.assertEqual([c.args for c in start.call_args_list], [(stalled.pk,), (failed.pk,)])
+
+    @mock.patch('clientdoc.views.start_batch_job')
+    def test_a_job_claimed_elsewhere_is_not_started_again(self, start):
+        job = self.job('Failed')
+        stale_copy = BatchFinalizeJob.objects.get(pk=job.pk)
+        self.restart(job)
+        # A second process that loaded the job before the claim loses the conditional update
+        with mock.patch('clientdoc.views.get_object_or_404', return_value=stale_copy):
+            self.client.post(reverse('clientdoc:batch_finalize_restart', args=[job.pk]))
+        start.assert_called_once_with(job.pk)
+
+
+class ExportSnapshotTests(TestCase):
+    def test_purged_rows_are_listed_in_the_next_delta(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("export_snapshot needs pyarrow")
+
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+        kept, purged = make_invoice(), make_invoice()
+        call_command('export_snapshot', output_dir=output_dir, stdout=StringIO())
+
+        purged.delete()
+        self.assertEqual(trash.purge(SalesInvoice, [purged.pk]), (1, 0))
+        out = StringIO()
+        call_command('export_snapshot', output_dir=output_dir, stdout=out)
+
+        self.assertIn("invoices: 1 deleted", out.getvalue())
+        self.assertIn("items: 0 deleted", out.getvalue())
+        [name] = [n for n in os.listdir(os.path.join(output_dir, 'invoices')) if n.endswith('_deleted.parquet')]
+        table = pq.read_table(os.path.join(output_dir, 'invoices', name))
+        self.assertEqual(table.column_names, ['row_id', 'deleted_at'])
+        self.assertEqual(table.column('row_id').to_pylist(), [purged.pk])
+        self.assertTrue(SalesInvoice.objects.filter(pk=kept.pk).exists())
+
+
+class AttachmentBlobGcTests(TempMediaMixin, TestCase):
+    def blob(self, digest, age_hours):
+        name = f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+        self.media_file(name, age_hours)
+        return AttachmentBlob.objects.create(digest=digest, name=name, size=4,
+                                             created_at=timezone.now() - timedelta(hours=age_hours))
+
+    def test_only_old_unreferenced_blobs_are_deleted(self):
+        fresh = self.blob('a' * 64, age_hours=0)  # recorded by an import that has not linked it yet
+        old = self.blob('b' * 64, age_hours=48)
+        linked = self.blob('c' * 64, age_hours=48)
+        ConfirmationDocument.objects.create(invoice=make_invoice(), po_file=linked.name)
+
+        call_command('gc_attachment_blobs', stdout=StringIO())
+
+        self.assertEqual(set(AttachmentBlob.objects.values_list('pk', flat=True)), {fresh.pk, linked.pk})
+        for blob, exists in ((fresh, True), (old, False), (linked, True)):
+            self.assertEqual(os.path.exists(os.path.join(self.media_root, blob.name)), exists, blob.name)
+
+
+class GcMediaTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.referenced = 'confirmation_docs/po/2024/01/po.pdf'
+        ConfirmationDocument.objects.create(invoice=make_invoice(), po_file=self.referenced)
+        for name in (self.referenced, 'cache/invoice_template.xlsx', 'blobs/aa/bb/' + 'a' * 64 + '.pdf',
+                     'confirmation_docs/po/2024/01/stale.pdf', 'confirmations/ab/old_bundle.pdf'):
+            self.media_file(name, age_hours=48)
+        self.media_file('confirmation_docs/po/2024/02/just_uploaded.pdf')
+
+    def assertSurvivors(self):
+        for name in (self.referenced, 'cache/invoice_template.xlsx', 'blobs/aa/bb/' + 'a' * 64 + '.pdf',
+                     'confirmation_docs/po/2024/02/just_uploaded.pdf'):
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, name)), name)
+        for name in ('confirmation_docs/po/2024/01/stale.pdf', 'confirmations/ab/old_bundle.pdf'):
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, name)), name)
+
+    def test_unreferenced_old_files_are_deleted(self):
+        out = StringIO()
+        call_command('gc_media', stdout=out)
+        self.assertSurvivors()
+        self.assertIn("Deleted 2 unreferenced files", out.getvalue())
+        # Emptied shard folders go, the top-level upload folder stays
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'confirmations', 'ab')))
+        self.assertTrue(os.path.isdir(os.path.join(self.media_root, 'confirmations')))
+
+    def test_quarantine_keeps_relative_paths(self):
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine, ignore_errors=True)
+        call_command('gc_media', quarantine=quarantine, stdout=StringIO())
+        self.assertSurvivors()
+        for name in ('confirmation_docs/po/2024/01/stale.pdf', 'confirmations/ab/old_bundle.pdf'):
+            self.assertTrue(os.path.exists(os.path.join(quarantine, *name.split('/'))), name)
+
+    def test_dry_run_removes_nothing(self):
+        call_command('gc_media', dry_run=True, stdout=StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'confirmation_docs/po/2024/01/stale.pdf')))
+
+
+class ShardMediaTests(TempMediaMixin, TestCase):
+    upload_to = ConfirmationDocument._meta.get_field('po_file').upload_to
+
+    def confirmation(self, name):
+        return ConfirmationDocument.objects.create(invoice=make_invoice(), po_file=name)
+
+    def test_rows_sharing_a_file_move_to_one_copy(self):
+        old_path = self.media_file('confirmation_docs/po/shared.pdf')
+        first = self.confirmation('confirmation_docs/po/shared.pdf')
+        second = self.confirmation('confirmation_docs/po/shared.pdf')
+
+        call_command('shard_media', batch_size=1, stdout=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(self.upload_to.is_sharded(first.po_file.name))
+        self.assertEqual(first.po_file.name, second.po_file.name)
+        self.assertTrue(os.path.exists(first.po_file.path))
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_old_copy_stays_while_a_row_still_uses_it(self):
+        moved_path = self.media_file('confirmation_docs/po/a.pdf')
+        kept_path = self.media_file('confirmation_docs/po/b.pdf')
+        first, second = self.confirmation('confirmation_docs/po/a.pdf'), self.confirmation('confirmation_docs/po/b.pdf')
+        real_place = shard_media.place
+
+        def place(old_path, new_path):
+            # Meanwhile the already moved row is pointed at the old flat name again (e.g. a restore)
+            real_place(old_path, new_path)
+            if old_path == kept_path:
+                ConfirmationDocument.objects.filter(pk=first.pk).update(po_file='confirmation_docs/po/b.pdf')
+
+        with mock.patch.object(shard_media, 'place', side_effect=place):
+            call_command('shard_media', batch_size=1, stdout=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.po_file.name, 'confirmation_docs/po/b.pdf')
+        self.assertTrue(self.upload_to.is_sharded(second.po_file.name))
+        self.assertTrue(os.path.exists(kept_path))
+        self.assertTrue(os.path.exists(second.po_file.path))
+        self.assertFalse(os.path.exists(moved_path))
@@ -0,0 +1,98 @@
+"""Bulk restore and purge of soft-deleted rows.
+
+Restoring is ``SoftDeleteQuerySet.restore``, one UPDATE per model. Purging
+deletes in chunks, each in its own transaction, and removes the uploaded files of
+the purged confirmations once the chunk is committed (shared blobs are left to gc_attachment_blobs). Rows that are
+still referenced through a PROTECT foreign key (e.g. an item used on an invoice,
+trashed invoices included) are skipped rather than failing the whole purge.
+"""
+from django.db import transaction
+from django.db.models import PROTECT, Q
+
+from .attachments import delete_field_file
+from .models import (
+    Buyer, ConfirmationDocument, DeliveryChallan, Item, PackedImage, SalesInvoice, StoreLocation, TransportCharges,
+)
+
+# URL name -> model. Purge order: documents before their invoices, invoices before the master data they protect.
+TRASH_MODELS = {
+    'confirmation': ConfirmationDocument,
+    'dc': DeliveryChallan,
+    'transport': TransportCharges,
+    'invoice': SalesInvoice,
+    'buyer': Buyer,
+    'item': Item,
+    'location': StoreLocation,
+}
+CONFIRMATION_FILE_FIELDS = ('po_file', 'approval_email_file', 'uploaded_invoice', 'uploaded_dc', 'combined_pdf')
+PURGE_CHUNK_SIZE = 200
+
+
+def restore(model, ids):
+    """Takes the given rows (and their cascaded documents) out of the trash; returns how many were restored."""
+    return model.all_objects.filter(pk__in=ids).restore()
+
+
+def protected_filter(model):
+    """Q matching rows that a PROTECT foreign key still points at (so a delete would raise)."""
+    condition = Q()
+    for rel in model._meta.related_objects:
+        if rel.on_delete is PROTECT:
+            condition |= Q(**{f'{rel.name}__isnull': False})
+    return condition
+
+
+def purgeable(model, qs):
+    """Trashed rows of ``qs`` that can be deleted, as a list of ids."""
+    qs = qs.filter(is_deleted=True)
+    condition = protected_filter(model)
+    if condition:
+        qs = qs.exclude(condition)
+    return list(qs.order_by('pk').values_list('pk', flat=True).distinct())
+
+
+def _confirmation_files(confirmations):
+    files = []
+    for doc in confirmations.only(*CONFIRMATION_FILE_FIELDS):
+        files += [getattr(doc, name) for name in CONFIRMATION_FILE_FIELDS]
+    for image in PackedImage.objects.filter(confirmation__in=confirmations).only('image'):
+        files.append(image.image)
+    return [f for f in files if f]
+
+
+def media_files(model, ids):
+    """Uploaded files that go away with the given rows."""
+    if model is SalesInvoice:
+        return _confirmation_files(ConfirmationDocument.all_objects.filter(invoice_id__in=ids))
+    if model is ConfirmationDocument:
+        return _confirmation_files(ConfirmationDocument.all_objects.filter(pk__in=ids))
+    return []
+
+
+def _delete_files(files):
+    for field_file in files:
+        delete_field_file(field_file)
+
+
+def purge(model, ids, chunk_size=PURGE_CHUNK_SIZE):
+    """Permanently deletes the trashed rows among ``ids`` in chunks.
+
+    Returns (purged, skipped); skipped rows are still referenced and stay in the trash.
+    """
+    ids = list(ids)
+    deletable = purgeable(model, model.all_objects.filter(pk__in=ids))
+    purged = 0
+    for start in range(0, len(deletable), chunk_size):
+        chunk = deletable[start:start + chunk_size]
+        with transaction.atomic():
+            files = media_files(model, chunk)
+            # The cascade removes line items, tax lines and documents; post_delete marks rollup months
+            model.all_objects.filter(pk__in=chunk).delete()
+            transaction.on_commit(lambda files=files: _delete_files(files))
+        purged += len(chunk)
+    return purged, len(set(ids)) - purged
+
+
+def expired(model, cutoff):
+    """Ids of rows that have been in the trash since before ``cutoff`` and can be purged."""
+    return purgeable(model, model.all_objects.filter(deleted_at__lt=cutoff))
@@ -0,0 +1,34 @@
+"""Per-row results of bulk uploads, written in batches to BulkUploadRow."""
+from .models import BulkUploadRow
+
+FLUSH_BATCH_SIZE = 1000
+
+
+class UploadRowRecorder:
+    """Buffers BulkUploadRow entries for an upload and writes them with bulk_create."""
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.entries = []
+
+    def add(self, row, outcome, message, group_key='', invoice=None):
+        self.entries.append(BulkUploadRow(
+            upload=self.upload, row_number=row, group_key=(group_key or '')[:100],
+            outcome=outcome, message=message, invoice=invoice,
+        ))
+
+    def add_rows(self, rows, outcome, message, group_key='', invoice=None):
+        """Records the same outcome for every row of an invoice group."""
+        for row in rows:
+            self.add(row, outcome, message, group_key, invoice)
+
+    def mark(self):
+        return len(self.entries)
+
+    def rollback_to(self, mark):
+        """Drops entries recorded after ``mark`` (their savepoint was rolled back)."""
+        del self.entries[mark:]
+
+    def flush(self):
+        BulkUploadRow.objects.bulk_create(self.entries, batch_size=FLUSH_BATCH_SIZE)
+        self.entries = []
@@ -16,6 +16,10 @@ urlpatterns = [
     path('confirmation-docs/', views.confirmation_list, name='confirmation_list'),
     path('bulk-upload/', views.bulk_upload_page, name='bulk_upload_page'),
     path('bulk-upload/sample/', views.download_sample_excel, name='download_sample_excel'),
+    path('reports/gstr1/', views.gstr1_report, name='gstr1_report'),
+    path('reports/sales/', views.sales_analytics, name='sales_analytics'),
+    path('bulk-upload/<int:pk>/', views.bulk_upload_detail, name='bulk_upload_detail'),
+    path('bulk-upload/<int:pk>/resume/', views.resume_bulk_upload, name='resume_bulk_upload'),
     
     path('locations/<int:pk>/edit/', views.edit_location, name='edit_location'),
     path('locations/<int:pk>/', views.store_location_detail, name='store_location_detail'),
@@ -39,6 +43,10 @@ urlpatterns = [
     path('transport/<int:invoice_id>/edit/', views.edit_transport, name='edit_transport'),
     path('confirmation/<int:invoice_id>/', views.create_confirmation, name='create_confirmation'),
     path('confirmation/<int:invoice_id>/finalize/', views.finalize_invoice_pdf, name='finalize_invoice_pdf'), # NEW
+    path('invoices/batch-finalize/', views.batch_finalize, name='batch_finalize'),
+    path('invoices/batch-finalize/<int:pk>/', views.batch_finalize_status, name='batch_finalize_status'),
+    path('invoices/batch-finalize/<int:pk>/restart/', views.batch_finalize_restart, name='batch_finalize_restart'),
+    path('invoices/batch-finalize/<int:pk>/download/', views.batch_finalize_download, name='batch_finalize_download'),
 
     # 6. CONFIRMATION DETAIL ACTIONS
     path('images/<int:image_id>/delete/', views.delete_packed_image, name='delete_packed_image'),
@@ -53,7 +61,9 @@ urlpatterns = [
 
     # 8. TRASH & RESTORE
     path('trash/', views.trash_list, name='trash_list'),
+    path('trash/bulk/', views.trash_bulk_action, name='trash_bulk_action'),
     path('delete/<str:model_name>/<int:pk>/', views.delete_object, name='delete_object'),
+    path('delete/<str:model_name>/bulk/', views.bulk_delete, name='bulk_delete'),
     path('restore/<str:model_name>/<int:pk>/', views.restore_object, name='restore_object'),
     path('hard-delete/<str:model_name>/<int:pk>/', views.hard_delete_object, name='hard_delete_object'),
     
@@ -2,18 +2,18 @@
 
 from django.template.loader import render_to_string
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
 from django.contrib import messages
 from django.db import transaction
 from django.core.paginator import Paginator
 from django.conf import settings
 from django.urls import reverse
-from .models import SalesInvoice, InvoiceItem, Item, StoreLocation, DeliveryChallan, TransportCharges, ConfirmationDocument, PackedImage, OurCompanyProfile, ActivityLog, Buyer, BulkInvoiceUpload, ItemCategory
+from .models import SalesInvoice, InvoiceItem, Item, StoreLocation, DeliveryChallan, TransportCharges, ConfirmationDocument, PackedImage, OurCompanyProfile, ActivityLog, Buyer, BulkInvoiceUpload, BulkUploadRow, ItemCategory, BatchFinalizeJob, RollupDirtyMonth
 import openpyxl
-from openpyxl.worksheet.datavalidation import DataValidation
 from .forms import InvoiceForm, DeliveryChallanForm, TransportChargesForm, ConfirmationDocumentForm, PackedImageFormSet, ItemForm, StoreLocationForm, BuyerForm, InvoiceItemFormSet
 import json
 from .pdf_generator import generate_invoice_pdf, generate_dc_pdf, generate_transport_pdf
+from .invoice_render import build_invoice_render, prefetch_lines
 import logging
 from io import BytesIO
 from reportlab.pdfgen import canvas
@@ -24,6 +24,22 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import mm
 from PyPDF2 import PdfMerger, PdfReader
+from .pdf_metrics import BundleMetrics, source_size
+from .activity import log_activity
+from .exports import (
+    XLSX_CONTENT_TYPE, MASTER_HEADERS, workbook_response, export_filename, parse_date_range,
+    filter_by_date, master_data_sheets, invoice_sheets
+)
+from .excel_templates import TEMPLATE_TYPES, get_template_path
+from . import analytics
+from .gst_returns import gstr1_sections, gstr1_workbook_response, gstr1_json_response
+from .invoice_sheet import parse_invoice_sheet, validate_invoice_sheet
+from .attachments import import_attachments, delete_field_file, delete_stored_file
+from .trash import TRASH_MODELS, restore as restore_rows, purge as purge_rows
+from .upload_log import UploadRowRecorder
+from .master_data import import_upload_sheet
+from .query_budget import query_budget
+from .batch_finalize import start_job as start_batch_job, is_running as batch_job_running
 import os
 
 logger = logging.getLogger(__name__)
@@ -82,6 +98,100 @@ def generate_packed_images_pdf(confirmation):
     buffer.seek(0)
     return buffer
 
+DEFAULT_FILE_ORDER = ['invoice', 'dc', 'transport', 'po', 'email']
+
+def _valid_upload_path(field_file, metrics):
+    """Returns the path of an uploaded PDF if PyPDF2 can read it, else None."""
+    if not field_file:
+        return None
+    with metrics.stage('validate_uploads', source=field_file.name) as stage:
+        try:
+            path = field_file.path
+            stage['pages'] = len(PdfReader(path).pages)
+            stage['bytes'] = source_size(path)
+            return path
+        except Exception as e:
+            stage['error'] = str(e)
+            return None
+
+def _append_to_bundle(merger, metrics, source, label):
+    with metrics.stage('merge', source=label) as stage:
+        pages_before = len(merger.pages)
+        merger.append(source)
+        stage['pages'] = len(merger.pages) - pages_before
+        stage['bytes'] = source_size(source)
+
+def build_confirmation_bundle(invoice, confirmation, company_profile, file_order=None, metrics=None):
+    """Renders and merges the confirmation bundle in the given order and returns the PDF bytes.
+
+    Packed images are always appended at the end. Per-stage timings, sizes and page
+    counts are recorded on ``metrics`` (a BundleMetrics instance).
+    """
+    metrics = metrics or BundleMetrics()
+    merger = PdfMerger()
+    output = BytesIO()
+    # Built with the generated invoice and reused for the DC
+    render_model = None
+    try:
+        for file_type in (file_order or DEFAULT_FILE_ORDER):
+            if file_type == 'invoice':
+                # Uploaded custom invoice wins, fall back to generated one if it is corrupt
+                path = _valid_upload_path(confirmation.uploaded_invoice, metrics)
+                if path:
+                    _append_to_bundle(merger, metrics, path, 'uploaded_invoice')
+                else:
+                    with metrics.stage('render_invoice') as stage:
+                        prefetch_lines(invoice)
+                        invoice.calculate_total()
+                        render_model = build_invoice_render(invoice, company_profile)
+                        buffer = generate_invoice_pdf(invoice, company_profile, render_model)
+                        stage['bytes'] = source_size(buffer)
+                    _append_to_bundle(merger, metrics, buffer, 'invoice')
+
+            elif file_type == 'dc':
+                if confirmation.uploaded_dc:
+                    path = _valid_upload_path(confirmation.uploaded_dc, metrics)
+                    if path:
+                        _append_to_bundle(merger, metrics, path, 'uploaded_dc')
+                elif hasattr(invoice, 'deliverychallan'):
+                    with metrics.stage('render_dc') as stage:
+                        buffer = generate_dc_pdf(invoice, invoice.deliverychallan, company_profile, render_model)
+                        stage['bytes'] = source_size(buffer)
+                    _append_to_bundle(merger, metrics, buffer, 'dc')
+
+            elif file_type == 'transport' and hasattr(invoice, 'transportcharges'):
+                with metrics.stage('render_transport') as stage:
+                    buffer = generate_transport_pdf(invoice, invoice.transportcharges, company_profile)
+                    stage['bytes'] = source_size(buffer)
+                _append_to_bundle(merger, metrics, buffer, 'transport')
+
+            elif file_type == 'po' and confirmation.po_file:
+                path = _valid_upload_path(confirmation.po_file, metrics)
+                if path:
+                    _append_to_bundle(merger, metrics, path, 'po')
+
+            elif file_type == 'email' and confirmation.approval_email_file:
+                path = _valid_upload_path(confirmation.approval_email_file, metrics)
+                if path:
+                    _append_to_bundle(merger, metrics, path, 'email')
+
+        # Always append images at the end
+        with metrics.stage('render_images') as stage:
+            images_pdf_buffer = generate_packed_images_pdf(confirmation)
+            stage['bytes'] = source_size(images_pdf_buffer)
+        if images_pdf_buffer:
+            _append_to_bundle(merger, metrics, images_pdf_buffer, 'images')
+
+        with metrics.stage('merge', source='output'):
+            merger.write(output)
+        page_count = len(merger.pages)
+    finally:
+        merger.close()
+
+    pdf_bytes = output.getvalue()
+    metrics.finish(len(pdf_bytes), page_count)
+    return pdf_bytes
+
 
 # --- 1. DASHBOARD & LIST VIEWS (FIX 3: Corrected List Views) ---
 
@@ -102,20 +212,91 @@ def dashboard(request):
     context['recent_logs'] = recent_logs
     return render(request, 'clientdoc/dashboard.html', context)
 
+def sales_analytics(request):
+    """Sales pivot over the monthly rollups: one dimension, one measure, optionally split by month.
+
+    Read only; the rollups are refreshed in the background after invoice changes.
+    """
+    first_month, last_month = analytics.month_range(request.GET.get('from'), request.GET.get('to'))
+    dimension = request.GET.get('dimension') if request.GET.get('dimension') in analytics.DIMENSIONS else 'location'
+    measure = request.GET.get('measure') if request.GET.get('measure') in analytics.MEASURES else 'taxable_value'
+    by_month = request.GET.get('by_month') == '1'
+    top = request.GET.get('top', '20')
+    top = int(top) if top.isdigit() else 20
+
+    df = analytics.sales_frame(first_month, last_month)
+    months, rows, grand_total = analytics.pivot(df, dimension, measure, by_month=by_month, top=top)
+
+    return render(request, 'clientdoc/sales_analytics.html', {
+        'title': 'Sales Analytics',
+        'months': months,
+        'rows': rows,
+        'grand_total': grand_total,
+        'dimensions': analytics.DIMENSIONS,
+        'measures': analytics.MEASURES,
+        'dimension': dimension,
+        'dimension_label': analytics.DIMENSIONS[dimension],
+        'measure': measure,
+        'by_month': by_month,
+        'top': top,
+        'from_month': first_month.strftime('%Y-%m'),
+        'to_month': last_month.strftime('%Y-%m'),
+        'is_quantity': measure == 'quantity',
+        'pending_months': RollupDirtyMonth.objects.count(),
+    })
+
 def item_detail(request, item_id):
     """Detail view for a single item."""
     item = get_object_or_404(Item, id=item_id)
     return render(request, 'clientdoc/item_detail.html', {'item': item})
 
-def log_activity(action, details=""):
-    ActivityLog.objects.create(action=action, details=details)
+# What each list template renders: related rows to join and the only columns to load.
+# Touching anything else in a template costs one query per row (query_budget logs it).
+LIST_QUERY_SPECS = {
+    SalesInvoice: {
+        'select_related': ['location'],
+        'only': ['id', 'date', 'app_invoice_number', 'tally_invoice_number', 'total', 'status', 'location__name'],
+    },
+    DeliveryChallan: {
+        'select_related': ['invoice__location'],
+        'only': ['id', 'date', 'notes',
+                 'invoice__id', 'invoice__app_invoice_number', 'invoice__tally_invoice_number', 'invoice__location__name'],
+    },
+    TransportCharges: {
+        'select_related': ['invoice__location'],
+        'only': ['id', 'date', 'charges', 'description',
+                 'invoice__id', 'invoice__app_invoice_number', 'invoice__tally_invoice_number', 'invoice__location__name'],
+    },
+    ConfirmationDocument: {
+        'select_related': ['invoice__location'],
+        'only': ['id', 'date', 'po_file', 'approval_email_file', 'combined_pdf',
+                 'invoice__id', 'invoice__app_invoice_number', 'invoice__tally_invoice_number', 'invoice__location__name'],
+    },
+    Item: {
+        'select_related': ['category'],
+        'only': ['id', 'name', 'article_code', 'hsn_sac', 'price', 'gst_rate', 'category__name'],
+    },
+    StoreLocation: {
+        'only': ['id', 'name', 'site_code', 'address', 'city', 'state', 'gstin'],
+    },
+    Buyer: {
+        'only': ['id', 'name', 'address', 'state', 'gstin'],
+    },
+}
+# The paginator count and the page itself, plus headroom for middleware
+LIST_QUERY_BUDGET = 4
 
 def get_filtered_queryset(model_class, request, search_fields):
     """Helper to filter and sort querysets."""
-    queryset = model_class.objects.all().select_related('invoice') if model_class != SalesInvoice and hasattr(model_class, 'invoice') else model_class.objects.all()
-    if model_class == SalesInvoice:
-        queryset = queryset.select_related('location')
-    elif hasattr(model_class, 'invoice'):
+    queryset = model_class.objects.all()
+    spec = LIST_QUERY_SPECS.get(model_class, {})
+    if spec.get('select_related'):
+        queryset = queryset.select_related(*spec['select_related'])
+    if spec.get('only'):
+        # select_related paths must be loaded too, only() would defer them otherwise
+        related = {path for name in spec.get('select_related', []) for path in _path_prefixes(name)}
+        queryset = queryset.only(*spec['only'], *related)
+    if model_class != SalesInvoice and hasattr(model_class, 'invoice'):
          queryset = queryset.filter(invoice__is_deleted=False)
         
     # Search
@@ -193,85 +374,135 @@ def get_filtered_queryset(model_class, request, search_fields):
         
     return queryset
 
+def _path_prefixes(path):
+    """'invoice__location' -> ['invoice', 'invoice__location']"""
+    parts = path.split('__')
+    return ['__'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+TRASH_TABS = {
+    'invoices': ('invoice', 'Invoices'),
+    'items': ('item', 'Items'),
+    'locations': ('location', 'Locations'),
+    'buyers': ('buyer', 'Buyers'),
+    'dcs': ('dc', 'Delivery Challans'),
+    'transport': ('transport', 'Transport'),
+    'confirmations': ('confirmation', 'Confirmations'),
+}
+# Tabs whose rows are documents of an invoice rather than standalone records
+DOCUMENT_TRASH_TABS = ('dcs', 'transport', 'confirmations')
+
 def trash_list(request):
-    """View to show deleted items."""
-    invoices = SalesInvoice.objects.trash().all()
-    locations = StoreLocation.objects.trash().all()
-    items = Item.objects.trash().all()
-    
+    """View to show deleted items, one paginated tab at a time."""
+    tab = request.GET.get('tab') if request.GET.get('tab') in TRASH_TABS else 'invoices'
+    model_name = TRASH_TABS[tab][0]
+    model = TRASH_MODELS[model_name]
+    rows = model.objects.trash().order_by('-deleted_at', '-pk')
+    if model is SalesInvoice:
+        rows = rows.select_related('location')
+    elif tab in DOCUMENT_TRASH_TABS:
+        rows = rows.select_related('invoice__location')
+
+    paginator = Paginator(rows, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    tabs = [
+        (key, label, TRASH_MODELS[name].objects.trash().count())
+        for key, (name, label) in TRASH_TABS.items()
+    ]
     return render(request, 'clientdoc/trash_list.html', {
-        'invoices': invoices,
-        'locations': locations,
-        'items': items,
+        'page_obj': page_obj,
+        'tab': tab,
+        'tabs': tabs,
+        'model_name': model_name,
+        'is_document': tab in DOCUMENT_TRASH_TABS,
         'title': 'Trash Bin'
     })
 
+def trash_bulk_action(request):
+    """Restores or permanently deletes the rows ticked on a trash page."""
+    if request.method != 'POST':
+        return redirect('clientdoc:trash_list')
+    model_name = request.POST.get('model')
+    model = TRASH_MODELS.get(model_name)
+    ids = [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+    back = f"{reverse('clientdoc:trash_list')}?tab={request.POST.get('tab', '')}&page={request.POST.get('page', '')}"
+    if not model or not ids:
+        messages.warning(request, 'Nothing selected.')
+        return redirect(back)
+
+    action = request.POST.get('action')
+    if action == 'restore':
+        restored = restore_rows(model, ids)
+        log_activity("Restore", f"Restored {restored} {model_name} rows")
+        messages.success(request, f'{restored} {model_name}(s) restored.')
+    elif action == 'purge':
+        purged, skipped = purge_rows(model, ids)
+        log_activity("Permanent Delete", f"Permanently deleted {purged} {model_name} rows")
+        messages.warning(request, f'{purged} {model_name}(s) permanently deleted.')
+        if skipped:
+            messages.error(request, f'{skipped} {model_name}(s) are still used by invoices and were kept.')
+    else:
+        messages.error(request, 'Unknown action.')
+    return redirect(back)
+
 def restore_object(request, model_name, pk):
     """Restores a soft-deleted object."""
-    model_map = {
-        'invoice': SalesInvoice,
-        'location': StoreLocation,
-        'item': Item,
-        'dc': DeliveryChallan,
-        'transport': TransportCharges,
-        'confirmation': ConfirmationDocument,
-        'buyer': Buyer
-    }
-    model = model_map.get(model_name)
+    model = TRASH_MODELS.get(model_name)
     if not model:
         messages.error(request, 'Invalid item type.')
         return redirect('clientdoc:trash_list')
         
-    obj = get_object_or_404(model.objects.trash(), pk=pk)
-    obj.restore()
+    get_object_or_404(model.objects.trash(), pk=pk)
+    restore_rows(model, [pk])
     log_activity("Restore", f"Restored {model_name} #{pk}")
     messages.success(request, f'{model_name.title()} restored successfully.')
     return redirect('clientdoc:trash_list')
 
 def hard_delete_object(request, model_name, pk):
     """Permanently deletes an object."""
-    model_map = {
-        'invoice': SalesInvoice,
-        'location': StoreLocation,
-        'item': Item,
-        'dc': DeliveryChallan,
-        'transport': TransportCharges,
-        'confirmation': ConfirmationDocument,
-        'buyer': Buyer
-    }
-    model = model_map.get(model_name)
+    model = TRASH_MODELS.get(model_name)
     if not model:
         messages.error(request, 'Invalid item type.')
         return redirect('clientdoc:trash_list')
         
-    obj = get_object_or_404(model.objects.trash(), pk=pk)
-    obj.hard_delete()
+    get_object_or_404(model.objects.trash(), pk=pk)
+    purged, _ = purge_rows(model, [pk])
+    if not purged:
+        messages.error(request, f'{model_name.title()} is still used by invoices and cannot be deleted permanently.')
+        return redirect('clientdoc:trash_list')
     log_activity("Permanent Delete", f"Permanently deleted {model_name} #{pk}")
     messages.warning(request, f'{model_name.title()} permanently deleted.')
     return redirect('clientdoc:trash_list')
 
 def delete_object(request, model_name, pk):
     """Soft deletes an object from list view."""
-    model_map = {
-        'invoice': SalesInvoice,
-        'location': StoreLocation,
-        'item': Item,
-        'dc': DeliveryChallan,
-        'transport': TransportCharges,
-        'confirmation': ConfirmationDocument,
-        'buyer': Buyer
-    }
-    model = model_map.get(model_name)
+    model = TRASH_MODELS.get(model_name)
     if not model:
         messages.error(request, 'Invalid item type.')
         return redirect('clientdoc:dashboard')
 
     obj = get_object_or_404(model, pk=pk)
-    obj.delete() # Soft delete
+    obj.delete() # Soft delete, an invoice takes its DC, transport and confirmation along
     log_activity("Delete", f"Moved {model_name} #{pk} to trash")
     messages.success(request, f'{model_name.title()} moved to trash.')
     return redirect(request.META.get('HTTP_REFERER', 'clientdoc:dashboard'))
 
+def bulk_delete(request, model_name):
+    """Moves the rows ticked on a list page (posted as <model_name>_ids) to the trash."""
+    model = TRASH_MODELS.get(model_name)
+    back = request.META.get('HTTP_REFERER', 'clientdoc:dashboard')
+    if request.method != 'POST' or not model:
+        return redirect(back)
+
+    ids = [int(i) for i in request.POST.getlist(f'{model_name}_ids') if i.isdigit()]
+    count = model.objects.filter(pk__in=ids).soft_delete()
+    if count:
+        log_activity("Delete", f"Moved {count} {model_name} rows to trash")
+        messages.success(request, f'{count} {model_name}(s) moved to trash.')
+    else:
+        messages.warning(request, 'Nothing selected.')
+    return redirect(back)
+
+@query_budget(LIST_QUERY_BUDGET)
 def invoice_list(request):
     search_fields = ['tally_invoice_number', 'app_invoice_number', 'location__name', 'date']
     invoices = get_filtered_queryset(SalesInvoice, request, search_fields)
@@ -286,6 +517,7 @@ def invoice_list(request):
         'list_type': 'inv'
     })
 
+@query_budget(LIST_QUERY_BUDGET)
 def dc_list(request):
     search_fields = ['invoice__tally_invoice_number', 'invoice__app_invoice_number', 'invoice__location__name', 'date']
     challans = get_filtered_queryset(DeliveryChallan, request, search_fields)
@@ -300,6 +532,7 @@ def dc_list(request):
         'list_type': 'dc'
     })
     
+@query_budget(LIST_QUERY_BUDGET)
 def transport_list(request):
     search_fields = ['invoice__tally_invoice_number', 'invoice__app_invoice_number', 'invoice__location__name', 'date', 'description']
     charges = get_filtered_queryset(TransportCharges, request, search_fields)
@@ -314,6 +547,7 @@ def transport_list(request):
         'list_type': 'trp'
     })
 
+@query_budget(LIST_QUERY_BUDGET)
 def confirmation_list(request):
     search_fields = ['invoice__tally_invoice_number', 'invoice__app_invoice_number', 'invoice__location__name', 'date']
     docs = get_filtered_queryset(ConfirmationDocument, request, search_fields)
@@ -332,6 +566,7 @@ def confirmation_list(request):
 
 # --- ITEM VIEWS ---
 
+@query_budget(LIST_QUERY_BUDGET)
 def item_list(request):
     search_fields = ['name', 'description']
     items = get_filtered_queryset(Item, request, search_fields)
@@ -383,6 +618,7 @@ def create_location(request):
         form = StoreLocationForm()
     return render(request, 'clientdoc/form.html', {'form': form, 'title': 'Create Store Location'})
 
+@query_budget(LIST_QUERY_BUDGET)
 def store_location_list(request):
     search_fields = ['name', 'address', 'city', 'gstin', 'site_code']
     locations = get_filtered_queryset(StoreLocation, request, search_fields)
@@ -519,7 +755,9 @@ def edit_invoice(request, invoice_id):
             
             for obj in formset.deleted_objects:
                 obj.delete()
-                
+
+            # Lines loaded before the formset saved would be stale
+            invoice.clear_related_cache()
             invoice.calculate_total()
             log_activity("Edit Invoice", f"Updated Invoice {invoice.tally_invoice_number or invoice.id} details")
             messages.success(request, f'Invoice details updated.')
@@ -652,14 +890,14 @@ def create_confirmation(request, invoice_id):
     # File deletion logic (kept short for brevity)
     if request.method == 'POST':
         if 'delete_po' in request.POST and confirmation.po_file:
-            confirmation.po_file.delete(save=False)
+            delete_field_file(confirmation.po_file)
             confirmation.po_file = None
             confirmation.save()
             messages.success(request, 'Purchase Order file removed.')
             return redirect('clientdoc:create_confirmation', invoice_id=invoice_id)
 
         if 'delete_email' in request.POST and confirmation.approval_email_file:
-            confirmation.approval_email_file.delete(save=False)
+            delete_field_file(confirmation.approval_email_file)
             confirmation.approval_email_file = None
             confirmation.save()
             messages.success(request, 'Approval Email file removed.')
@@ -725,6 +963,41 @@ def create_confirmation(request, invoice_id):
     return render(request, 'clientdoc/confirmation_checklist.html', context)
 
 
+def finalize_confirmation(invoice, confirmation, company_profile, file_order=None, metrics=None):
+    """Builds the bundle, stores it as the confirmation's combined PDF and marks the invoice finalized.
+
+    Shared by the finalize view, batch finalize jobs and bulk uploads. Returns the path of the written PDF.
+    """
+    metrics = metrics or BundleMetrics()
+    pdf_bytes = build_confirmation_bundle(invoice, confirmation, company_profile, file_order, metrics)
+
+    filename_suffix = invoice.tally_invoice_number or invoice.app_invoice_number or str(invoice.id)
+    filename = f"confirmation_invoice_{filename_suffix}.pdf"
+    name = ConfirmationDocument._meta.get_field('combined_pdf').upload_to(confirmation, filename)
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with metrics.stage('write') as stage:
+        with open(path, 'wb') as f:
+            f.write(pdf_bytes)
+        stage['bytes'] = len(pdf_bytes)
+    metrics.finish()
+    metrics.log(f"invoice {invoice.id}")
+
+    old_name = confirmation.combined_pdf.name
+    storage = confirmation.combined_pdf.storage
+    confirmation.combined_pdf.name = name
+    confirmation.bundle_metrics = metrics.as_dict()
+    confirmation.save()
+    if old_name and old_name != name:
+        # Renumbered invoice or a pre-sharding name: the old bundle goes once the new name is committed
+        transaction.on_commit(lambda: delete_stored_file(storage, old_name))
+
+    invoice.status = 'FIN'
+    invoice.save()
+    log_activity("Finalize Invoice", f"Finalized Invoice {invoice.tally_invoice_number or invoice.id}")
+    return path
+
 def finalize_invoice_pdf(request, invoice_id):
     """Generates the final PDF based on user selected order."""
     invoice = get_object_or_404(SalesInvoice, id=invoice_id)
@@ -738,78 +1011,8 @@ def finalize_invoice_pdf(request, invoice_id):
         file_order_str = request.POST.get('file_order', 'invoice,dc,transport,po,email') 
         file_order = file_order_str.split(',')
         
-        merger = PdfMerger()
-        
         try:
-            for file_type in file_order:
-                if file_type == 'invoice':
-                    # Check for Uploaded Custom Invoice first
-                    if confirmation.uploaded_invoice:
-                        try:
-                            PdfReader(confirmation.uploaded_invoice.path)
-                            merger.append(confirmation.uploaded_invoice.path)
-                        except Exception:
-                            # Fallback if corrupt? Or just fail. Fallback to generate.
-                            invoice.calculate_total()
-                            merger.append(generate_invoice_pdf(invoice, company_profile))
-                    else:
-                        invoice.calculate_total()
-                        merger.append(generate_invoice_pdf(invoice, company_profile))
-                
-                elif file_type == 'dc':
-                    if confirmation.uploaded_dc:
-                        try:
-                            PdfReader(confirmation.uploaded_dc.path)
-                            merger.append(confirmation.uploaded_dc.path)
-                        except Exception:
-                             pass
-                    elif hasattr(invoice, 'deliverychallan'):
-                         merger.append(generate_dc_pdf(invoice, invoice.deliverychallan, company_profile))
-                
-                elif file_type == 'transport' and hasattr(invoice, 'transportcharges'):
-                     merger.append(generate_transport_pdf(invoice, invoice.transportcharges, company_profile))
-                
-                elif file_type == 'po' and confirmation.po_file:
-                    try:
-                        PdfReader(confirmation.po_file.path)
-                        merger.append(confirmation.po_file.path)
-                    except Exception:
-                        pass # Skip invalid
-                
-                elif file_type == 'email' and confirmation.approval_email_file:
-                    try:
-                        PdfReader(confirmation.approval_email_file.path)
-                        merger.append(confirmation.approval_email_file.path)
-                    except Exception:
-                        pass
-
-            # Always append images at the end
-            images_pdf_buffer = generate_packed_images_pdf(confirmation)
-            if images_pdf_buffer:
-                merger.append(images_pdf_buffer)
-            
-            output = BytesIO()
-            merger.write(output)
-            merger.close()
-            output.seek(0)
-            
-            # Save logic ...
-            filename_suffix = invoice.tally_invoice_number or invoice.app_invoice_number or str(invoice.id)
-            filename = f"confirmation_invoice_{filename_suffix}.pdf"
-            
-            # Preview vs Save
-            path = os.path.join(settings.MEDIA_ROOT, 'confirmations', filename)
-            os.makedirs(os.path.dirname(path), exist_ok=True) 
-
-            with open(path, 'wb') as f:
-                f.write(output.getvalue())
-            
-            confirmation.combined_pdf.name = f'confirmations/{filename}'
-            confirmation.save()
-            
-            invoice.status = 'FIN'
-            invoice.save()
-            log_activity("Finalize Invoice", f"Finalized Invoice {invoice.tally_invoice_number or invoice.id}")
+            finalize_confirmation(invoice, confirmation, company_profile, file_order)
             
             messages.success(request, f'Document Bundle Generated Successfully!')
             return redirect('clientdoc:confirmation_list')
@@ -821,6 +1024,74 @@ def finalize_invoice_pdf(request, invoice_id):
             
     return redirect('clientdoc:create_confirmation', invoice_id=invoice_id)
 
+BATCH_FINALIZE_STATUSES = ['TRP', 'DC', 'DRF', 'FIN']
+
+def batch_finalize(request):
+    """Queues a batch finalize job for the selected invoices or for a status/date filter."""
+    if request.method != 'POST':
+        return redirect('clientdoc:invoice_list')
+
+    invoices = SalesInvoice.objects.all()
+    if request.POST.get('mode') == 'filter':
+        status = request.POST.get('status', 'TRP')
+        if status not in BATCH_FINALIZE_STATUSES:
+            status = 'TRP'
+        date_from, date_to = request.POST.get('from', ''), request.POST.get('to', '')
+        start, end = parse_date_range(date_from, date_to)
+        invoices = filter_by_date(invoices.filter(status=status), start, end)
+        description = f"Status {status}, {date_from or 'start'} to {date_to or 'today'}"
+    else:
+        invoices = invoices.filter(pk__in=[i for i in request.POST.getlist('invoice_ids') if i.isdigit()])
+        description = "Selected invoices"
+
+    invoice_ids = list(invoices.order_by('date', 'id').values_list('id', flat=True))
+    if not invoice_ids:
+        messages.warning(request, 'No invoices matched, nothing to finalize.')
+        return redirect('clientdoc:invoice_list')
+
+    job = BatchFinalizeJob.objects.create(
+        description=f"{description} ({len(invoice_ids)})", invoice_ids=invoice_ids, total=len(invoice_ids),
+    )
+    transaction.on_commit(lambda: start_batch_job(job.id))
+    log_activity("Batch Finalize", f"Queued {len(invoice_ids)} invoices (job #{job.id})")
+    return redirect('clientdoc:batch_finalize_status', pk=job.id)
+
+def batch_finalize_status(request, pk):
+    """Progress of a batch finalize job (the page refreshes itself while it runs) and recent jobs."""
+    job = get_object_or_404(BatchFinalizeJob, pk=pk)
+    return render(request, 'clientdoc/batch_finalize.html', {
+        'job': job,
+        'interrupted': job.status == 'Running' and job.is_stale and not batch_job_running(job.id),
+        'recent_jobs': BatchFinalizeJob.objects.defer('invoice_ids', 'finished_ids', 'log').order_by('-created_at')[:10],
+        'title': f'Batch Finalize #{job.id}',
+    })
+
+def batch_finalize_restart(request, pk):
+    """Continues a failed job or one whose thread died with the server; finalized invoices are skipped."""
+    job = get_object_or_404(BatchFinalizeJob, pk=pk)
+    if request.method != 'POST' or not job.can_restart or batch_job_running(job.id):
+        messages.error(request, 'This batch cannot be restarted.')
+        return redirect('clientdoc:batch_finalize_status', pk=job.id)
+    # Claim the job in the database: another server process may be restarting it too
+    from django.utils import timezone
+    claimed = BatchFinalizeJob.objects.filter(
+        pk=pk, status=job.status, updated_at=job.updated_at,
+    ).update(status='Running', updated_at=timezone.now())
+    if not claimed:
+        messages.error(request, 'This batch is already being restarted.')
+        return redirect('clientdoc:batch_finalize_status', pk=job.id)
+
+    start_batch_job(job.id)
+    messages.success(request, f'Batch #{job.id} restarted.')
+    return redirect('clientdoc:batch_finalize_status', pk=job.id)
+
+def batch_finalize_download(request, pk):
+    job = get_object_or_404(BatchFinalizeJob, pk=pk)
+    if not job.zip_file:
+        messages.error(request, 'The ZIP for this batch is not ready.')
+        return redirect('clientdoc:batch_finalize_status', pk=job.id)
+    return FileResponse(job.zip_file.open('rb'), as_attachment=True, filename=f"finalized_invoices_batch_{job.id}.zip")
+
 # --- BULK UPLOAD VIEWS ---
 
 def bulk_upload_page(request):
@@ -834,8 +1105,25 @@ def bulk_upload_page(request):
         if not file.name.endswith(('.xlsx', '.xls')):
             messages.error(request, 'Please upload a valid Excel file.')
             return redirect('clientdoc:bulk_upload_page')
+
+        # Validate only: check the sheet against master data, nothing is saved
+        if request.POST.get('action') == 'validate':
+            if upload_type != 'invoice':
+                messages.info(request, 'Validation is available for invoice sheets only.')
+                return redirect('clientdoc:bulk_upload_page')
+            try:
+                report = validate_invoice_sheet(file)
+            except Exception as e:
+                messages.error(request, f'Could not read the file: {e}')
+                return redirect('clientdoc:bulk_upload_page')
+            return render(request, 'clientdoc/bulk_upload.html', {
+                'uploads': uploads,
+                'title': 'Bulk Data Upload',
+                'validation': report,
+                'validated_file': file.name,
+            })
             
-        upload_record = BulkInvoiceUpload.objects.create(file=file)
+        upload_record = BulkInvoiceUpload.objects.create(file=file, upload_type=upload_type)
         upload_record.log = f"Type: {upload_type.title()}\n"
         upload_record.save()
         
@@ -865,557 +1153,378 @@ def bulk_upload_page(request):
         'title': 'Bulk Data Upload'
     })
 
+def resume_bulk_upload(request, pk):
+    """Continues an interrupted invoice upload from its last committed chunk."""
+    upload_record = get_object_or_404(BulkInvoiceUpload, pk=pk)
+    if request.method != 'POST' or not upload_record.can_resume:
+        messages.error(request, 'This upload cannot be resumed.')
+        return redirect('clientdoc:bulk_upload_page')
+    # Claim the upload so a double submit does not start a second run over the same groups
+    from django.utils import timezone
+    claimed = BulkInvoiceUpload.objects.filter(
+        pk=pk, status=upload_record.status, updated_at=upload_record.updated_at,
+    ).update(status='Processing', updated_at=timezone.now())
+    if not claimed:
+        messages.error(request, 'This upload is already being resumed.')
+        return redirect('clientdoc:bulk_upload_page')
+
+    try:
+        process_invoice_upload(upload_record)
+        messages.success(request, f'Upload #{upload_record.id} resumed and processed successfully.')
+    except Exception as e:
+        import traceback
+        upload_record.status = 'Failed'
+        upload_record.log = (upload_record.log or "") + f"Error processing file: {str(e)}\n{traceback.format_exc()}"
+        upload_record.save()
+        messages.error(request, 'Error processing file. Check logs.')
+    return redirect('clientdoc:bulk_upload_page')
+
+def bulk_upload_detail(request, pk):
+    """Per-row results of an upload, filterable by outcome and searchable."""
+    from django.db.models import Count, Q
+    upload_record = get_object_or_404(BulkInvoiceUpload, pk=pk)
+    rows = upload_record.rows.select_related('invoice')
+
+    outcome = request.GET.get('outcome', '')
+    if outcome:
+        rows = rows.filter(outcome=outcome)
+    query = request.GET.get('q', '').strip()
+    if query:
+        rows = rows.filter(Q(message__icontains=query) | Q(group_key__icontains=query))
+
+    counts = dict(upload_record.rows.values_list('outcome').annotate(total=Count('id')).order_by())
+    outcome_counts = [(value, label, counts.get(value, 0)) for value, label in BulkUploadRow.OUTCOME_CHOICES]
+
+    paginator = Paginator(rows, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    return render(request, 'clientdoc/bulk_upload_detail.html', {
+        'upload': upload_record,
+        'page_obj': page_obj,
+        'outcome_counts': outcome_counts,
+        'total_rows': sum(counts.values()),
+        'outcome': outcome,
+        'query': query,
+    })
+
 def download_sample_excel(request):
-    """Generates a sample excel file based on type with formatting, optionally with data."""
-    import datetime
-    from openpyxl.styles import Font, PatternFill, Alignment
-    
+    """Serves the bulk upload template for a type, or streams an export when export=true."""
     upload_type = request.GET.get('type', 'invoice')
     do_export = request.GET.get('export') == 'true'
     
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"{upload_type.title()} {'Data' if do_export else 'Template'}"
-    
-    # Define Headers based on Type
-    if upload_type == 'buyer':
-        headers = ["Buyer Name*", "Address", "GSTIN", "State", "Phone", "Email"]
-        widths = [30, 40, 20, 20, 20, 30]
-        
-    elif upload_type == 'item':
-        headers = ["Item Name*", "Category", "Article/SKU", "Description", "Price*", "GST Rate (0.18)*", "HSN Code", "Unit (Nos)"]
-        widths = [30, 20, 20, 40, 15, 15, 15, 15]
-        
-    elif upload_type == 'location':
-        headers = ["Location Name*", "Site Code", "Address", "City", "State", "GSTIN", "Priority"]
-        widths = [30, 15, 40, 20, 20, 20, 15]
-        
-    else: # Invoice
-        headers = [
-            'Buyer Name', 'Location Name', 'Item Name', 'Item Description', 'Quantity', 'Unit Rate', 
-            'SGST', 'CGST', 'IGST', 'Transport Charges', 'Total Amount', 
-            'Generate Invoice (Yes/No)', 'Generate PDF (Yes/No)', 
-            'Tally Invoice No. (Identifier)', 'Invoce Date', 
-            "Buyer's Order No.", "Buyer's Order Date (YYYY-MM-DD)", 
-            'Dispatch Doc No.', 'Dispatched Through', 'Destination', 
-            'Delivery Note', 'Delivery Note Date (YYYY-MM-DD)', 
-            'Mode/Terms of Payment', 'Reference No. & Date', 'Other References', 
-            'Terms of Delivery', 'Remarks', 'DC Notes', 'Transport Description', 
-            'Doc-1 Invoice (Path)', 'Doc-2 DC (Path)', 'Doc-3 Buyer Po (Path)', 'Doc 4 Email approal (Path)', 
-            'Doc-images-1', 'Doc-images-2', 'Doc-images-3', 'Doc-images-4', 'Doc-images-5'
-        ]
-        # Widths mostly uniform
-        widths = [25] * len(headers)
-        widths[0] = 30 # Buyer
-        widths[1] = 30 # Location
-        widths[2] = 30 # Item
-        widths[3] = 40 # Description
-
-    ws.append(headers)
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="808080", end_color="808080", fill_type="solid") # Grey
-    blue_fill = PatternFill(start_color="0070C0", end_color="0070C0", fill_type="solid") # Blue
-    
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        
-    # Blue First Column Header
-    ws['A1'].fill = blue_fill
-    
-    # Set Widths
-    for i, width in enumerate(widths, 1):
-        col_letter = openpyxl.utils.get_column_letter(i)
-        ws.column_dimensions[col_letter].width = width
-
-    # ---- EXPORT DATA LOGIC ----
+    # ---- EXPORT DATA LOGIC (streamed from write-only workbooks) ----
     if do_export:
-        if upload_type == 'buyer':
-            for obj in Buyer.objects.all():
-                ws.append([
-                    obj.name, obj.address, obj.gstin, obj.state, obj.phone, obj.email
-                ])
-        elif upload_type == 'item':
-            for obj in Item.objects.select_related('category').all():
-                ws.append([
-                    obj.name, 
-                    obj.category.name if obj.category else "", 
-                    obj.article_code, 
-                    obj.description, 
-                    obj.price, 
-                    float(obj.gst_rate) if obj.gst_rate else 0.00,
-                    obj.hsn_code, 
-                    obj.unit
-                ])
-        elif upload_type == 'location':
-            for obj in StoreLocation.objects.all():
-                ws.append([
-                    obj.name, obj.site_code, obj.address, obj.city, obj.state, obj.gstin, obj.priority
-                ])
-    
-    # Invoice Specific Logic (Dropdowns etc - Only for Templates/Invoice)
-    if upload_type == 'invoice':
-        # Add Data and Validations
-        data_ws = wb.create_sheet("Reference Data")
-        data_ws.sheet_state = 'hidden' 
-        
-        buyers = list(Buyer.objects.values_list('name', flat=True))
-        locations = list(StoreLocation.objects.values_list('name', flat=True))
-        
-        # Item Data for Auto-Fill (Name, Price, GST)
-        items_qs = Item.objects.all().values_list('name', 'price', 'gst_rate')
-        items = list(items_qs) # List of tuples
-        
-        for i, b in enumerate(buyers, 1): data_ws.cell(row=i, column=1, value=b)
-        for i, l in enumerate(locations, 1): data_ws.cell(row=i, column=2, value=l)
-        
-        # Items in Cols 3, 4, 5 (C, D, E) (Reference Sheet)
-        for i, (name, price, gst) in enumerate(items, 1): 
-            data_ws.cell(row=i, column=3, value=name)
-            data_ws.cell(row=i, column=4, value=price)
-            data_ws.cell(row=i, column=5, value=gst)
-
-        def add_val(col, valid_range):
-             dv = DataValidation(type="list", formula1=valid_range, allow_blank=True)
-             ws.add_data_validation(dv)
-             dv.add(f"{col}2:{col}500")
-
-        if buyers: add_val('A', f"'Reference Data'!$A$1:$A${len(buyers)}")
-        if locations: add_val('B', f"'Reference Data'!$B$1:$B${len(locations)}")
-        if items: add_val('C', f"'Reference Data'!$C$1:$C${len(items)}")
-        
-        # VLOOKUP Formulas
-        # Item Name is C. Description is D (User fills). Quantity is E. Unit Rate is F.
-        # We want Unit Rate (F) to auto-fill from Reference Data D (Price) based on C (Item Name).
-        # Reference Data: C=Name, D=Price, E=GST
-        
-        nrows = 500
-        for r in range(2, nrows + 1):
-             # Price VLOOKUP
-             ws[f'F{r}'] = f"=IFERROR(VLOOKUP(C{r}, 'Reference Data'!$C$1:$E${len(items)+1}, 2, FALSE), \"\")"
-             
-        # Yes/No Dropdowns for L and M (Indices 11, 12)
-        # 0=A, 1=B, 2=C, 3=D, 4=E, 5=F, 6=G, 7=H, 8=I, 9=J, 10=K
-        # 11 = L (Gen Invoice)
-        # 12 = M (Gen PDF)
-        
-        dv_yn = DataValidation(type="list", formula1='"Yes,No"', allow_blank=False)
-        ws.add_data_validation(dv_yn)
-        dv_yn.add("L2:L500")
-        ws.add_data_validation(dv_yn) 
-        dv_yn.add("M2:M500")
-        
-        # Defaults
-        ws['L2'] = "Yes"
-        ws['M2'] = "Yes" 
-        ws['W2'] = "30 Days" # Mode/Terms (Shifted: Old was V(21). Now 22(W))
-        ws['Y2'] = "EMAIL Approval" # Other Ref (Old X(23). Now 24(Y))
-    
-    # Timestamped Filename
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-    mode = "Export" if do_export else "Template"
-    filename = f"Bulk_{upload_type.title()}_{mode}_{timestamp}.xlsx"
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename={filename}'
-    wb.save(response)
-    return response
+        if upload_type == 'invoice':
+            start, end = parse_date_range(request.GET.get('from'), request.GET.get('to'))
+            return workbook_response(invoice_sheets(start, end), export_filename('Invoice'))
+        if upload_type in MASTER_HEADERS:
+            return workbook_response(master_data_sheets(upload_type), export_filename(upload_type.title()))
+    
+    if upload_type not in TEMPLATE_TYPES:
+        upload_type = 'invoice'
+    # Served from the on-disk cache; rebuilt in the background when master data changes
+    path = get_template_path(upload_type)
+    filename = export_filename(upload_type.title(), mode="Template")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+def gstr1_report(request):
+    """Streams the GSTR-1 style return for a date range as Excel (default) or JSON (format=json)."""
+    date_from, date_to = request.GET.get('from', ''), request.GET.get('to', '')
+    start, end = parse_date_range(date_from, date_to)
+    sections = gstr1_sections(start, end)
+    name = f"GSTR1_{date_from or 'start'}_to_{date_to or 'today'}"
+    if request.GET.get('format') == 'json':
+        return gstr1_json_response(sections, {'from': date_from, 'to': date_to}, f"{name}.json")
+    return gstr1_workbook_response(sections, f"{name}.xlsx")
 
 # --- PROCESSORS ---
+def process_master_upload(record, upload_type):
+    """Buyer, item and location uploads: one bulk upsert for the sheet, then one row entry per line."""
+    label = {'buyer': 'Buyer', 'item': 'Item', 'location': 'Location'}[upload_type]
+    result = import_upload_sheet(record.file.path, upload_type)
+
+    recorder = UploadRowRecorder(record)
+    for row_number, name, outcome, message in result.rows:
+        recorder.add(row_number, outcome, message or f"{outcome.title()} {label} '{name}'", group_key=name)
+    with transaction.atomic():
+        recorder.flush()
+        record.log += f"Summary: {result.summary()}"
+        record.status = 'Processed'
+        record.save()
+
 def process_buyer_upload(record):
-    ws = openpyxl.load_workbook(record.file.path, data_only=True).active
-    log = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
-        if not row or not row[0]: continue
-        name = str(row[0]).strip()
-        defaults = {
-            'address': row[1] or "",
-            'gstin': row[2] or "",
-            'state': row[3] or "Karnataka",
-            'phone': row[4] or "",
-            'email': row[5] or ""
-        }
-        obj, created = Buyer.objects.update_or_create(name=name, defaults=defaults)
-        log.append(f"Row {idx}: {'Created' if created else 'Updated'} Buyer '{name}'")
-    
-    record.log += "\n".join(log)
-    record.status = 'Processed'
-    record.save()
+    process_master_upload(record, 'buyer')
 
 def process_item_upload(record):
-    ws = openpyxl.load_workbook(record.file.path, data_only=True).active
-    log = []
-    from decimal import Decimal
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
-        if not row or not row[0]: continue
-        name = str(row[0]).strip()
-        
-        # Category Logic
-        cat_name = row[1]
-        category = None
-        if cat_name:
-            category, _ = ItemCategory.objects.get_or_create(name=str(cat_name).strip())
-            
-        price = 0.00
-        try: price = float(row[4]) if row[4] else 0.00
-        except: pass
-        
-        gst = 0.18
-        try: gst = float(row[5]) if row[5] else 0.18
-        except: pass
-
-        defaults = {
-            'category': category,
-            'article_code': row[2] or "",
-            'description': row[3] or "",
-            'price': Decimal(price),
-            'gst_rate': Decimal(gst),
-            'hsn_code': row[6] or "844311",
-            'unit': row[7] or "Nos"
-        }
-        obj, created = Item.objects.update_or_create(name=name, defaults=defaults)
-        log.append(f"Row {idx}: {'Created' if created else 'Updated'} Item '{name}'")
-        
-        record.log += "\n".join(log)
-        record.status = 'Processed'
-        record.save()
+    process_master_upload(record, 'item')
 
 def process_location_upload(record):
-    ws = openpyxl.load_workbook(record.file.path, data_only=True).active
-    log = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
-        if not row or not row[0]: continue
-        name = str(row[0]).strip()
-        defaults = {
-            'site_code': row[1] or "",
-            'address': row[2] or "",
-            'city': row[3] or "",
-            'state': row[4] or "Karnataka",
-            'gstin': row[5] or "",
-            'priority': row[6] or ""
-        }
-        obj, created = StoreLocation.objects.update_or_create(name=name, defaults=defaults)
-        log.append(f"Row {idx}: {'Created' if created else 'Updated'} Location '{name}'")
-        
-    record.log += "\n".join(log)
-    record.status = 'Processed'
-    record.save()
+    process_master_upload(record, 'location')
 
 def process_invoice_upload(upload_record):
     """Parses Excel with support for Multiple Items per Invoice using Grouping - Updated Mapping & De-duplications"""
-    file_path = upload_record.file.path
-    wb = openpyxl.load_workbook(file_path, data_only=True)
-    ws = wb.active
-    
-    log = []
-    created_count = 0
-    updated_count = 0
-    error_count = 0
-    
-    from datetime import datetime
-    from decimal import Decimal
-    import uuid
-    from django.core.files import File
-    import os
-    
-    def parse_date(date_val):
-        if not date_val: return None
-        if isinstance(date_val, datetime): return date_val
-        try: return datetime.strptime(str(date_val).strip(), '%Y-%m-%d')
-        except ValueError: return None 
-
     # --- 1. READ AND GROUP DATA ---
-    grouped_rows = {} 
-    
-    for index, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if not row or not any(row): continue
-        
-        def get_col(idx): return row[idx] if idx < len(row) else None
-        
-        # Mappings Updated (Inserted Description @ 3)
-        # 0: Buyer, 1: Location, 2: Item, 3: DESC (NEW)
-        # 4: Qty, 5: Unit Rate, 6: SGST, 7: CGST, 8: IGST, 9: Trans Charges, 10: Total
-        # 11: Gen Inv, 12: Gen PDF
-        # 13: Tally Inv
-        # 14: Inv Date
-        
-        gen_invoice = get_col(11)
-        if not gen_invoice or str(gen_invoice).strip().lower() != 'yes':
-             log.append(f"Row {index}: Skipped (Generate != Yes)")
-             continue
-
-        location_name = get_col(1)
-        item_name = get_col(2)
-        qty = get_col(4)
-        
-        if not (location_name and item_name and qty):
-             log.append(f"Row {index}: Skipped (Missing essential Item/Location data)")
-             error_count += 1
-             continue
-             
-        tally_no = str(get_col(13)).strip() if get_col(13) else None
-        
-        if tally_no:
-            key = f"TALLY::{tally_no}"
-        else:
-            key = f"UNIQUE::{uuid.uuid4()}" 
-            
-        if key not in grouped_rows:
-            grouped_rows[key] = []
-        
-        row_data = {
-            'index': index,
-            'buyer_name': get_col(0),
-            'location_name': location_name,
-            'item_name': item_name,
-            'item_desc': get_col(3), # New Description
-            'qty': qty,
-            'unit_rate': get_col(5),
-            'trans_charges': get_col(9),
-            'gen_pdf': get_col(12),
-            'tally_no': tally_no,
-            'inv_date': parse_date(get_col(14)),
-            'buyer_ord_no': get_col(15),
-            'buyer_ord_date': parse_date(get_col(16)),
-            'disp_doc_no': get_col(17),
-            'disp_through': get_col(18),
-            'dest': get_col(19),
-            'del_note': get_col(20),
-            'del_note_date': parse_date(get_col(21)),
-            'pay_terms': get_col(22) or "30 Days",
-            'ref_no': get_col(23),
-            'other_ref': get_col(24) or "EMAIL Approval",
-            'terms_del': get_col(25),
-            'remark': get_col(26),
-            'dc_notes': get_col(27),
-            'trans_desc': get_col(28),
-            # File Paths
-            'doc_inv': get_col(29),
-            'doc_dc': get_col(30),
-            'doc_po': get_col(31),
-            'doc_email': get_col(32),
-            'doc_img_1': get_col(33),
-            'doc_img_2': get_col(34),
-            'doc_img_3': get_col(35),
-            'doc_img_4': get_col(36),
-            'doc_img_5': get_col(37),
-        }
-        grouped_rows[key].append(row_data)
+    grouped_rows, _, skipped = parse_invoice_sheet(upload_record.file.path)
 
     # --- 2. PROCESS GROUPS ---
-    for key, rows in grouped_rows.items():
-        first_row = rows[0]
-        row_indices = [str(r['index']) for r in rows]
-        indices_str = ", ".join(row_indices)
-        
-        try:
-            with transaction.atomic():
-                loc_obj = StoreLocation.objects.filter(name__iexact=str(first_row['location_name']).strip()).first()
-                if not loc_obj:
-                    log.append(f"Rows {indices_str}: Failed - Location '{first_row['location_name']}' not found")
-                    error_count += 1
-                    continue
-                
-                buyer_obj = None
-                if first_row['buyer_name']:
-                    buyer_obj = Buyer.objects.filter(name__iexact=str(first_row['buyer_name']).strip()).first()
-                
-                invoice = None
-                is_update = False
-                
-                if first_row['tally_no']:
-                     invoice = SalesInvoice.objects.filter(tally_invoice_number__iexact=first_row['tally_no']).first()
-                     if invoice: is_update = True
-                
-                header_data = {
-                    'buyer': buyer_obj,
-                    'location': loc_obj,
-                    'tally_invoice_number': first_row['tally_no'],
-                    'buyers_order_no': first_row['buyer_ord_no'],
-                    'buyers_order_date': first_row['buyer_ord_date'] or datetime.now(),
-                    'dispatch_doc_no': first_row['disp_doc_no'],
-                    'dispatched_through': first_row['disp_through'],
-                    'destination': first_row['dest'],
-                    'delivery_note': first_row['del_note'],
-                    'delivery_note_date': first_row['del_note_date'] or datetime.now(),
-                    'mode_terms_payment': first_row['pay_terms'],
-                    'reference_no_date': first_row['ref_no'],
-                    'other_references': first_row['other_ref'],
-                    'terms_of_delivery': first_row['terms_del'],
-                    'remark': first_row['remark'],
-                }
-                
-                if first_row['inv_date']: header_data['date'] = first_row['inv_date']
-
-                if is_update and invoice:
-                     for k, v in header_data.items():
-                         if v is not None: setattr(invoice, k, v)
-                     invoice.save()
-                     log.append(f"Rows {indices_str}: Updated Invoice {invoice.app_invoice_number or invoice.id}")
-                     updated_count += 1
+    # Groups are committed in chunks; each group runs in its own savepoint so a bad group
+    # only rolls back itself. The checkpoint and the running counts are saved in the same
+    # transaction as their chunk.
+    groups = list(grouped_rows.values())
+    start = upload_record.checkpoint if upload_record.total_groups == len(groups) else 0
+    if start:
+        # Skipped rows and the counts of the committed chunks were saved by the earlier run
+        upload_record.log = (upload_record.log or "") + f"Resuming at group {start + 1} of {len(groups)}\n"
+    else:
+        upload_record.created_count = upload_record.updated_count = 0
+        upload_record.error_count = sum(1 for _, reason in skipped if reason == 'missing_data')
+    upload_record.checkpoint = start
+    upload_record.total_groups = len(groups)
+    upload_record.status = 'Processing'
+    with transaction.atomic():
+        upload_record.save(update_fields=['checkpoint', 'total_groups', 'status', 'log', 'created_count',
+                                          'updated_count', 'error_count', 'updated_at'])
+        if not start:
+            recorder = UploadRowRecorder(upload_record)
+            for row, reason in skipped:
+                if reason == 'not_generated':
+                    recorder.add(row, 'skipped', "Skipped (Generate != Yes)")
                 else:
-                    if 'date' not in header_data: header_data['date'] = datetime.now()
-                    header_data['status'] = 'DRF'
-                    invoice = SalesInvoice.objects.create(**header_data)
-                    log.append(f"Rows {indices_str}: Created Invoice #{invoice.id}")
-                    created_count += 1
-                    
-                # --- PROCESS ITEMS (Iterate ALL rows in group) ---
-                for r in rows:
-                    item_obj = Item.objects.filter(name__iexact=str(r['item_name']).strip()).first()
-                    if not item_obj:
-                         log.append(f"Row {r['index']}: Warning - Item '{r['item_name']}' not found. Skipped.")
-                         continue
-                    try: q = int(r['qty'])
-                    except: q = 1
-                    
-                    price = item_obj.price
-                    if r['unit_rate']:
-                        try: price = Decimal(str(r['unit_rate']).strip())
-                        except: pass
-                    
-                    # Prevent Duplicates and Fix "Returned more than one" error
-                    # If multiple items exist (from previous bad uploads), delete them first.
-                    existing_dupes = InvoiceItem.objects.filter(invoice=invoice, item=item_obj)
-                    if existing_dupes.count() > 1:
-                        existing_dupes.delete()
-
-                    # Update or Create based on Item
-                    InvoiceItem.objects.update_or_create(
-                        invoice=invoice,
-                        item=item_obj,
-                        defaults={
-                            'quantity': q,
-                            'price': price,
-                            'gst_rate': item_obj.gst_rate,
-                            'description': r['item_desc'] 
-                        }
-                    )
-                
-                if first_row['dc_notes']:
-                    dc, _ = DeliveryChallan.objects.get_or_create(invoice=invoice)
-                    dc.notes = first_row['dc_notes']
-                    dc.save()
-                    if invoice.status == 'DRF': invoice.status = 'DC'
-                    
-                if first_row['trans_charges']:
-                     try:
-                         amt = Decimal(str(first_row['trans_charges']).strip()) 
-                         trp, _ = TransportCharges.objects.get_or_create(invoice=invoice)
-                         trp.charges = amt
-                         trp.description = first_row['trans_desc']
-                         trp.save()
-                         if invoice.status in ['DRF', 'DC']: invoice.status = 'TRP'
-                     except Exception as e:
-                         log.append(f"Row {first_row['index']}: Warning - Invalid Transport Charge ({e})")
-                
-                invoice.save()
-                invoice.calculate_total()
-                
-                # --- FILE UPLOADS ---
-                conf, _ = ConfirmationDocument.objects.get_or_create(invoice=invoice)
-                
-                def save_file_from_path(path_val, target_field):
-                    if path_val and os.path.exists(path_val):
-                         try:
-                             with open(path_val, 'rb') as f:
-                                 fname = os.path.basename(path_val)
-                                 target_field.save(fname, File(f), save=True)
-                         except Exception as fe:
-                             log.append(f" Failed to load file {path_val}: {fe}")
-                
-                save_file_from_path(first_row['doc_po'], conf.po_file)
-                save_file_from_path(first_row['doc_email'], conf.approval_email_file)
-                save_file_from_path(first_row['doc_inv'], conf.uploaded_invoice)
-                save_file_from_path(first_row['doc_dc'], conf.uploaded_dc)
-                
-                # --- PACKED IMAGES (Iterate 5 slots) ---
-                img_slots = [first_row[f'doc_img_{i}'] for i in range(1, 6)]
-                for img_path in img_slots:
-                    if img_path and os.path.exists(img_path):
-                        try:
-                            with open(img_path, 'rb') as f:
-                                pi = PackedImage(confirmation=conf)
-                                pi.image.save(os.path.basename(img_path), File(f), save=True)
-                        except Exception as ie:
-                           log.append(f" Failed to load image {img_path}: {ie}")
-
-                # --- PDF GENERATION ---
-                should_gen_pdf = any(str(r['gen_pdf']).strip().lower() == 'yes' for r in rows if r['gen_pdf'])
-                if should_gen_pdf:
-                    try:
-                        company_profile = OurCompanyProfile.objects.first()
-                        merger = PdfMerger()
-                        
-                        # Invoice: Use uploaded if present, else generate
-                        if conf.uploaded_invoice:
-                            try:
-                                PdfReader(conf.uploaded_invoice.path)
-                                merger.append(conf.uploaded_invoice.path)
-                            except: pass # fallback or error
-                        else:
-                            invoice.calculate_total() 
-                            merger.append(generate_invoice_pdf(invoice, company_profile))
-                            
-                        # DC: Use uploaded if present, else generate if DC exists
-                        if conf.uploaded_dc:
-                            try:
-                                PdfReader(conf.uploaded_dc.path)
-                                merger.append(conf.uploaded_dc.path)
-                            except: pass
-                        elif hasattr(invoice, 'deliverychallan'):
-                            merger.append(generate_dc_pdf(invoice, invoice.deliverychallan, company_profile))
-                            
-                        if hasattr(invoice, 'transportcharges'):
-                            merger.append(generate_transport_pdf(invoice, invoice.transportcharges, company_profile))
-                        
-                        # Append PO/Email if they were just uploaded (or existed)
-                        # Actually logic in finalize_pdf usually does this. Here we replicate simple bundle for bulk.
-                        if conf.po_file:
-                             try: merger.append(conf.po_file.path)
-                             except: pass
-                        if conf.approval_email_file:
-                             try: merger.append(conf.approval_email_file.path)
-                             except: pass
-
-                        # Images
-                        # generate_packed_images_pdf is defined in this file
-                        images_pdf_buffer = generate_packed_images_pdf(conf)
-                        if images_pdf_buffer:
-                            merger.append(images_pdf_buffer)
-
-                        output = BytesIO()
-                        merger.write(output)
-                        merger.close()
-                        output.seek(0)
-                        
-                        suffix = invoice.tally_invoice_number or invoice.app_invoice_number or str(invoice.id)
-                        filename = f"confirmation_invoice_{suffix}.pdf"
-                        
-                        from django.core.files.base import ContentFile
-                        conf.combined_pdf.save(filename, ContentFile(output.getvalue()), save=True)
-                        invoice.status = 'FIN'
-                        invoice.save()
-                        log.append(f" Invoice #{invoice.id}: PDF Generated (Bundled)")
-                    except Exception as pdf_err:
-                        logger.error(f"Bulk PDF Error: {pdf_err}")
-                        log.append(f" Invoice #{invoice.id}: PDF Failed ({str(pdf_err)})")
-
-        except Exception as e:
-            log.append(f"Rows {indices_str}: Group Error - {str(e)}")
-            error_count += 1
-            import traceback
-            logger.error(traceback.format_exc())
+                    recorder.add(row, 'error', "Skipped (Missing essential Item/Location data)")
+            recorder.flush()
 
-    upload_record.log = "\n".join(log)
+    company_profile = OurCompanyProfile.objects.first()
+    chunk_size = getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', 50)
+    # Bundles of a chunk committed by an interrupted run
+    _generate_upload_pdfs(upload_record, company_profile)
+
+    for chunk_start in range(start, len(groups), chunk_size):
+        chunk = groups[chunk_start:chunk_start + chunk_size]
+        recorder = UploadRowRecorder(upload_record)
+        pdf_jobs = []
+        # File copies run on a thread pool before the transaction, so no lock is held while waiting on I/O
+        attachments = import_attachments([rows[0][column] for rows in chunk for column in ATTACHMENT_COLUMNS])
+        with transaction.atomic():
+            for rows in chunk:
+                mark, jobs_mark = recorder.mark(), len(pdf_jobs)
+                try:
+                    with transaction.atomic():
+                        result = _process_invoice_group(rows, recorder, attachments, pdf_jobs)
+                except Exception as e:
+                    # Rows recorded for the rolled back group would point at invoices that no longer exist
+                    recorder.rollback_to(mark)
+                    del pdf_jobs[jobs_mark:]
+                    recorder.add_rows([r['index'] for r in rows], 'error', f"Group Error - {str(e)}", group_key=_group_key(rows))
+                    result = 'error'
+                    import traceback
+                    logger.error(traceback.format_exc())
+                setattr(upload_record, f'{result}_count', getattr(upload_record, f'{result}_count') + 1)
+
+            recorder.flush()
+            upload_record.checkpoint = chunk_start + len(chunk)
+            upload_record.pending_pdfs = pdf_jobs
+            upload_record.save(update_fields=['checkpoint', 'created_count', 'updated_count', 'error_count',
+                                              'pending_pdfs', 'updated_at'])
+
+        # Bundles are built after the chunk is committed so the write lock is not held while rendering;
+        # they stay in pending_pdfs until built, so a resume builds them if this run dies first
+        _generate_upload_pdfs(upload_record, company_profile)
+
+    upload_record.log += (f"Summary: {upload_record.created_count} created, {upload_record.updated_count} updated, "
+                          f"{upload_record.error_count} errors")
     upload_record.status = 'Processed'
     upload_record.save()
     
     return redirect('clientdoc:dashboard')
 
+ATTACHMENT_FIELDS = [
+    ('doc_po', 'po_file'), ('doc_email', 'approval_email_file'),
+    ('doc_inv', 'uploaded_invoice'), ('doc_dc', 'uploaded_dc'),
+]
+ATTACHMENT_COLUMNS = [column for column, _ in ATTACHMENT_FIELDS] + [f'doc_img_{i}' for i in range(1, 6)]
+
+def _group_key(rows):
+    return rows[0]['tally_no'] or f"Row {rows[0]['index']}"
+
+def _staged_attachment(attachments, path_val, recorder, row):
+    """Blob for a sheet path from import_attachments; missing files are skipped silently as before."""
+    if not path_val:
+        return None
+    result = attachments.get(path_val)
+    if isinstance(result, FileNotFoundError) or result is None:
+        return None
+    if isinstance(result, Exception):
+        recorder.add(row, 'warning', f"Failed to load file {path_val}: {result}")
+        return None
+    return result
+
+def _process_invoice_group(rows, recorder, attachments, pdf_jobs):
+    """Creates or updates the invoice for one group of rows. Returns 'created', 'updated' or 'error'.
+
+    Invoices that asked for a PDF are appended to ``pdf_jobs`` as [invoice id, row, group key].
+    """
+    from datetime import datetime
+    from decimal import Decimal
+
+    first_row = rows[0]
+    indices = [r['index'] for r in rows]
+    group_key = _group_key(rows)
+
+    loc_obj = StoreLocation.objects.filter(name__iexact=str(first_row['location_name']).strip()).first()
+    if not loc_obj:
+        recorder.add_rows(indices, 'error', f"Failed - Location '{first_row['location_name']}' not found", group_key=group_key)
+        return 'error'
+
+    buyer_obj = None
+    if first_row['buyer_name']:
+        buyer_obj = Buyer.objects.filter(name__iexact=str(first_row['buyer_name']).strip()).first()
+
+    invoice = None
+    is_update = False
+
+    if first_row['tally_no']:
+         invoice = SalesInvoice.objects.filter(tally_invoice_number__iexact=first_row['tally_no']).first()
+         if invoice: is_update = True
+
+    header_data = {
+        'buyer': buyer_obj,
+        'location': loc_obj,
+        'tally_invoice_number': first_row['tally_no'],
+        'buyers_order_no': first_row['buyer_ord_no'],
+        'buyers_order_date': first_row['buyer_ord_date'] or datetime.now(),
+        'dispatch_doc_no': first_row['disp_doc_no'],
+        'dispatched_through': first_row['disp_through'],
+        'destination': first_row['dest'],
+        'delivery_note': first_row['del_note'],
+        'delivery_note_date': first_row['del_note_date'] or datetime.now(),
+        'mode_terms_payment': first_row['pay_terms'],
+        'reference_no_date': first_row['ref_no'],
+        'other_references': first_row['other_ref'],
+        'terms_of_delivery': first_row['terms_del'],
+        'remark': first_row['remark'],
+    }
+
+    if first_row['inv_date']: header_data['date'] = first_row['inv_date']
+
+    if is_update and invoice:
+         for k, v in header_data.items():
+             if v is not None: setattr(invoice, k, v)
+         invoice.save()
+         recorder.add_rows(indices, 'updated', f"Updated Invoice {invoice.app_invoice_number or invoice.id}", group_key=group_key, invoice=invoice)
+    else:
+        if 'date' not in header_data: header_data['date'] = datetime.now()
+        header_data['status'] = 'DRF'
+        invoice = SalesInvoice.objects.create(**header_data)
+        recorder.add_rows(indices, 'created', f"Created Invoice #{invoice.id}", group_key=group_key, invoice=invoice)
+
+    # --- PROCESS ITEMS (Iterate ALL rows in group) ---
+    for r in rows:
+        item_obj = Item.objects.filter(name__iexact=str(r['item_name']).strip()).first()
+        if not item_obj:
+             recorder.add(r['index'], 'warning', f"Item '{r['item_name']}' not found. Skipped.", group_key=group_key, invoice=invoice)
+             continue
+        try: q = int(r['qty'])
+        except: q = 1
+
+        price = item_obj.price
+        if r['unit_rate']:
+            try: price = Decimal(str(r['unit_rate']).strip())
+            except: pass
+
+        # Prevent Duplicates and Fix "Returned more than one" error
+        # If multiple items exist (from previous bad uploads), delete them first.
+        existing_dupes = InvoiceItem.objects.filter(invoice=invoice, item=item_obj)
+        if existing_dupes.count() > 1:
+            existing_dupes.delete()
+
+        # Update or Create based on Item
+        InvoiceItem.objects.update_or_create(
+            invoice=invoice,
+            item=item_obj,
+            defaults={
+                'quantity': q,
+                'price': price,
+                'gst_rate': item_obj.gst_rate,
+                'description': r['item_desc'] 
+            }
+        )
+
+    if first_row['dc_notes']:
+        dc, _ = DeliveryChallan.objects.get_or_create(invoice=invoice)
+        dc.notes = first_row['dc_notes']
+        dc.save()
+        if invoice.status == 'DRF': invoice.status = 'DC'
+
+    if first_row['trans_charges']:
+         try:
+             amt = Decimal(str(first_row['trans_charges']).strip()) 
+             trp, _ = TransportCharges.objects.get_or_create(invoice=invoice)
+             trp.charges = amt
+             trp.description = first_row['trans_desc']
+             trp.save()
+             if invoice.status in ['DRF', 'DC']: invoice.status = 'TRP'
+         except Exception as e:
+             recorder.add(first_row['index'], 'warning', f"Invalid Transport Charge ({e})", group_key=group_key, invoice=invoice)
+
+    invoice.save()
+    invoice.calculate_total()
+
+    # --- FILE UPLOADS ---
+    conf, _ = ConfirmationDocument.objects.get_or_create(invoice=invoice)
+
+    # Attachments were copied and hashed before the chunk transaction; only link them here
+    conf_changed = False
+    for column, field_name in ATTACHMENT_FIELDS:
+        blob = _staged_attachment(attachments, first_row[column], recorder, first_row['index'])
+        if blob and getattr(conf, field_name).name != blob.name:
+            setattr(conf, field_name, blob.name)
+            conf_changed = True
+    if conf_changed:
+        conf.save()
+
+    # --- PACKED IMAGES (Iterate 5 slots) ---
+    img_slots = [first_row[f'doc_img_{i}'] for i in range(1, 6)]
+    existing_images = set(conf.packedimage_set.values_list('image', flat=True))
+    new_images = []
+    for img_path in img_slots:
+        blob = _staged_attachment(attachments, img_path, recorder, first_row['index'])
+        if blob and blob.name not in existing_images:
+            new_images.append(PackedImage(confirmation=conf, image=blob.name))
+            existing_images.add(blob.name)
+    PackedImage.objects.bulk_create(new_images)
+
+    # --- PDF GENERATION (after the chunk commits) ---
+    if any(str(r['gen_pdf']).strip().lower() == 'yes' for r in rows if r['gen_pdf']):
+        pdf_jobs.append([invoice.id, first_row['index'], group_key])
+
+    return 'updated' if is_update else 'created'
+
+def _generate_upload_pdfs(upload_record, company_profile):
+    """Builds the bundles in ``upload_record.pending_pdfs``; a failed bundle leaves its invoice unfinalized."""
+    jobs = upload_record.pending_pdfs
+    if not jobs:
+        return
+    invoices = SalesInvoice.objects.select_related('location', 'buyer').in_bulk([invoice_id for invoice_id, _, _ in jobs])
+    recorder = UploadRowRecorder(upload_record)
+    for invoice_id, row, group_key in jobs:
+        invoice = invoices.get(invoice_id)
+        if invoice is None:
+            # Trashed since the chunk committed
+            continue
+        try:
+            metrics = BundleMetrics()
+            conf, _ = ConfirmationDocument.objects.get_or_create(invoice=invoice)
+            finalize_confirmation(invoice, conf, company_profile, metrics=metrics)
+            recorder.add(row, 'info', f"Invoice #{invoice.id}: PDF Generated (Bundled) [{metrics.summary()}]", group_key=group_key, invoice=invoice)
+        except Exception as pdf_err:
+            logger.error(f"Bulk PDF Error: {pdf_err}")
+            recorder.add(row, 'error', f"Invoice #{invoice.id}: PDF Failed ({str(pdf_err)})", group_key=group_key, invoice=invoice)
+
+    with transaction.atomic():
+        recorder.flush()
+        upload_record.pending_pdfs = []
+        upload_record.save(update_fields=['pending_pdfs', 'updated_at'])
+
 def create_buyer(request):
     if request.method == 'POST':
         form = BuyerForm(request.POST) 
@@ -1428,6 +1537,7 @@ def create_buyer(request):
         form = BuyerForm()
     return render(request, 'clientdoc/form.html', {'form': form, 'title': 'Create Buyer'})
 
+@query_budget(LIST_QUERY_BUDGET)
 def buyer_list(request):
     search_fields = ['name', 'address', 'gstin', 'state']
     buyers = get_filtered_queryset(Buyer, request, search_fields)
@@ -1466,8 +1576,8 @@ def delete_packed_image(request, image_id):
     invoice_id = image.confirmation.invoice.id
     
     if request.method == 'POST':
-        if image.image:
-            image.image.delete(save=False) 
+        # Shared attachment blobs stay on disk until gc_attachment_blobs finds them unused
+        delete_field_file(image.image)
         
         image.delete()
         messages.success(request, 'Image successfully removed.')
@@ -1478,59 +1588,37 @@ def delete_packed_image(request, image_id):
 
 def print_invoice(request, invoice_id):
     """Renders the print-friendly invoice template."""
-    invoice = get_object_or_404(SalesInvoice, id=invoice_id)
+    invoice = get_object_or_404(SalesInvoice.objects.select_related('location', 'buyer', 'transportcharges'), id=invoice_id)
     company_profile = OurCompanyProfile.objects.first()
     
-    # Ensure totals are calculated
+    # Ensure totals are calculated (on the same prefetched lines the template shows)
+    prefetch_lines(invoice)
     invoice.calculate_gst_totals()
+    render_model = build_invoice_render(invoice, company_profile)
     
     display_invoice_number = invoice.tally_invoice_number if invoice.tally_invoice_number else invoice.app_invoice_number
-    
-    # Determine IGST vs CGST/SGST based on model's calculated fields
-    # Logic: If igst_total > 0, it's Inter-state. Or check place_of_supply vs company state.
-    # However, model stores totals now.
-    
-    comp_state_code = company_profile.state_code if company_profile else '29'
-    # Fallback to model POS if set, else Location state
-    pos_code = invoice.place_of_supply if invoice.place_of_supply else (invoice.location.state_code if invoice.location else '29')
-    
-    is_igst = (pos_code != comp_state_code)
-    
-    # Re-sum taxable for display if needed, or rely on grand total - tax? 
-    # Better to sum line items for the "Taxable Value" column/row in template.
-    taxable_val = sum(item.taxable_value for item in invoice.invoiceitem_set.all())
-    
-    if hasattr(invoice, 'transportcharges') and invoice.transportcharges and invoice.transportcharges.charges > 0:
-        taxable_val += invoice.transportcharges.charges
 
     return render(request, 'clientdoc/invoice_print_template.html', {
         'invoice': invoice,
+        'render': render_model,
         'company': company_profile,
         'display_invoice_number': display_invoice_number,
-        'taxable_val': taxable_val,
-        'tax_amt': (invoice.cgst_total + invoice.sgst_total + invoice.igst_total),
-        'cgst_amt': invoice.cgst_total,
-        'sgst_amt': invoice.sgst_total,
-        'igst_amt': invoice.igst_total,
-        'is_igst': is_igst,
     })
 
 def print_dc(request, invoice_id):
     """Renders the print-friendly Delivery Challan template."""
-    invoice = get_object_or_404(SalesInvoice, id=invoice_id)
+    invoice = get_object_or_404(SalesInvoice.objects.select_related('location', 'buyer', 'transportcharges'), id=invoice_id)
     # Get the associated Delivery Challan
     dc = get_object_or_404(DeliveryChallan, invoice=invoice)
     company_profile = OurCompanyProfile.objects.first()
     
-    # Calculate total quantity
-    total_qty = sum(item.quantity for item in invoice.invoiceitem_set.all())
     display_invoice_number = invoice.tally_invoice_number if invoice.tally_invoice_number else invoice.app_invoice_number
     
     return render(request, 'clientdoc/dc_print_template.html', {
         'invoice': invoice,
         'dc': dc,
         'company': company_profile,
-        'total_qty': total_qty,
+        'render': build_invoice_render(invoice, company_profile),
         'display_invoice_number': display_invoice_number
     })
 
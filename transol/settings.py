@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'clientdoc.activity.ActivityLogMiddleware',
 ]
 
 ROOT_URLCONF = 'transol.urls'
@@ -81,11 +82,45 @@ WSGI_APPLICATION = 'transol.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: SQLite by default. Set DB_ENGINE=postgresql (and install psycopg) to use PostgreSQL.
+DB_ENGINE = config('DB_ENGINE', default='sqlite3')
+
+if DB_ENGINE in ('postgresql', 'postgres'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='transol'),
+            'USER': config('DB_USER', default='transol'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+    # Lookups, indexes and search types for PostgreSQL (trigram/full text search)
+    INSTALLED_APPS.append('django.contrib.postgres')
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            # Keep connections open between requests instead of reconnecting every time
+            'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds to wait for a lock before raising "database is locked"
+                'timeout': config('SQLITE_TIMEOUT', default=20, cast=int),
+            },
+        }
+    }
+
+# Overrides of the PRAGMAs in clientdoc/sqlite_tuning.py (DEFAULT_PRAGMAS) applied to every new
+# SQLite connection; only the values that can be set from the environment are listed here.
+# WAL lets readers keep working while a bulk import holds the write lock.
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'busy_timeout': config('SQLITE_TIMEOUT', default=20, cast=int) * 1000,  # ms
 }
 
 